@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量邮件操作
+移动、复制、添加/去掉标记和删除都按压缩后的UID区间执行（UID MOVE/COPY/STORE），
+匹配的邮件再多也只需要几十条命令，而不是每封邮件一条。
+
+配置项 action_rules 每行一条规则，格式为 "<IMAP 搜索条件> => <操作>"：
+    FROM "news@example.com" OLDER_THAN 7 => move Newsletters
+    FROM "alerts@example.com" UNSEEN => flag \\Seen
+    SUBJECT "invoice" => copy "Archive/Invoices"
+    FROM "noreply@example.com" OLDER_THAN 90 => delete
+OLDER_THAN <天数> 会被替换为对应的 BEFORE 日期；操作为
+move/copy <文件夹>、flag/unflag <标记...>、delete。
+"""
+
+import re
+import base64
+import shlex
+
+from gmail import quote
+from uid_set import UidSet
+
+_OLDER_THAN_RE = re.compile(r'\bOLDER_THAN\s+(\d+)\b', re.IGNORECASE)
+
+ACTIONS = ('move', 'copy', 'flag', 'unflag', 'delete')
+
+
+class ActionError(ValueError):
+    """操作规则格式错误"""
+
+
+class Action:
+    """一个批量操作：kind 为 ACTIONS 之一，move/copy 的目标文件夹或 flag/unflag 的标记列表"""
+
+    __slots__ = ('kind', 'folder', 'flags')
+
+    def __init__(self, kind, folder=None, flags=()):
+        self.kind = kind
+        self.folder = folder
+        self.flags = tuple(flags)
+
+    @classmethod
+    def parse(cls, text):
+        """
+        解析 "move Newsletters"、"flag \\Seen \\Flagged"、"delete" 这样的操作
+
+        Raises:
+            ActionError: 操作名未知或缺少参数
+        """
+        try:
+            words = shlex.split(text, posix=True) if '"' in text else text.split()
+        except ValueError as e:
+            raise ActionError(f"无法解析操作 {text!r}: {str(e)}")
+        if not words:
+            raise ActionError("缺少操作")
+        kind, args = words[0].lower(), words[1:]
+        if kind not in ACTIONS:
+            raise ActionError(f"未知操作 {words[0]!r}，可用: {', '.join(ACTIONS)}")
+        if kind in ('move', 'copy'):
+            if len(args) != 1:
+                raise ActionError(f"{kind} 需要一个目标文件夹，名称含空格时加引号")
+            return cls(kind, folder=args[0])
+        if kind in ('flag', 'unflag'):
+            if not args:
+                raise ActionError(f"{kind} 需要至少一个标记")
+            return cls(kind, flags=args)
+        if args:
+            raise ActionError("delete 不需要参数")
+        return cls(kind)
+
+    def __str__(self):
+        if self.folder is not None:
+            return f"{self.kind} {quote(self.folder)}"
+        return ' '.join((self.kind,) + self.flags)
+
+    def __repr__(self):
+        return f"Action({str(self)!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, Action) and (self.kind, self.folder, self.flags) == (
+            other.kind, other.folder, other.flags)
+
+
+class ActionRule:
+    """一条规则：搜索条件和匹配后执行的操作"""
+
+    __slots__ = ('criteria', 'action')
+
+    def __init__(self, criteria, action):
+        self.criteria = criteria
+        self.action = action
+
+    def __str__(self):
+        return f"{self.criteria} => {self.action}"
+
+    def search_criteria(self, age_criteria):
+        """
+        替换 OLDER_THAN <天数> 后的 IMAP 搜索条件
+
+        Args:
+            age_criteria: 天数 -> BEFORE 条件的函数，例如 QQEmailCleaner.get_age_criteria
+        """
+        def replace(match):
+            age = age_criteria(int(match.group(1)))
+            return '' if age == 'ALL' else age
+        criteria = ' '.join(_OLDER_THAN_RE.sub(replace, self.criteria).split())
+        return criteria or 'ALL'
+
+
+def parse_rules(value):
+    """
+    由配置值构建规则列表，每行一条，空行和 # 开头的行忽略
+
+    Raises:
+        ActionError: 某一行格式错误，信息中包含行内容
+    """
+    rules = []
+    for line in (value or '').splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        criteria, separator, action = line.rpartition('=>')
+        if not separator or not criteria.strip():
+            raise ActionError(f"规则缺少 \"条件 => 操作\": {line!r}")
+        try:
+            rules.append(ActionRule(criteria.strip(), Action.parse(action.strip())))
+        except ActionError as e:
+            raise ActionError(f"{str(e)}: {line!r}")
+    return rules
+
+
+class ActionResult:
+    """一次批量操作的结果汇总"""
+
+    __slots__ = ('action', 'matched', 'done', 'failed', 'commands')
+
+    def __init__(self, action, matched=0):
+        self.action = action
+        self.matched = matched
+        self.done = 0
+        self.failed = 0
+        self.commands = 0
+
+    @property
+    def skipped(self):
+        """到达运行时间上限而未处理的邮件数"""
+        return self.matched - self.done - self.failed
+
+    def __str__(self):
+        text = f"{self.action}: 匹配 {self.matched} 封，完成 {self.done} 封"
+        if self.failed:
+            text += f"，失败 {self.failed} 封"
+        if self.skipped:
+            text += f"，未处理 {self.skipped} 封"
+        return text + f"（{self.commands} 条命令）"
+
+
+def encode_folder(folder):
+    """
+    文件夹名称编码为 IMAP 修改版 UTF-7（RFC 3501 5.1.3）并加引号
+
+    只含ASCII字符的名称原样使用，list_folders 显示的已编码名称也可以直接填写
+    """
+    if folder.isascii():
+        return quote(folder)
+    parts = []
+    pending = []
+
+    def flush():
+        if pending:
+            encoded = base64.b64encode(''.join(pending).encode('utf-16-be')).decode('ascii')
+            parts.append('&' + encoded.rstrip('=').replace('/', ',') + '-')
+            pending.clear()
+
+    for ch in folder:
+        if 0x20 <= ord(ch) <= 0x7e:
+            flush()
+            parts.append('&-' if ch == '&' else ch)
+        else:
+            pending.append(ch)
+    flush()
+    return quote(''.join(parts))
+
+
+def apply_action(mail, uids, action, capabilities=(), logger=None, should_stop=None):
+    """
+    按UID区间对当前文件夹中的邮件执行操作
+
+    服务器不支持 MOVE 时用 COPY 加删除标记代替；move 和 delete 最后清除带删除标记的邮件，
+    服务器支持 UIDPLUS 时用 UID EXPUNGE 只清除本次处理的邮件，否则执行一次 EXPUNGE。
+
+    Args:
+        mail: 已选择文件夹的IMAP连接
+        uids (UidSet): 要处理的邮件
+        action (Action): 要执行的操作
+        capabilities: 服务器能力（大写），例如 gmail.server_capabilities 的结果
+        logger: 日志记录器
+        should_stop: 可选，返回 True 时不再处理剩余的区间
+
+    Returns:
+        ActionResult: 结果汇总
+    """
+    result = ActionResult(action, len(uids))
+    can_move = 'MOVE' in capabilities
+    removed = UidSet()
+    for chunk in uids.chunks():
+        if should_stop is not None and should_stop():
+            if logger:
+                logger.warning(f"已到达运行时间上限，剩余 {result.skipped} 封邮件留到下次处理")
+            break
+        count = len(UidSet.parse(chunk))
+        try:
+            status = _run(mail, chunk, action, can_move, result)
+        except Exception as e:
+            status = None
+            if logger:
+                logger.error(f"执行 {action} 时出错: {str(e)}")
+        if status == 'OK':
+            result.done += count
+            if action.kind == 'delete' or (action.kind == 'move' and not can_move):
+                removed = removed.union(UidSet.parse(chunk))
+        else:
+            result.failed += count
+            if status is not None and logger:
+                logger.error(f"执行 {action} 失败: {chunk}")
+    if removed:
+        _expunge(mail, removed, 'UIDPLUS' in capabilities, result, logger)
+    return result
+
+
+def _run(mail, chunk, action, can_move, result):
+    """对一个区间执行操作，返回最后一条命令的状态"""
+    if action.kind == 'move' and can_move:
+        result.commands += 1
+        status, _ = mail.uid('MOVE', chunk, encode_folder(action.folder))
+        return status
+    if action.kind in ('move', 'copy'):
+        result.commands += 1
+        status, _ = mail.uid('COPY', chunk, encode_folder(action.folder))
+        if status != 'OK' or action.kind == 'copy':
+            return status
+        flags, mode = ('\\Deleted',), '+FLAGS.SILENT'
+    elif action.kind == 'delete':
+        flags, mode = ('\\Deleted',), '+FLAGS.SILENT'
+    else:
+        flags, mode = action.flags, '+FLAGS.SILENT' if action.kind == 'flag' else '-FLAGS.SILENT'
+    # .SILENT 避免服务器为每封邮件返回一条 FETCH 响应
+    result.commands += 1
+    status, _ = mail.uid('STORE', chunk, mode, f"({' '.join(flags)})")
+    return status
+
+
+def _expunge(mail, uids, uidplus, result, logger):
+    """清除已标记删除的邮件"""
+    try:
+        if uidplus:
+            for chunk in uids.chunks():
+                result.commands += 1
+                mail.uid('EXPUNGE', chunk)
+        else:
+            result.commands += 1
+            mail.expunge()
+    except Exception as e:
+        if logger:
+            logger.error(f"清除已删除邮件时出错: {str(e)}")
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+发送人统计
+只获取发件人、Content-Type 两个邮件头以及标志位、大小和接收时间，
+按发送人地址或域名分组统计邮件数量、总大小、已读比例、邮件年龄分布和附件比例，
+用于挑选 target_senders
+
+用法:
+    python analytics.py                        # 扫描收件箱并按发送人统计
+    python analytics.py --by domain --top 30   # 按域名统计前30名
+    python analytics.py --save index.json      # 扫描后保存本地索引
+    python analytics.py --index index.json     # 直接读取本地索引，不连接邮箱
+    python analytics.py --csv senders.csv      # 同时输出CSV
+"""
+
+import re
+import sys
+import csv
+import json
+import time
+import bisect
+import calendar
+import argparse
+import logging
+from array import array
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+from email.utils import parseaddr
+
+import log_setup
+from mail_records import iter_fetch_responses, FLAG_SEEN, parse_flags
+from digest import pad_text
+
+ANALYTICS_FETCH_ITEMS = '(UID FLAGS RFC822.SIZE INTERNALDATE BODY.PEEK[HEADER.FIELDS (FROM CONTENT-TYPE)])'
+
+# 邮件年龄分组上限（天）和名称
+AGE_LIMITS = (7, 30, 90, 365)
+AGE_LABELS = ('<7天', '<30天', '<90天', '<1年', '≥1年')
+
+_UID_RE = re.compile(rb'UID (\d+)')
+_SIZE_RE = re.compile(rb'RFC822\.SIZE (\d+)')
+_FLAGS_RE = re.compile(rb'FLAGS \(([^)]*)\)')
+_INTERNALDATE_RE = re.compile(
+    rb'INTERNALDATE "\s?(\d{1,2})-(\w{3})-(\d{4}) (\d{2}):(\d{2}):(\d{2}) ([-+])(\d{2})(\d{2})"')
+_MONTHS = {name.encode(): index for index, name in enumerate(calendar.month_abbr) if name}
+_FROM_RE = re.compile(rb'^from:[ \t]*(.*(?:\r?\n[ \t].*)*)', re.IGNORECASE | re.MULTILINE)
+_CONTENT_TYPE_RE = re.compile(rb'^content-type:[ \t]*([\w.+-]+)/([\w.+-]+)', re.IGNORECASE | re.MULTILINE)
+
+
+def _has_attachment(content_type):
+    """按顶层 Content-Type 粗略判断是否带附件：multipart/mixed 或非文本单部分邮件"""
+    if content_type is None:
+        return False
+    maintype, subtype = content_type.group(1).lower(), content_type.group(2).lower()
+    if maintype == b'multipart':
+        return subtype == b'mixed'
+    return maintype not in (b'text', b'message')
+
+
+def _internaldate_timestamp(match, day_cache):
+    """把 INTERNALDATE 转换为时间戳，同一天的日期部分只计算一次"""
+    day, month, year, hour, minute, second, sign, zone_hour, zone_minute = match.groups()
+    day_key = (day, month, year)
+    midnight = day_cache.get(day_key)
+    if midnight is None:
+        midnight = day_cache[day_key] = calendar.timegm((int(year), _MONTHS.get(month, 1), int(day), 0, 0, 0))
+    offset = (int(zone_hour) * 3600 + int(zone_minute) * 60) * (1 if sign == b'+' else -1)
+    return midnight + int(hour) * 3600 + int(minute) * 60 + int(second) - offset
+
+
+class HeaderIndex:
+    """
+    按列存储的邮件头索引
+
+    发送人字符串驻留，大小、时间、已读和附件标记保存在 array 中，
+    十万封邮件只占几MB内存，也可以保存为本地文件后重复统计。
+    """
+
+    def __init__(self):
+        self.senders = []
+        self.sizes = array('Q')
+        self.timestamps = array('q')
+        self.seen = array('B')
+        self.attachments = array('B')
+        self._intern = {}
+        # 同一发件人的 From 头通常完全相同，解析结果按原始内容缓存
+        self._from_cache = {}
+        self._day_cache = {}
+
+    def __len__(self):
+        return len(self.senders)
+
+    def append(self, sender, size, timestamp, seen, attachment):
+        self.senders.append(self._intern.setdefault(sender, sender))
+        self.sizes.append(size)
+        self.timestamps.append(timestamp)
+        self.seen.append(1 if seen else 0)
+        self.attachments.append(1 if attachment else 0)
+
+    def add_fetch_response(self, data):
+        """解析 ANALYTICS_FETCH_ITEMS 的FETCH响应"""
+        for meta, literals in iter_fetch_responses(data or []):
+            if not _UID_RE.search(meta):
+                continue
+            header = literals[0] if literals else b''
+            from_match = _FROM_RE.search(header)
+            raw_from = from_match.group(1) if from_match else b''
+            sender = self._from_cache.get(raw_from)
+            if sender is None:
+                sender = parseaddr(raw_from.decode('utf-8', errors='replace'))[1].lower()
+                self._from_cache[raw_from] = sender
+            size_match = _SIZE_RE.search(meta)
+            flags_match = _FLAGS_RE.search(meta)
+            internal = _INTERNALDATE_RE.search(meta)
+            self.append(
+                sender,
+                int(size_match.group(1)) if size_match else 0,
+                _internaldate_timestamp(internal, self._day_cache) if internal else 0,
+                flags_match is not None and parse_flags(flags_match.group(1)) & FLAG_SEEN,
+                _has_attachment(_CONTENT_TYPE_RE.search(header))
+            )
+
+    @classmethod
+    def scan(cls, mail, uids, batch_size=1000, logger=None):
+        """
+        扫描当前已选择文件夹中的邮件头
+
+        Args:
+            mail: imaplib 连接
+            uids (UidSet): 要扫描的UID
+            batch_size (int): 每次FETCH请求包含的UID数量
+        """
+        logger = logger or logging.getLogger(__name__)
+        index = cls()
+        for chunk in uids.batches(batch_size):
+            status, data = mail.uid('FETCH', str(chunk), ANALYTICS_FETCH_ITEMS)
+            if status != 'OK':
+                logger.error(f"获取邮件头失败: {chunk}")
+                continue
+            index.add_fetch_response(data)
+        return index
+
+    def save(self, path):
+        """保存为本地索引文件，发送人按编号存储"""
+        codes = {}
+        sender_codes = [codes.setdefault(sender, len(codes)) for sender in self.senders]
+        data = {
+            'senders': list(codes),
+            'sender_codes': sender_codes,
+            'sizes': self.sizes.tolist(),
+            'timestamps': self.timestamps.tolist(),
+            'seen': self.seen.tolist(),
+            'attachments': self.attachments.tolist(),
+            'created': int(time.time())
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        """读取本地索引文件"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        index = cls()
+        index.senders = list(map(data['senders'].__getitem__, data['sender_codes']))
+        index.sizes = array('Q', data['sizes'])
+        index.timestamps = array('q', data['timestamps'])
+        index.seen = array('B', data['seen'])
+        index.attachments = array('B', data['attachments'])
+        return index
+
+
+def aggregate(index, by='sender', now=None):
+    """
+    按发送人地址或域名分组统计
+
+    先按分组键排序下标，再对每组的下标切片整体求和/计数，不逐封更新字典。
+
+    Args:
+        index (HeaderIndex): 邮件头索引
+        by (str): 'sender' 或 'domain'
+        now (float): 计算年龄的当前时间，默认当前时间
+
+    Returns:
+        list: 每组一个字典，按总大小降序
+    """
+    now = now or time.time()
+    if by == 'domain':
+        domains = {sender: sender.rpartition('@')[2] for sender in set(index.senders)}
+        keys = list(map(domains.__getitem__, index.senders))
+    else:
+        keys = index.senders
+
+    limits = [now - days * 86400 for days in reversed(AGE_LIMITS)]
+    # 时间越早桶号越大：0 为 <7天，len(AGE_LIMITS) 为 ≥1年
+    buckets = [len(AGE_LIMITS) - bisect.bisect_right(limits, ts) for ts in index.timestamps]
+
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    rows = []
+    for key, group in groupby(order, key=keys.__getitem__):
+        members = list(group)
+        count = len(members)
+        pick = itemgetter(*members) if count > 1 else (lambda column: (column[members[0]],))
+        ages = Counter(pick(buckets))
+        rows.append({
+            'key': key or '(未知)',
+            'count': count,
+            'bytes': sum(pick(index.sizes)),
+            'read_ratio': sum(pick(index.seen)) / count,
+            'attachment_ratio': sum(pick(index.attachments)) / count,
+            'ages': [ages.get(bucket, 0) for bucket in range(len(AGE_LABELS))]
+        })
+    rows.sort(key=lambda row: (-row['bytes'], -row['count']))
+    return rows
+
+
+def _format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+def format_table(rows, top=20):
+    """生成按排名排列的文本表格"""
+    header = (pad_text('#', 5) + pad_text('发送人/域名', 40) + pad_text('数量', 8, True)
+              + pad_text('大小', 10, True) + pad_text('已读', 7, True) + pad_text('附件', 7, True)
+              + ''.join(pad_text(label, 8, True) for label in AGE_LABELS))
+    lines = [header, '-' * len(header)]
+    for rank, row in enumerate(rows[:top], 1):
+        lines.append(
+            pad_text(rank, 5) + pad_text(row['key'][:40], 40) + pad_text(row['count'], 8, True)
+            + pad_text(_format_size(row['bytes']), 10, True)
+            + pad_text(f"{row['read_ratio']:.0%}", 7, True)
+            + pad_text(f"{row['attachment_ratio']:.0%}", 7, True)
+            + ''.join(pad_text(count, 8, True) for count in row['ages'])
+        )
+    return "\n".join(lines)
+
+
+def write_csv(rows, path):
+    """输出全部分组到CSV（UTF-8 带BOM，便于用 Excel 打开）"""
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['rank', 'key', 'count', 'bytes', 'read_ratio', 'attachment_ratio'] + list(AGE_LABELS))
+        for rank, row in enumerate(rows, 1):
+            writer.writerow([rank, row['key'], row['count'], row['bytes'],
+                             f"{row['read_ratio']:.3f}", f"{row['attachment_ratio']:.3f}"] + row['ages'])
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='按发送人统计邮箱中的邮件')
+    parser.add_argument('--folder', default='INBOX', help='要统计的文件夹，默认 INBOX')
+    parser.add_argument('--by', choices=('sender', 'domain'), default='sender', help='按发送人地址或域名分组')
+    parser.add_argument('--sort', choices=('bytes', 'count'), default='bytes', help='排序方式')
+    parser.add_argument('--top', type=int, default=20, help='表格显示的行数')
+    parser.add_argument('--csv', help='输出CSV文件路径')
+    parser.add_argument('--index', help='读取本地索引文件，不连接邮箱')
+    parser.add_argument('--save', help='扫描后保存本地索引文件')
+    args = parser.parse_args()
+
+    # 与 QQEmailCleaner 共用同一套日志配置，只配置一次；日志输出到 stderr，表格输出到 stdout
+    log_setup.setup_logging('email_cleaner.log')
+    logger = logging.getLogger(__name__)
+
+    started = time.time()
+    if args.index:
+        index = HeaderIndex.load(args.index)
+    else:
+        from clear_qq_email import QQEmailCleaner
+        cleaner = QQEmailCleaner()
+        if not cleaner.connect_to_mailbox():
+            sys.exit(1)
+        try:
+            cleaner.mail.select(args.folder, readonly=True)
+            uids = cleaner.search_uids('ALL')
+            batch_size = max(cleaner.config['EMAIL'].getint('fetch_batch_size', 500), 1000)
+            index = HeaderIndex.scan(cleaner.mail, uids, batch_size, logger)
+        finally:
+            cleaner.disconnect()
+        if args.save:
+            index.save(args.save)
+            logger.info(f"本地索引已保存: {args.save}")
+
+    rows = aggregate(index, args.by)
+    if args.sort == 'count':
+        rows.sort(key=lambda row: (-row['count'], -row['bytes']))
+    logger.info(f"共 {len(index)} 封邮件，{len(rows)} 个分组，用时 {time.time() - started:.1f} 秒")
+    print(format_table(rows, args.top))
+    if args.csv:
+        write_csv(rows, args.csv)
+        logger.info(f"CSV已保存: {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+删除前归档
+把待删除邮件的原始内容按批写入压缩的 mbox 或 Maildir，不解析邮件；
+每批写完并 fsync 后才允许删除这一批邮件
+"""
+
+import os
+import re
+import sys
+import time
+import gzip
+import socket
+import logging
+
+from imap_stream import FetchBuffer, FetchError, iter_uid_fetch
+from uid_set import UidSet
+
+_UID_RE = re.compile(rb'UID (\d+)')
+# mboxrd 转义：以任意个 ">" 加 "From " 开头的行前再加一个 ">"
+_FROM_LINE_RE = re.compile(rb'^(>*From )', re.MULTILINE)
+
+
+def _write_escaped(out, body):
+    """
+    按 mboxrd 规则转义后写入，只写原文的切片，不生成转义后的副本
+
+    Returns:
+        int: 写入的字节数
+    """
+    position = 0
+    escaped = 0
+    for match in _FROM_LINE_RE.finditer(body):
+        out.write(body[position:match.start()])
+        out.write(b'>')
+        position = match.start()
+        escaped += 1
+    out.write(body[position:])
+    return len(body) + escaped
+
+
+def _safe_name(name):
+    """文件夹名转换为安全的文件名"""
+    return re.sub(r'[^\w.-]+', '_', name).strip('_') or 'folder'
+
+
+class MailArchiver:
+    """
+    邮件归档器
+
+    mbox 格式：每批写为 gzip 文件中的一个独立成员，索引文件记录
+    UID、成员起始偏移、成员内偏移和长度，恢复单封邮件时只需解压一个成员。
+    Maildir 格式：每封邮件一个文件，索引文件记录 UID 和文件名。
+    """
+
+    def __init__(self, archive_dir, account, folder='INBOX', archive_format='mbox', batch_size=50, logger=None):
+        """
+        Args:
+            archive_dir (str): 归档根目录
+            account (str): 邮箱账号，作为子目录名
+            folder (str): 邮件文件夹
+            archive_format (str): 'mbox' 或 'maildir'
+            batch_size (int): 每次FETCH并写入的邮件数量
+            logger: 日志记录器
+        """
+        if archive_format not in ('mbox', 'maildir'):
+            raise ValueError(f"不支持的归档格式: {archive_format}")
+        self.archive_format = archive_format
+        self.batch_size = batch_size
+        self.logger = logger or logging.getLogger(__name__)
+        self.base_dir = os.path.join(archive_dir, _safe_name(account))
+        os.makedirs(self.base_dir, exist_ok=True)
+        name = _safe_name(folder)
+        if archive_format == 'mbox':
+            self.path = os.path.join(self.base_dir, f"{name}.mbox.gz")
+        else:
+            self.path = os.path.join(self.base_dir, name)
+            for sub in ('tmp', 'new', 'cur'):
+                os.makedirs(os.path.join(self.path, sub), exist_ok=True)
+        self.index_path = os.path.join(self.base_dir, f"{name}.{archive_format}.idx")
+
+    def iter_archive(self, mail, uids):
+        """
+        逐批归档邮件
+
+        Args:
+            mail: 已选择文件夹的 imaplib 连接
+            uids (UidSet): 待归档的UID
+
+        Yields:
+            UidSet: 已写入并 fsync 的一批UID，调用方可以删除这一批
+        """
+        buffer = FetchBuffer()
+        for chunk in uids.batches(self.batch_size):
+            # 每封邮件从读取缓冲区直接写入归档，不在内存中保留整批邮件
+            messages = self._iter_messages(mail, str(chunk), buffer)
+            try:
+                if self.archive_format == 'mbox':
+                    archived = self._write_mbox(messages)
+                else:
+                    archived = self._write_maildir(messages)
+            except FetchError:
+                self.logger.error(f"归档时获取邮件失败: {chunk}")
+                continue
+            if archived:
+                yield UidSet(archived)
+
+    def _iter_messages(self, mail, chunk, buffer):
+        """逐封产出 (UID, 邮件原文)，原文在取下一封之前有效"""
+        for meta, literals in iter_uid_fetch(mail, chunk, '(UID BODY.PEEK[])', buffer):
+            uid_match = _UID_RE.search(meta)
+            if uid_match and literals:
+                yield int(uid_match.group(1)), literals[0]
+
+    def _write_mbox(self, messages):
+        """
+        把一批邮件写为 gzip 中的一个成员并更新索引
+
+        Returns:
+            list: 已写入的UID
+        """
+        index_lines = []
+        archived = []
+        with open(self.path, 'ab') as raw:
+            member_offset = raw.tell()
+            with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as gz:
+                offset = 0
+                for uid, body in messages:
+                    envelope = f"From MAILER-DAEMON {time.asctime()}\n".encode()
+                    gz.write(envelope)
+                    length = _write_escaped(gz, body)
+                    # 邮件之间用空行分隔，索引只记录邮件本身的长度
+                    separator = b'\n' if body[-1:] == b'\n' else b'\n\n'
+                    gz.write(separator)
+                    index_lines.append(f"{uid}\t{member_offset}\t{offset + len(envelope)}\t{length}\n")
+                    offset += len(envelope) + length + len(separator)
+                    archived.append(uid)
+            raw.flush()
+            os.fsync(raw.fileno())
+        self._append_index(index_lines)
+        return archived
+
+    def _write_maildir(self, messages):
+        """
+        每封邮件写入 tmp 后改名到 cur，并更新索引
+
+        Returns:
+            list: 已写入的UID
+        """
+        host = socket.gethostname().replace('/', '_').replace(':', '_')
+        index_lines = []
+        archived = []
+        for uid, body in messages:
+            name = f"{int(time.time())}.{os.getpid()}_{uid}.{host}:2,S"
+            tmp_path = os.path.join(self.path, 'tmp', name)
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(tmp_path, os.path.join(self.path, 'cur', name))
+            index_lines.append(f"{uid}\t{name}\n")
+            archived.append(uid)
+        if not archived:
+            return archived
+        dir_fd = os.open(os.path.join(self.path, 'cur'), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        self._append_index(index_lines)
+        return archived
+
+    def _append_index(self, lines):
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def restore(self, uid):
+        """
+        从归档中取出单封邮件的原始内容
+
+        Returns:
+            bytes: 邮件内容（mbox 中的 ">From " 转义已还原），找不到时返回 None
+        """
+        entry = None
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    fields = line.rstrip('\n').split('\t')
+                    if fields[0] == str(uid):
+                        entry = fields
+        if entry is None:
+            return None
+
+        if self.archive_format == 'maildir':
+            with open(os.path.join(self.path, 'cur', entry[1]), 'rb') as f:
+                return f.read()
+
+        member_offset, offset, length = int(entry[1]), int(entry[2]), int(entry[3])
+        with open(self.path, 'rb') as raw:
+            raw.seek(member_offset)
+            # 从该成员开始解压，只读到目标邮件为止
+            with gzip.GzipFile(fileobj=raw, mode='rb') as gz:
+                gz.read(offset)
+                body = gz.read(length)
+        return re.sub(rb'^>(>*From )', rb'\1', body, flags=re.MULTILINE)
+
+
+def main():
+    """从归档恢复单封邮件: python archive.py <归档目录> <邮箱> <文件夹> <UID> [mbox|maildir]"""
+    if len(sys.argv) < 5:
+        print(main.__doc__)
+        sys.exit(1)
+    archive_dir, account, folder, uid = sys.argv[1:5]
+    archive_format = sys.argv[5] if len(sys.argv) > 5 else 'mbox'
+    body = MailArchiver(archive_dir, account, folder, archive_format).restore(int(uid))
+    if body is None:
+        print(f"归档中没有UID为 {uid} 的邮件", file=sys.stderr)
+        sys.exit(1)
+    sys.stdout.buffer.write(body)
+
+
+if __name__ == "__main__":
+    main()
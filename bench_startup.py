@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动开销测试
+在独立的子进程中多次测量空解释器、导入 cron_cleaner、创建清理器（含读取配置和日志初始化）的耗时，
+不连接邮箱。每个邮箱每次运行都要付出这部分开销，账号较多时可据此评估
+
+用法:
+    python bench_startup.py                    # 默认各运行20次
+    python bench_startup.py -n 50 --importtime # 同时列出导入最慢的模块
+"""
+
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import subprocess
+import statistics
+import time
+
+from digest import pad_text
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CASES = [
+    ('空解释器', 'pass'),
+    ('导入 cron_cleaner', 'import cron_cleaner'),
+    ('创建清理器（配置缓存）', 'from clear_qq_email import QQEmailCleaner; QQEmailCleaner()'),
+]
+
+
+def run_case(code, runs, workdir, env):
+    """运行多次并返回每次的耗时（毫秒）"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=workdir, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def show_importtime(workdir, env, top=15):
+    """用 -X importtime 列出累计耗时最多的模块"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import cron_cleaner'],
+                            cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.rstrip()))
+    print(f"\n导入 cron_cleaner 时累计耗时最多的 {top} 个模块:")
+    for cumulative, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative / 1000:8.2f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测试启动开销')
+    parser.add_argument('-n', '--runs', type=int, default=20, help='每项运行次数')
+    parser.add_argument('--importtime', action='store_true', help='列出导入最慢的模块')
+    args = parser.parse_args()
+
+    # 在临时目录中运行，避免写入项目目录下的日志和配置缓存
+    workdir = tempfile.mkdtemp(prefix='bench_startup_')
+    try:
+        shutil.copy(os.path.join(PROJECT_DIR, 'email_config_example.ini'),
+                    os.path.join(workdir, 'email_config.ini'))
+        env = dict(os.environ, PYTHONPATH=PROJECT_DIR)
+        # 预热：生成字节码缓存和配置缓存
+        run_case(CASES[-1][1], 1, workdir, env)
+
+        print(pad_text('项目', 26) + pad_text('最短(ms)', 10, True) + pad_text('中位数(ms)', 12, True)
+              + pad_text('最长(ms)', 10, True))
+        for name, code in CASES:
+            timings = run_case(code, args.runs, workdir, env)
+            print(pad_text(name, 26) + pad_text(f"{min(timings):.1f}", 10, True)
+                  + pad_text(f"{statistics.median(timings):.1f}", 12, True) + pad_text(f"{max(timings):.1f}", 10, True))
+
+        if args.importtime:
+            show_importtime(workdir, env)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
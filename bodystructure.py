@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+IMAP BODYSTRUCTURE 解析
+无需下载邮件即可得到MIME结构，用于定位正文部分和判断附件
+"""
+
+import re
+
+
+class BodyStructureError(ValueError):
+    """BODYSTRUCTURE 格式错误"""
+
+
+def _tokenize(data, literals):
+    """
+    将响应拆分为 b'(' b')'、原子（bytes）和字符串（str），{n} 字面量按顺序从 literals 中取出
+
+    带引号的字符串和字面量解码为 str，值为 "(" 的文件名等参数不会被当作括号
+    """
+    literals = list(literals)
+    i = 0
+    length = len(data)
+    while i < length:
+        ch = data[i:i + 1]
+        if ch in b' \r\n':
+            i += 1
+        elif ch in b'()':
+            yield ch
+            i += 1
+        elif ch == b'"':
+            i += 1
+            buf = bytearray()
+            while i < length and data[i:i + 1] != b'"':
+                if data[i:i + 1] == b'\\':
+                    i += 1
+                buf += data[i:i + 1]
+                i += 1
+            if i >= length:
+                raise BodyStructureError("字符串缺少结束引号")
+            i += 1
+            yield buf.decode('utf-8', errors='replace')
+        elif ch == b'{':
+            end = data.find(b'}', i)
+            if end < 0 or not literals:
+                raise BodyStructureError("字面量格式错误")
+            i = end + 1
+            yield bytes(literals.pop(0)).decode('utf-8', errors='replace')
+        else:
+            start = i
+            while i < length and data[i:i + 1] not in b' ()\r\n':
+                i += 1
+            atom = data[start:i]
+            if atom.upper() == b'NIL':
+                yield None
+            elif atom.isdigit():
+                yield int(atom)
+            else:
+                yield atom
+
+
+def parse_sexp(data, literals=()):
+    """
+    把IMAP括号表达式解析为嵌套列表，字符串为 str，数字为 int，NIL 为 None
+
+    Args:
+        data (bytes): 以 '(' 开头的表达式
+        literals: 表达式中 {n} 字面量对应的内容
+    """
+    stack = [[]]
+    for token in _tokenize(data, literals):
+        if token == b'(':
+            stack.append([])
+        elif token == b')':
+            if len(stack) < 2:
+                raise BodyStructureError("括号不匹配")
+            item = stack.pop()
+            stack[-1].append(item)
+            if len(stack) == 1:
+                break
+        elif isinstance(token, bytes):
+            # 原子
+            stack[-1].append(token.decode('utf-8', errors='replace'))
+        else:
+            stack[-1].append(token)
+    if len(stack) != 1 or not stack[0]:
+        raise BodyStructureError("表达式不完整")
+    return stack[0][0]
+
+
+def extract_bodystructure(meta, literals=()):
+    """
+    从FETCH响应的元数据中取出并解析 BODYSTRUCTURE
+
+    Args:
+        meta (bytes): iter_fetch_responses 返回的元数据
+        literals: 对应的字面量列表
+    """
+    start = meta.find(b'BODYSTRUCTURE (')
+    if start < 0:
+        raise BodyStructureError("响应中没有 BODYSTRUCTURE")
+    before = meta[:start]
+    # 跳过 BODYSTRUCTURE 之前的数据项所带的字面量
+    skip = len(re.findall(rb'\{\d+\}', before))
+    return parse_sexp(meta[start + len(b'BODYSTRUCTURE '):], list(literals)[skip:])
+
+
+def _is_multipart(node):
+    return isinstance(node, list) and node and isinstance(node[0], list)
+
+
+def _params(value):
+    """把 ("charset" "utf-8" ...) 参数列表转换为小写键的字典"""
+    if not isinstance(value, list):
+        return {}
+    return {str(value[i]).lower(): value[i + 1] for i in range(0, len(value) - 1, 2)}
+
+
+def iter_parts(node, prefix=''):
+    """
+    遍历全部叶子部分
+
+    Yields:
+        tuple: (部分编号如 "1.2", 叶子节点列表)
+    """
+    if _is_multipart(node):
+        # 子部分在前，之后依次是子类型、参数等扩展字段
+        children = []
+        for child in node:
+            if not isinstance(child, list):
+                break
+            children.append(child)
+        for index, child in enumerate(children, 1):
+            yield from iter_parts(child, f"{prefix}{index}" if not prefix else f"{prefix}.{index}")
+        return
+
+    section = prefix or '1'
+    yield section, node
+    # message/rfc822 的正文结构位于第9个字段
+    if (str(node[0]).lower(), str(node[1]).lower()) == ('message', 'rfc822') and len(node) > 8:
+        inner = node[8]
+        if _is_multipart(inner):
+            yield from iter_parts(inner, section)
+        elif isinstance(inner, list):
+            yield from iter_parts(inner, f"{section}.1")
+
+
+def _disposition(node):
+    """叶子部分的 Content-Disposition 字段"""
+    maintype = str(node[0]).lower()
+    subtype = str(node[1]).lower()
+    if maintype == 'text':
+        index = 9
+    elif (maintype, subtype) == ('message', 'rfc822'):
+        index = 11
+    else:
+        index = 8
+    return node[index] if len(node) > index else None
+
+
+def has_attachment(structure):
+    """
+    是否带有附件
+
+    与按 Content-Disposition 判断的原有逻辑一致：任一非 multipart 部分带有
+    Content-Disposition 即视为有附件。
+    """
+    for _, node in iter_parts(structure):
+        if _disposition(node) is not None:
+            return True
+    return False
+
+
+def find_text_part(structure, prefer=('plain', 'html')):
+    """
+    查找正文部分
+
+    Returns:
+        tuple: (部分编号, 子类型, 字符集, 传输编码)，找不到时返回 None
+    """
+    candidates = {}
+    for section, node in iter_parts(structure):
+        if len(node) < 7 or str(node[0]).lower() != 'text' or _disposition(node) is not None:
+            continue
+        subtype = str(node[1]).lower()
+        if subtype in candidates:
+            continue
+        charset = _params(node[2]).get('charset') or 'utf-8'
+        encoding = str(node[5] or '7bit').lower()
+        candidates[subtype] = (section, subtype, charset, encoding)
+    for subtype in prefer:
+        if subtype in candidates:
+            return candidates[subtype]
+    return None
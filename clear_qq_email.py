@@ -5,14 +5,23 @@ QQ邮箱自动清理工具
 自动删除来自指定发送人的邮件
 """
 
-import imaplib
-import email
 import os
-import configparser
-from email.header import decode_header
+import re
+import sys
+import time
 from datetime import datetime
 import logging
 
+from mail_records import MailBatch, HEADER_FETCH_ITEMS, iter_fetch_responses
+from uid_set import UidSet
+from log_setup import setup_logging, log_event, config_options
+from config_cache import load_cached_config
+import profiling
+import metrics
+
+# imaplib、email、smtplib 以及各清理规则模块在用到时才导入，
+# 减少 cron 每次启动的开销
+
 class QQEmailCleaner:
     def __init__(self, config_file='email_config.ini'):
         """
@@ -24,6 +33,18 @@ class QQEmailCleaner:
         self.config_file = config_file
         self.config = self.load_config()
         self.mail = None
+        # dry_run 时记录的删除计划，配置了 plan_file 才会生成
+        self.plan = None
+        # (连接, Gmail 快速路径信息)，每个连接查询一次
+        self.gmail_support = None
+        # 逐封下载邮件原文时复用的读取缓冲区
+        self.fetch_buffer = None
+        # 运行截止时间（scheduler.Deadline），到达后处理完当前批次即停止
+        self.deadline = None
+        # 建立IMAP连接的函数 (服务器, 端口) -> 连接，回放测试时指向本机回放服务器
+        self.imap_factory = None
+        # 批量操作规则中移动、复制、标记操作的结果摘要，不计入删除数量，由通知单独列出
+        self.action_summaries = []
         
         # 设置日志
         self.setup_logging()
@@ -40,24 +61,18 @@ class QQEmailCleaner:
         }
         
     def setup_logging(self):
-        """设置日志配置"""
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('email_cleaner.log', encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
+        """设置日志配置，进程内已配置过日志时沿用已有配置"""
+        setup_logging('email_cleaner.log', **config_options(self.config['EMAIL']))
         self.logger = logging.getLogger(__name__)
         
     def load_config(self):
-        """加载配置文件"""
-        config = configparser.ConfigParser()
-        
+        """加载配置文件，未修改过的配置文件直接读取解析缓存"""
         if os.path.exists(self.config_file):
-            config.read(self.config_file, encoding='utf-8')
+            config = load_cached_config(self.config_file)
         else:
+            import configparser
+            config = configparser.ConfigParser()
+
             # 创建默认配置
             config['EMAIL'] = {
                 'email': 'your_email@qq.com',
@@ -69,7 +84,10 @@ class QQEmailCleaner:
                 'days_before_delete': '3',
                 'clean_read_no_attachment': 'False',
                 'send_notification': 'True',
-                'notification_email': 'your_email@qq.com'
+                'notification_email': 'your_email@qq.com',
+                'async_notification': 'True',
+                'log_format': 'text',
+                'fetch_batch_size': '500'
             }
             
             with open(self.config_file, 'w', encoding='utf-8') as f:
@@ -80,6 +98,12 @@ class QQEmailCleaner:
             
         return config
         
+    def get_imap_endpoint(self):
+        """当前邮箱类型的 (IMAP服务器, 端口)"""
+        server_config = self.email_servers[self.config['EMAIL'].get('email_type', 'qq')]
+        return server_config['server'], server_config['port']
+        
+    @profiling.profiled('连接邮箱')
     def connect_to_mailbox(self):
         """连接到邮箱"""
         try:
@@ -88,13 +112,21 @@ class QQEmailCleaner:
                 self.logger.error(f"不支持的邮箱类型: {email_type}")
                 return False
                 
-            server_config = self.email_servers[email_type]
-            self.mail = imaplib.IMAP4_SSL(server_config['server'], server_config['port'])
+            # 复用TLS会话和DNS解析结果，重连时不必完整握手
+            from imap_connection import connect
+            endpoint = self.get_imap_endpoint()
+            self.mail = (self.imap_factory or connect)(*endpoint)
+            record_path = self.config['EMAIL'].get('record_transcript', '')
+            if record_path:
+                # 登录之前开始录制，LOGIN 命令中的凭据不会写入记录
+                from imap_replay import start_recording
+                start_recording(self.mail, record_path, f"{endpoint[0]}:{endpoint[1]}", self.get_target_senders())
             email_address = self.config['EMAIL']['email']
             password = self.config['EMAIL']['password']
             
             self.mail.login(email_address, password)
             self.logger.info(f"成功连接到{email_type}邮箱: {email_address}")
+            self.logger.debug(f"TLS会话恢复: {getattr(self.mail, 'session_reused', False)}")
             return True
             
         except Exception as e:
@@ -109,121 +141,201 @@ class QQEmailCleaner:
                 self.logger.info("已断开邮箱连接")
             except Exception as e:
                 self.logger.error(f"断开连接时出错: {str(e)}")
+            finally:
+                self.mail = None
                 
-    def get_sender_emails(self, sender):
-        """获取指定发送人的邮件ID列表"""
+    def deadline_reached(self):
+        """是否已到达运行时间上限"""
+        return self.deadline is not None and self.deadline.expired()
+        
+    def get_age_criteria(self, days_before_delete, strict=False):
+        """
+        服务器端按日期缩小范围的搜索条件，BEFORE 按天比较
+
+        默认多留一天余量，之后再按 Date 头精确筛选；strict 为 True 时不留余量，
+        结果中的邮件按服务器接收日期都已满 days_before_delete 天，可以直接删除
+        """
+        if days_before_delete <= 0:
+            return 'ALL'
+        days = days_before_delete if strict else days_before_delete - 1
+        before = datetime.fromtimestamp(time.time() - days * 86400)
+        return f'BEFORE {before.strftime("%d-%b-%Y")}'
+
+    @profiling.profiled('搜索')
+    def search_uids(self, criteria):
+        """在当前文件夹中按条件搜索，返回邮件UID集合"""
+        status, message_ids = self.mail.uid('SEARCH', None, criteria)
+        if status == 'OK' and message_ids and message_ids[0]:
+            return UidSet.from_search_response(message_ids[0])
+        return UidSet()
+
+    @profiling.profiled('获取邮件头')
+    def fetch_email_records(self, uids):
+        """
+        批量获取邮件元数据
+
+        每次FETCH请求最多包含 fetch_batch_size 个UID，只下载发件人、主题、
+        日期等邮件头以及标志位和大小，不下载正文。
+
+        响应按邮件流式解析，不在内存中保留整批响应。
+
+        Args:
+            uids: UidSet 或邮件UID序列
+
+        Returns:
+            MailBatch: 邮件元数据批次
+        """
+        from imap_stream import FetchBuffer, iter_uid_fetch
+        batch = MailBatch()
+        if not self.mail:
+            self.logger.error("邮箱连接未建立")
+            return batch
+
+        if not isinstance(uids, UidSet):
+            uids = UidSet(uids)
+        batch_size = self.config['EMAIL'].getint('fetch_batch_size', 500)
+        buffer = FetchBuffer(64 * 1024)
+        for chunk in uids.batches(batch_size):
+            if self.deadline_reached():
+                self.logger.warning(f"已到达运行时间上限，只获取了 {len(batch)}/{len(uids)} 封邮件的信息")
+                break
+            fetched = len(batch)
+            try:
+                for meta, literals in iter_uid_fetch(self.mail, str(chunk), HEADER_FETCH_ITEMS, buffer):
+                    batch.add_fetch_record(meta, literals)
+            except Exception as e:
+                self.logger.error(f"批量获取邮件信息时出错: {str(e)}")
+            metrics.add(scanned=len(batch) - fetched)
+        return batch
+
+    def get_sender_emails(self, sender, folder='INBOX'):
+        """获取指定文件夹中指定发送人的邮件元数据批次"""
         try:
             if not self.mail:
                 self.logger.error("邮箱连接未建立")
-                return []
+                return MailBatch()
                 
-            # 选择收件箱
-            self.mail.select('INBOX')
+            # 选择文件夹
+            self.mail.select(folder)
             
             # 搜索来自指定发送人的邮件
             search_criteria = f'FROM "{sender}"'
-            status, message_ids = self.mail.search(None, search_criteria)
+            uids = self.search_uids(search_criteria)
             
-            if status == 'OK' and message_ids and message_ids[0]:
-                email_ids = message_ids[0].split()
-                self.logger.info(f"找到来自 {sender} 的邮件 {len(email_ids)} 封")
-                return email_ids
+            if uids:
+                self.logger.info(f"找到来自 {sender} 的邮件 {len(uids)} 封")
+                return self.fetch_email_records(uids)
             else:
                 self.logger.info(f"未找到来自 {sender} 的邮件")
-                return []
+                return MailBatch()
                 
         except Exception as e:
             self.logger.error(f"搜索邮件时出错: {str(e)}")
-            return []
+            return MailBatch()
             
-    def get_email_info(self, email_id):
-        """获取邮件信息"""
+    @profiling.profiled('获取单封邮件信息')
+    def get_email_info(self, uid):
+        """获取单封邮件信息"""
         try:
             if not self.mail:
                 return None
                 
-            status, msg_data = self.mail.fetch(email_id, '(RFC822)')
-            if status == 'OK' and msg_data and len(msg_data) > 0:
-                email_body = msg_data[0][1]
-                if isinstance(email_body, bytes):
-                    email_message = email.message_from_bytes(email_body)
-                    
-                    # 解析邮件头信息
-                    subject = decode_header(email_message['subject'])[0][0]
-                    if isinstance(subject, bytes):
-                        subject = subject.decode('utf-8', errors='ignore')
-                        
-                    from_addr = decode_header(email_message['from'])[0][0]
-                    if isinstance(from_addr, bytes):
-                        from_addr = from_addr.decode('utf-8', errors='ignore')
-                        
-                    date = email_message['date']
-                    
-                    return {
-                        'subject': subject,
-                        'from': from_addr,
-                        'date': date
-                    }
+            batch = self.fetch_email_records([uid])
+            if batch:
+                record = batch[0]
+                return {
+                    'subject': record.subject,
+                    'from': record.sender,
+                    'date': record.date
+                }
         except Exception as e:
             self.logger.error(f"获取邮件信息时出错: {str(e)}")
             
         return None
         
-    def delete_emails(self, email_ids, dry_run=True, days_before_delete=3):
-        """删除邮件，只删除N天前的邮件"""
+    @profiling.profiled('删除')
+    def delete_emails(self, emails, dry_run=True, days_before_delete=3, folder='INBOX', rule=''):
+        """
+        删除邮件，只删除N天前的邮件
+
+        Args:
+            emails: MailBatch，或 UidSet/邮件UID序列（将先批量获取元数据）
+            dry_run (bool): 是否模拟删除
+            days_before_delete (int): 只删除几天前的邮件
+            folder (str): 当前选择的文件夹，用于删除前归档
+            rule (str): 选中这些邮件的清理规则，模拟删除时记入删除计划
+        """
         deleted_count = 0
         
         if not self.mail:
             self.logger.error("邮箱连接未建立")
             return deleted_count
         
-        now = datetime.now()
+        if not isinstance(emails, MailBatch):
+            emails = self.fetch_email_records(emails)
         
-        for email_id in email_ids:
-            try:
-                # 获取邮件信息用于日志
-                email_info = self.get_email_info(email_id)
-                
-                # 判断邮件日期
-                skip = False
-                if email_info and email_info['date']:
-                    try:
-                        # 解析邮件日期
-                        from email.utils import parsedate_to_datetime
-                        mail_date = parsedate_to_datetime(email_info['date'])
-                        if mail_date.tzinfo is not None:
-                            mail_date = mail_date.astimezone().replace(tzinfo=None)
-                        days_diff = (now - mail_date).days
-                        if days_diff < days_before_delete:
-                            skip = True
-                    except Exception as e:
-                        self.logger.warning(f"解析邮件日期失败: {email_info['date']}，跳过此邮件。错误: {str(e)}")
-                        skip = True
-                if skip:
-                    self.logger.info(f"[跳过] 邮件ID: {email_id.decode()}，日期: {email_info['date'] if email_info else '未知'}，未达到删除天数")
-                    continue
+        # 按日期筛选，日期未知或未达到删除天数的邮件跳过
+        cutoff = time.time() - days_before_delete * 86400
+        skipped = emails.newer_than(cutoff)
+        if skipped:
+            if self.logger.isEnabledFor(logging.DEBUG):
+                for record in skipped:
+                    log_event(self.logger, "[跳过]", logging.DEBUG, uid=record.uid, date=record.date)
+            self.logger.info(f"[跳过] {len(skipped)} 封邮件未达到删除天数")
+        
+        targets = emails.older_than(cutoff)
+        metrics.add(matched=len(targets))
+        if self.config['EMAIL'].getboolean('log_per_message', True):
+            action = "[模拟删除]" if dry_run else "[删除]"
+            for record in targets:
+                log_event(self.logger, action, uid=record.uid, sender=record.sender,
+                          subject=record.subject, date=record.date)
                 
-                if dry_run:
-                    self.logger.info(f"[模拟删除] 邮件ID: {email_id.decode()}")
-                    if email_info:
-                        self.logger.info(f"  主题: {email_info['subject']}")
-                        self.logger.info(f"  发件人: {email_info['from']}")
-                        self.logger.info(f"  日期: {email_info['date']}")
-                    deleted_count += 1
-                else:
-                    # 实际删除邮件
-                    self.mail.store(email_id, '+FLAGS', '\\Deleted')
-                    self.logger.info(f"[已删除] 邮件ID: {email_id.decode()}")
-                    if email_info:
-                        self.logger.info(f"  主题: {email_info['subject']}")
-                        self.logger.info(f"  发件人: {email_info['from']}")
-                    deleted_count += 1
-                    
-            except Exception as e:
-                self.logger.error(f"删除邮件时出错: {str(e)}")
+        if dry_run:
+            deleted_count = len(targets)
+            if targets and self.config['EMAIL'].get('plan_file', ''):
+                sender_counts = {}
+                for sender in targets.senders:
+                    sender_counts[sender] = sender_counts.get(sender, 0) + 1
+                self.record_plan(targets.uid_set(), folder, rule, sender_counts)
+            return deleted_count
+            
+        return self.remove_messages(targets.uid_set(), folder)
+        
+    def remove_messages(self, uids, folder='INBOX'):
+        """
+        标记删除当前文件夹中的邮件并执行expunge，配置了 archive_before_delete 时先归档
+
+        Gmail 中 EXPUNGE 只会去掉当前文件夹对应的标签，可用快速路径时改为移动到垃圾箱。
+
+        Args:
+            uids (UidSet): 要删除的邮件
+            folder (str): 当前选择的文件夹，用于删除前归档
+
+        Returns:
+            int: 标记删除的邮件数量
+        """
+        deleted_count = 0
+        gmail_support = self.get_gmail_support()
+        remove = self.mark_deleted if gmail_support is None else self.move_to_gmail_trash
+        if self.config['EMAIL'].getboolean('archive_before_delete', False):
+            # 先归档，每批写入并 fsync 后才删除这一批
+            archiver = self.get_archiver(folder)
+            for archived in archiver.iter_archive(self.mail, uids):
+                deleted_count += remove(archived)
+                if self.deadline_reached():
+                    self.logger.warning("已到达运行时间上限，当前批次归档并删除后停止")
+                    break
+            self.logger.info(f"[已归档并删除] 共处理 {deleted_count} 封邮件，归档位置: {archiver.path}")
+        else:
+            deleted_count = remove(uids)
+            if gmail_support is None:
+                self.logger.info(f"[已删除] 共标记 {deleted_count} 封邮件")
+            else:
+                self.logger.info(f"[已移到垃圾箱] 共 {deleted_count} 封邮件")
                 
-        # 如果实际删除，则执行expunge
-        if not dry_run and deleted_count > 0:
+        # 执行expunge永久删除
+        if deleted_count > 0 and gmail_support is None:
             try:
                 self.mail.expunge()
                 self.logger.info("已永久删除邮件")
@@ -232,6 +344,159 @@ class QQEmailCleaner:
                 
         return deleted_count
         
+    def record_plan(self, uids, folder, rule, sender_counts=None):
+        """把模拟删除选中的邮件写入 plan_file，同一次运行的各规则合并在一个计划中"""
+        from plan import DeletionPlan, get_uidvalidity
+        try:
+            if self.plan is None:
+                self.plan = DeletionPlan(self.config['EMAIL']['email'])
+            self.plan.add(folder, get_uidvalidity(self.mail, folder), rule or 'other', uids, sender_counts)
+            plan_file = self.config['EMAIL']['plan_file']
+            self.plan.save(plan_file)
+            self.logger.info(f"[删除计划] 已记录 {len(uids)} 封邮件到 {plan_file}，"
+                             f"确认后运行 python plan.py apply --plan {plan_file} 执行删除")
+        except Exception as e:
+            self.logger.error(f"记录删除计划时出错: {str(e)}")
+        
+
+    def mark_deleted(self, uids):
+        """
+        按UID区间批量标记删除
+
+        Returns:
+            int: 成功标记的邮件数量
+        """
+        marked = 0
+        for chunk in uids.chunks():
+            if self.deadline_reached():
+                self.logger.warning(f"已到达运行时间上限，剩余 {len(uids) - marked} 封邮件留到下次删除")
+                break
+            try:
+                status, _ = self.mail.uid('STORE', chunk, '+FLAGS', '\\Deleted')
+                if status == 'OK':
+                    count = len(UidSet.parse(chunk))
+                    marked += count
+                    metrics.add(deleted=count)
+                else:
+                    self.logger.error(f"删除邮件失败: {chunk}")
+            except Exception as e:
+                self.logger.error(f"删除邮件时出错: {str(e)}")
+        return marked
+
+    def get_gmail_support(self):
+        """
+        Gmail 快速路径所需的服务器信息，每个连接只查询一次
+
+        Returns:
+            tuple: (垃圾箱名称, 是否支持MOVE)；不是 Gmail、服务器不支持 X-GM-EXT-1
+                   或配置了 gmail_fast_path = False 时返回 None
+        """
+        config = self.config['EMAIL']
+        if config.get('email_type', 'qq') != 'gmail' or not config.getboolean('gmail_fast_path', True):
+            return None
+        if self.gmail_support is None or self.gmail_support[0] is not self.mail:
+            import gmail
+            support = None
+            try:
+                capabilities = gmail.server_capabilities(self.mail)
+                if gmail.GMAIL_EXTENSION in capabilities:
+                    support = (gmail.find_trash_folder(self.mail), 'MOVE' in capabilities)
+                    self.logger.info(f"使用 Gmail 快速路径，垃圾箱: {support[0]}")
+            except Exception as e:
+                self.logger.warning(f"检测 Gmail 扩展失败，按普通IMAP处理: {str(e)}")
+            self.gmail_support = (self.mail, support)
+        return self.gmail_support[1]
+
+    def move_to_gmail_trash(self, uids):
+        """按UID区间把当前文件夹中的邮件移动到 Gmail 垃圾箱"""
+        from gmail import move_to_trash
+        trash, can_move = self.get_gmail_support()
+        moved = move_to_trash(self.mail, uids, trash, can_move, self.logger, self.deadline_reached)
+        metrics.add(deleted=moved)
+        return moved
+
+    def delete_gmail_matches(self, query, dry_run=True, folder='INBOX', rule='', sender=None):
+        """
+        用 X-GM-RAW 在当前文件夹中搜索并删除全部结果，由服务器完成筛选，不获取邮件头
+
+        Args:
+            query (str): gmail.build_query 生成的搜索语句
+            sender (str): 规则针对的发送人，用于删除计划中的发送人统计
+
+        Returns:
+            int: 删除（或模拟删除）的邮件数量
+        """
+        from gmail import search_raw
+        uids = UidSet.from_search_response(search_raw(self.mail, query))
+        self.logger.info(f"Gmail 搜索 {query}: 找到 {len(uids)} 封邮件")
+        # 由服务器筛选，本地没有获取或检查任何邮件，只计入匹配数
+        metrics.add(matched=len(uids))
+        if not uids:
+            return 0
+        if self.config['EMAIL'].getboolean('log_per_message', True):
+            # 没有获取邮件头，按UID区间记录，与搜索语句一起可以追查删除了哪些邮件
+            action = "[模拟删除]" if dry_run else "[删除]"
+            for chunk in uids.chunks():
+                log_event(self.logger, action, folder=folder, uids=chunk, query=query)
+        if dry_run:
+            if self.config['EMAIL'].get('plan_file', ''):
+                self.record_plan(uids, folder, rule, {sender: len(uids)} if sender else None)
+            return len(uids)
+        return self.remove_messages(uids, folder)
+
+    def get_archiver(self, folder='INBOX'):
+        """根据配置创建删除前归档器"""
+        from archive import MailArchiver
+        config = self.config['EMAIL']
+        return MailArchiver(
+            config.get('archive_dir', 'archive'),
+            config['email'],
+            folder,
+            config.get('archive_format', 'mbox'),
+            config.getint('archive_batch_size', 50),
+            self.logger
+        )
+
+    def get_target_senders(self):
+        """获取配置的目标发送人列表"""
+        target_senders = self.config['EMAIL']['target_senders'].split(',')
+        return [sender.strip() for sender in target_senders if sender.strip()]
+        
+    def clean_target_senders(self, target_senders, dry_run=True, days_before_delete=3, folder='INBOX'):
+        """
+        在当前连接上清理指定文件夹中指定发送人的邮件
+
+        Returns:
+            dict: 发送人 -> 删除数量
+        """
+        counts = {}
+        gmail_support = self.get_gmail_support()
+        for sender in target_senders:
+            self.logger.info(f"开始处理来自 {sender} 的邮件...")
+            
+            if gmail_support:
+                # Gmail 由服务器按发送人和天数筛选
+                from gmail import build_query
+                self.mail.select(folder)
+                query = build_query(sender=sender, days_before_delete=days_before_delete)
+                deleted_count = self.delete_gmail_matches(query, dry_run, folder, 'target_senders', sender)
+                if not deleted_count:
+                    continue
+            else:
+                # 获取该发送人的所有邮件
+                email_ids = self.get_sender_emails(sender, folder)
+                if not email_ids:
+                    continue
+                # 删除邮件
+                deleted_count = self.delete_emails(email_ids, dry_run, days_before_delete, folder, 'target_senders')
+            counts[sender] = deleted_count
+            
+            if dry_run:
+                self.logger.info(f"模拟删除完成，共 {deleted_count} 封邮件")
+            else:
+                self.logger.info(f"删除完成，共 {deleted_count} 封邮件")
+        return counts
+        
     def clean_emails(self):
         """清理邮件主函数"""
         if not self.connect_to_mailbox():
@@ -239,8 +504,7 @@ class QQEmailCleaner:
             
         try:
             # 获取目标发送人列表
-            target_senders = self.config['EMAIL']['target_senders'].split(',')
-            target_senders = [sender.strip() for sender in target_senders if sender.strip()]
+            target_senders = self.get_target_senders()
             
             if not target_senders:
                 self.logger.warning("未配置目标发送人")
@@ -250,32 +514,16 @@ class QQEmailCleaner:
             delete_permanently = self.config['EMAIL'].getboolean('delete_permanently', False)
             days_before_delete = int(self.config['EMAIL'].get('days_before_delete', 3))
             
-            total_deleted = 0
-            details = []
-            
-            for sender in target_senders:
-                self.logger.info(f"开始处理来自 {sender} 的邮件...")
-                
-                # 获取该发送人的所有邮件
-                email_ids = self.get_sender_emails(sender)
-                
-                if email_ids:
-                    # 删除邮件
-                    deleted_count = self.delete_emails(email_ids, dry_run, days_before_delete)
-                    total_deleted += deleted_count
-                    details.append(f"{sender}: {deleted_count} 封")
-                    
-                    if dry_run:
-                        self.logger.info(f"模拟删除完成，共 {deleted_count} 封邮件")
-                    else:
-                        self.logger.info(f"删除完成，共 {deleted_count} 封邮件")
+            counts = self.clean_target_senders(target_senders, dry_run, days_before_delete)
+            total_deleted = sum(counts.values())
+            details = [f"{sender}: {count} 封" for sender, count in counts.items()]
                         
             self.logger.info(f"清理完成，总共处理 {total_deleted} 封邮件")
             
             # 发送通知邮件
             if total_deleted > 0:
                 details_str = "; ".join(details)
-                self.send_notification_email(total_deleted, details_str)
+                self.send_notification_email(total_deleted, details_str, counts)
             
         except Exception as e:
             self.logger.error(f"清理邮件时出错: {str(e)}")
@@ -319,115 +567,362 @@ class QQEmailCleaner:
         return 0
         
     def get_read_no_attachment_emails(self, days_before_delete=3):
-        """获取已读且不带附件的邮件ID列表"""
+        """获取已读且不带附件的邮件元数据批次"""
         try:
             if not self.mail:
                 self.logger.error("邮箱连接未建立")
-                return []
+                return MailBatch()
                 
             # 选择收件箱
             self.mail.select('INBOX')
             
             # 搜索已读邮件
-            status, message_ids = self.mail.search(None, 'SEEN')
+            uids = self.search_uids('SEEN')
             
-            if status != 'OK' or not message_ids or not message_ids[0]:
+            if not uids:
                 self.logger.info("未找到已读邮件")
-                return []
+                return MailBatch()
                 
-            email_ids = message_ids[0].split()
-            filtered_ids = []
-            now = datetime.now()
+            # 先按日期筛选，只对剩余邮件检查附件
+            cutoff = time.time() - days_before_delete * 86400
+            candidates = self.fetch_email_records(uids).older_than(cutoff)
             
-            for email_id in email_ids:
-                try:
-                    email_info = self.get_email_info(email_id)
-                    if not email_info:
-                        continue
-                        
-                    # 检查日期
-                    if email_info['date']:
-                        try:
-                            from email.utils import parsedate_to_datetime
-                            mail_date = parsedate_to_datetime(email_info['date'])
-                            if mail_date.tzinfo is not None:
-                                mail_date = mail_date.astimezone().replace(tzinfo=None)
-                            days_diff = (now - mail_date).days
-                            if days_diff < days_before_delete:
-                                continue
-                        except Exception:
-                            continue
-                    
-                    # 检查是否有附件
-                    has_attachment = self.check_has_attachment(email_id)
-                    if not has_attachment:
-                        filtered_ids.append(email_id)
-                        
-                except Exception as e:
-                    self.logger.warning(f"检查邮件 {email_id.decode()} 时出错: {str(e)}")
-                    continue
+            # 先用 BODYSTRUCTURE 判断附件，结构无法解析的邮件再下载原文分析
+            from bodystructure import has_attachment
+            structures = self.fetch_body_structures(candidates.uids)
+            verdicts = {uid: has_attachment(structure) for uid, structure in structures.items()}
+            unresolved = [uid for uid in candidates.uids if uid not in verdicts]
+            if unresolved:
+                self.logger.info(f"{len(unresolved)} 封邮件的结构无法解析，下载原文检查附件")
+                verdicts.update(self.analyze_full_messages(unresolved))
+            if len(verdicts) < len(candidates):
+                self.logger.warning(f"只检查了 {len(verdicts)}/{len(candidates)} 封邮件的附件，其余邮件本次不处理")
+            keep = [index for index, uid in enumerate(candidates.uids) if verdicts.get(uid) is False]
                     
-            self.logger.info(f"找到已读且不带附件的邮件 {len(filtered_ids)} 封")
-            return filtered_ids
+            filtered = candidates.take(keep)
+            self.logger.info(f"找到已读且不带附件的邮件 {len(filtered)} 封")
+            return filtered
             
         except Exception as e:
             self.logger.error(f"搜索已读邮件时出错: {str(e)}")
-            return []
+            return MailBatch()
             
-    def check_has_attachment(self, email_id):
+    def body_buffer(self):
+        """逐封下载邮件原文时复用的读取缓冲区"""
+        if self.fetch_buffer is None:
+            from imap_stream import FetchBuffer
+            self.fetch_buffer = FetchBuffer()
+        return self.fetch_buffer
+        
+    @profiling.profiled('附件检查(下载并解析MIME)')
+    def analyze_full_messages(self, uids):
+        """
+        下载邮件原文检查附件
+
+        配置 mime_workers 大于0时由子进程解析原文，主进程同时下载下一批；
+        到达运行时间上限时停止，未检查的邮件不在结果中
+
+        Returns:
+            dict: UID -> 是否带附件，下载或解析失败的邮件不包含在内
+        """
+        from imap_stream import iter_uid_fetch
+        from mime_pool import MimePool, iter_batches
+        workers = self.config['EMAIL'].getint('mime_workers', 0)
+        batch_size = self.config['EMAIL'].getint('fetch_batch_size', 500)
+        
+        def messages():
+            for chunk in UidSet(uids).batches(batch_size):
+                if self.deadline_reached():
+                    self.logger.warning("已到达运行时间上限，停止下载邮件原文")
+                    return
+                try:
+                    for meta, literals in iter_uid_fetch(self.mail, str(chunk), '(UID BODY.PEEK[])',
+                                                         self.body_buffer()):
+                        uid_match = re.search(rb'UID (\d+)', meta)
+                        if uid_match and literals:
+                            yield int(uid_match.group(1)), literals[0]
+                except Exception as e:
+                    self.logger.error(f"下载邮件原文时出错: {str(e)}")
+                    
+        verdicts = {}
+        with MimePool(workers) as pool:
+            for uid, verdict in pool.map(iter_batches(messages())):
+                if verdict is None:
+                    self.logger.warning(f"解析邮件 {uid} 时出错")
+                    continue
+                verdicts[uid] = verdict.has_attachment
+        return verdicts
+        
+    def check_has_attachment(self, uid):
         """检查邮件是否有附件"""
         try:
             if not self.mail:
                 return False
                 
-            status, msg_data = self.mail.fetch(email_id, '(RFC822)')
-            if status == 'OK' and msg_data and len(msg_data) > 0:
-                email_body = msg_data[0][1]
-                if isinstance(email_body, bytes):
-                    email_message = email.message_from_bytes(email_body)
-                    
-                    # 检查是否有附件
-                    for part in email_message.walk():
-                        if part.get_content_maintype() == 'multipart':
-                            continue
-                        if part.get('Content-Disposition') is not None:
-                            return True
-                            
+            from imap_stream import iter_uid_fetch
+            from mime_pool import analyze
+            for _, literals in iter_uid_fetch(self.mail, str(uid), '(BODY.PEEK[])', self.body_buffer()):
+                if literals and analyze(literals[0]).has_attachment:
+                    return True
+                        
             return False
             
         except Exception as e:
             self.logger.error(f"检查附件时出错: {str(e)}")
             return False
             
-    def send_notification_email(self, total_deleted, details):
-        """发送清理完成通知邮件"""
+    @profiling.profiled('获取邮件结构')
+    def fetch_body_structures(self, uids):
+        """
+        批量获取邮件的 BODYSTRUCTURE
+
+        Returns:
+            dict: UID -> 解析后的结构，无法解析的邮件不包含在内
+        """
+        from bodystructure import BodyStructureError, extract_bodystructure
+        structures = {}
+        batch_size = self.config['EMAIL'].getint('fetch_batch_size', 500)
+        for chunk in UidSet(uids).batches(batch_size):
+            try:
+                status, msg_data = self.mail.uid('FETCH', str(chunk), '(UID BODYSTRUCTURE)')
+                if status != 'OK':
+                    continue
+                for meta, literals in iter_fetch_responses(msg_data):
+                    uid_match = re.search(rb'UID (\d+)', meta)
+                    if not uid_match:
+                        continue
+                    try:
+                        structures[int(uid_match.group(1))] = extract_bodystructure(meta, literals)
+                    except BodyStructureError as e:
+                        self.logger.warning(f"解析邮件 {uid_match.group(1).decode()} 结构失败: {str(e)}")
+            except Exception as e:
+                self.logger.error(f"获取邮件结构时出错: {str(e)}")
+        return structures
+        
+    @profiling.profiled('获取正文片段')
+    def fetch_partial_texts(self, uids, max_bytes=4096):
+        """
+        批量获取邮件正文的前 max_bytes 个字节并解码
+
+        先通过 BODYSTRUCTURE 定位正文部分（优先 text/plain），再按部分编号分组，
+        每组用一条 BODY.PEEK[部分]<0.N> 请求获取，不下载附件。
+
+        Returns:
+            dict: UID -> 正文片段
+        """
+        from bodystructure import find_text_part
+        from content_rules import decode_partial_body
+        parts = {}
+        for uid, structure in self.fetch_body_structures(uids).items():
+            text_part = find_text_part(structure)
+            if text_part:
+                parts.setdefault(text_part[0], []).append((uid, text_part))
+                
+        texts = {}
+        batch_size = self.config['EMAIL'].getint('fetch_batch_size', 500)
+        for section, items in parts.items():
+            info = dict(items)
+            for chunk in UidSet(info).batches(batch_size):
+                try:
+                    status, msg_data = self.mail.uid('FETCH', str(chunk), f'(UID BODY.PEEK[{section}]<0.{max_bytes}>)')
+                    if status != 'OK':
+                        continue
+                    for meta, literals in iter_fetch_responses(msg_data):
+                        uid_match = re.search(rb'UID (\d+)', meta)
+                        if not uid_match or not literals:
+                            continue
+                        uid = int(uid_match.group(1))
+                        _, subtype, charset, encoding = info[uid]
+                        texts[uid] = decode_partial_body(literals[0], encoding, charset, subtype)
+                except Exception as e:
+                    self.logger.error(f"获取邮件正文时出错: {str(e)}")
+        return texts
+        
+    def get_content_matched_emails(self, matcher, days_before_delete=3, max_bytes=4096):
+        """
+        获取正文匹配指定规则的邮件元数据批次
+
+        Args:
+            matcher (ContentMatcher): 正文匹配规则
+            days_before_delete (int): 只检查几天前的邮件
+            max_bytes (int): 每封邮件最多下载的正文字节数
+        """
+        try:
+            if not self.mail:
+                self.logger.error("邮箱连接未建立")
+                return MailBatch()
+                
+            self.mail.select('INBOX')
+            
+            uids = self.search_uids(self.get_age_criteria(days_before_delete))
+            if not uids:
+                return MailBatch()
+                
+            cutoff = time.time() - days_before_delete * 86400
+            candidates = self.fetch_email_records(uids).older_than(cutoff)
+            texts = self.fetch_partial_texts(candidates.uids, max_bytes)
+            
+            keep = []
+            for index, uid in enumerate(candidates.uids):
+                matched = matcher.search(texts.get(uid, ''))
+                if matched:
+                    log_event(self.logger, "[正文匹配]", logging.DEBUG, uid=uid, matched=matched)
+                    keep.append(index)
+                    
+            matched_batch = candidates.take(keep)
+            self.logger.info(f"找到正文匹配规则的邮件 {len(matched_batch)} 封")
+            return matched_batch
+            
+        except Exception as e:
+            self.logger.error(f"按正文搜索邮件时出错: {str(e)}")
+            return MailBatch()
+            
+    @profiling.profiled('通知')
+    def send_notification_email(self, total_deleted, details, counts=None):
+        """
+        发送清理完成通知
+
+        通知会发送到全部已配置的渠道：notification_email 对应的SMTP邮件，
+        以及 dingtalk_webhook 对应的钉钉机器人。启用 notification_digest 时
+        只记录本次结果，达到汇总条件后再发送一条汇总通知。
+
+        Args:
+            total_deleted (int): 删除的邮件总数
+            details (str): 详细信息
+            counts (dict): 可选，发送人/规则 -> 删除数量，用于汇总统计
+        """
         try:
             if not self.config['EMAIL'].getboolean('send_notification', True):
                 return
                 
-            notification_email = self.config['EMAIL'].get('notification_email', '')
-            if not notification_email:
-                self.logger.warning("未配置通知邮箱地址")
+            channels = self.get_notification_channels()
+            if not channels:
+                self.logger.warning("未配置通知邮箱地址或钉钉机器人")
                 return
                 
+            if self.config['EMAIL'].getboolean('notification_digest', False):
+                self.add_to_digest(channels, total_deleted, counts)
+                return
+                
+            title, body = self.build_notification_message(total_deleted, details)
+            self.dispatch_notification(channels, title, body)
+            
+        except Exception as e:
+            self.logger.error(f"发送通知邮件时出错: {str(e)}")
+            
+    def wait_for_notifications(self):
+        """等待后台通知发送完毕并关闭分发器，本进程没有发送过通知时不导入通知模块"""
+        if 'notifier' not in sys.modules:
+            return True
+        from notifier import shutdown_dispatcher
+        return shutdown_dispatcher(self.config['EMAIL'].getint('notification_timeout', 60))
+        
+    def get_notification_channels(self):
+        """根据配置创建通知渠道列表"""
+        from notifier import get_dispatcher, SmtpChannel, DingTalkChannel
+        
+        channels = []
+        notification_email = self.config['EMAIL'].get('notification_email', '')
+        if notification_email:
             # 获取SMTP配置
             email_type = self.config['EMAIL'].get('email_type', 'qq')
             smtp_config = self.get_smtp_config(email_type)
-            
-            if not smtp_config:
+            if smtp_config:
+                channels.append(SmtpChannel(
+                    smtp_config,
+                    self.config['EMAIL']['email'],
+                    self.config['EMAIL']['password'],
+                    notification_email,
+                    get_dispatcher().smtp_pool
+                ))
+            else:
                 self.logger.error(f"不支持的邮箱类型: {email_type}")
-                return
                 
-            # 发送邮件
-            self.send_email_via_smtp(
-                smtp_config,
-                notification_email,
-                total_deleted,
-                details
-            )
+        webhook_url = self.config['EMAIL'].get('dingtalk_webhook', '')
+        if webhook_url:
+            channels.append(DingTalkChannel(
+                webhook_url,
+                secret=self.config['EMAIL'].get('dingtalk_secret', '') or None,
+                rate_limit=self.config['EMAIL'].getint('dingtalk_rate_limit', 20)
+            ))
+        return channels
+        
+    def add_to_digest(self, channels, total_deleted, counts=None):
+        """记录本次清理结果，达到时间窗口或运行次数时发送汇总通知"""
+        from digest import NotificationDigest
+        
+        digest = NotificationDigest(self.config['EMAIL'].get('digest_spool', 'notification_spool.jsonl'))
+        # 汇总只统计删除数量，只有移动、标记等批量操作的运行不记录
+        if total_deleted > 0:
+            digest.record(self.config['EMAIL']['email'], total_deleted, counts or {'其他': total_deleted})
+        if not self.flush_digest(channels):
+            self.logger.info("清理结果已记录，等待汇总发送")
             
+    def flush_digest(self, channels=None):
+        """
+        启用 notification_digest 且达到时间窗口或运行次数时发送汇总通知
+
+        cron、守护进程和分布式工作进程在没有删除邮件时也调用，时间窗口到期的汇总照常发送。
+        所有渠道都发送失败时取出的记录写回暂存文件，留到下次汇总。
+
+        Returns:
+            bool: 是否取出记录发送了汇总通知
+        """
+        from digest import NotificationDigest
+        
+        email_config = self.config['EMAIL']
+        if not (email_config.getboolean('notification_digest', False)
+                and email_config.getboolean('send_notification', True)):
+            return False
+        try:
+            digest = NotificationDigest(email_config.get('digest_spool', 'notification_spool.jsonl'))
+            interval_hours = email_config.getfloat('digest_interval_hours', 24)
+            max_runs = email_config.getint('digest_max_runs', 0)
+            if not digest.should_flush(interval_hours, max_runs):
+                return False
+            if channels is None:
+                channels = self.get_notification_channels()
+            if not channels:
+                return False
+            entries = digest.take()
+            if not entries:
+                return False
+                
+            def sent(delivered):
+                if not delivered:
+                    digest.restore(entries)
+                    self.logger.warning(f"汇总通知发送失败，{len(entries)} 次清理结果已放回暂存文件")
+                    
+            title, body = digest.build_summary(entries)
+            try:
+                self.dispatch_notification(channels, title, body, callback=sent)
+            except RuntimeError:
+                # 在当前线程发送时有渠道失败，失败已记录日志，全部失败时 sent 已写回记录
+                pass
+            self.logger.info(f"已汇总 {len(entries)} 次清理结果")
+            return True
         except Exception as e:
-            self.logger.error(f"发送通知邮件时出错: {str(e)}")
+            self.logger.error(f"发送汇总通知时出错: {str(e)}")
+            return False
+            
+    def dispatch_notification(self, channels, title, body, callback=None):
+        """
+        发送通知到指定渠道
+
+        默认（async_notification = True）只交给后台分发器后立即返回，
+        否则在当前线程发送，失败时抛出异常。
+
+        Args:
+            callback: 可选，发送结束后调用，参数为发送成功的渠道数
+        """
+        from notifier import get_dispatcher
+        
+        dispatcher = get_dispatcher()
+        if self.config['EMAIL'].getboolean('async_notification', True):
+            dispatcher.submit(channels, title, body, callback)
+            self.logger.info(f"通知已加入发送队列: {', '.join(str(channel) for channel in channels)}")
+        elif not dispatcher.send_now(channels, title, body, callback):
+            raise RuntimeError("通知发送失败")
             
     def get_smtp_config(self, email_type):
         """获取SMTP服务器配置"""
@@ -470,21 +965,15 @@ class QQEmailCleaner:
         }
         return smtp_configs.get(email_type)
         
-    def send_email_via_smtp(self, smtp_config, to_email, total_deleted, details):
-        """通过SMTP发送邮件"""
-        import smtplib
-        from email.mime.text import MIMEText
-        from email.mime.multipart import MIMEMultipart
-        
-        try:
-            # 创建邮件
-            msg = MIMEMultipart()
-            msg['From'] = self.config['EMAIL']['email']
-            msg['To'] = to_email
-            msg['Subject'] = f"邮箱清理完成通知 - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-            
-            # 邮件内容
-            body = f"""
+    def build_notification_message(self, total_deleted, details):
+        """
+        生成通知标题和正文
+
+        Returns:
+            tuple: (标题, 正文)
+        """
+        title = f"邮箱清理完成通知 - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+        body = f"""
 邮箱清理任务执行完成
 
 执行时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
@@ -500,31 +989,9 @@ class QQEmailCleaner:
 - 清理已读邮件: {self.config['EMAIL'].get('clean_read_no_attachment', 'False')}
 
 此邮件由邮箱自动清理工具发送
-            """
-            
-            msg.attach(MIMEText(body, 'plain', 'utf-8'))
-            
-            # 连接SMTP服务器
-            if smtp_config['use_tls']:
-                server = smtplib.SMTP(smtp_config['server'], smtp_config['port'])
-                server.starttls()
-            else:
-                server = smtplib.SMTP_SSL(smtp_config['server'], smtp_config['port'])
-            
-            # 登录
-            server.login(self.config['EMAIL']['email'], self.config['EMAIL']['password'])
-            
-            # 发送邮件
-            text = msg.as_string()
-            server.sendmail(self.config['EMAIL']['email'], to_email, text)
-            server.quit()
-            
-            self.logger.info(f"通知邮件发送成功: {to_email}")
-            
-        except Exception as e:
-            self.logger.error(f"SMTP发送邮件失败: {str(e)}")
-            raise
-            
+        """
+        return title, body
+        
     def clean_read_no_attachment_emails(self):
         """清理已读且不带附件的邮件"""
         if not self.connect_to_mailbox():
@@ -536,22 +1003,29 @@ class QQEmailCleaner:
             
             self.logger.info(f"开始清理已读且不带附件的邮件（{days_before_delete}天前）...")
             
-            # 获取已读且不带附件的邮件
-            email_ids = self.get_read_no_attachment_emails(days_before_delete)
-            
-            if email_ids:
-                # 删除邮件
-                deleted_count = self.delete_emails(email_ids, dry_run, days_before_delete)
+            if self.get_gmail_support():
+                # Gmail 由服务器按已读、附件和天数筛选，不逐封下载检查附件
+                from gmail import build_query
+                self.mail.select('INBOX')
+                query = build_query(days_before_delete=days_before_delete, read=True, has_attachment=False)
+                deleted_count = self.delete_gmail_matches(query, dry_run, rule='read_no_attachment')
+            else:
+                # 获取已读且不带附件的邮件
+                email_ids = self.get_read_no_attachment_emails(days_before_delete)
+                deleted_count = 0
+                if email_ids:
+                    # 删除邮件
+                    deleted_count = self.delete_emails(email_ids, dry_run, days_before_delete, rule='read_no_attachment')
                 
+            if deleted_count > 0:
                 if dry_run:
                     self.logger.info(f"模拟删除完成，共 {deleted_count} 封邮件")
                 else:
                     self.logger.info(f"删除完成，共 {deleted_count} 封邮件")
                     
                 # 发送通知邮件
-                if deleted_count > 0:
-                    details = f"已读且不带附件的邮件: {deleted_count} 封"
-                    self.send_notification_email(deleted_count, details)
+                details = f"已读且不带附件的邮件: {deleted_count} 封"
+                self.send_notification_email(deleted_count, details, {'已读且不带附件的邮件': deleted_count})
                     
                 return deleted_count
             else:
@@ -564,42 +1038,296 @@ class QQEmailCleaner:
         finally:
             self.disconnect()
 
+    def clean_content_matched_emails(self):
+        """清理正文匹配 content_patterns 的邮件"""
+        from content_rules import ContentMatcher
+        matcher = ContentMatcher.from_config(self.config['EMAIL'].get('content_patterns', '', raw=True))
+        if not matcher:
+            self.logger.info("未配置正文匹配规则")
+            return 0
+            
+        if not self.connect_to_mailbox():
+            return 0
+            
+        try:
+            days_before_delete = int(self.config['EMAIL'].get('days_before_delete', 3))
+            dry_run = self.config['EMAIL'].getboolean('dry_run', True)
+            max_bytes = self.config['EMAIL'].getint('content_max_bytes', 4096)
+            
+            self.logger.info(f"开始清理正文匹配规则的邮件（{days_before_delete}天前）...")
+            
+            emails = self.get_content_matched_emails(matcher, days_before_delete, max_bytes)
+            if not emails:
+                self.logger.info("没有找到符合条件的邮件")
+                return 0
+                
+            deleted_count = self.delete_emails(emails, dry_run, days_before_delete, rule='content_patterns')
+            if dry_run:
+                self.logger.info(f"模拟删除完成，共 {deleted_count} 封邮件")
+            else:
+                self.logger.info(f"删除完成，共 {deleted_count} 封邮件")
+            return deleted_count
+            
+        except Exception as e:
+            self.logger.error(f"清理正文匹配邮件时出错: {str(e)}")
+            return 0
+        finally:
+            self.disconnect()
+
+    def get_dedup_folders(self):
+        """获取配置的去重文件夹列表"""
+        folders = self.config['EMAIL'].get('dedup_folders', 'INBOX').split(',')
+        return [folder.strip() for folder in folders if folder.strip()]
+
+    def clean_duplicate_emails(self):
+        """
+        清理重复邮件
+
+        按 dedup_folders 的顺序扫描，每组重复邮件保留最先扫描到的一封，
+        因此应把最重要的文件夹放在最前面。
+
+        Returns:
+            int: 删除的邮件数量
+        """
+        from dedup import DuplicateFinder
+        if not self.connect_to_mailbox():
+            return 0
+            
+        try:
+            dry_run = self.config['EMAIL'].getboolean('dry_run', True)
+            batch_size = self.config['EMAIL'].getint('fetch_batch_size', 500)
+            finder = DuplicateFinder(self.mail, batch_size, self.logger, gmail=self.get_gmail_support() is not None)
+            deleted_count = 0
+            
+            for folder in self.get_dedup_folders():
+                self.logger.info(f"开始查找文件夹 {folder} 中的重复邮件...")
+                status, _ = self.mail.select(folder)
+                if status != 'OK':
+                    self.logger.error(f"选择文件夹失败: {folder}")
+                    continue
+                duplicates = finder.scan_folder(folder)
+                if duplicates:
+                    # 重复邮件不按天数筛选
+                    deleted_count += self.delete_emails(duplicates, dry_run, 0, folder, 'duplicates')
+                    
+            self.logger.info(f"重复邮件清理完成，共扫描 {finder.scanned} 封，处理 {deleted_count} 封")
+            return deleted_count
+            
+        except Exception as e:
+            self.logger.error(f"清理重复邮件时出错: {str(e)}")
+            return 0
+        finally:
+            self.disconnect()
+
+    def clean_for_quota(self):
+        """
+        按容量回收空间：从最大的邮件开始删除，直到腾出 quota_free_mb
+
+        只考虑服务器接收日期在 days_before_delete 天前的邮件；quota_senders_only 为 True 时
+        只在目标发送人的邮件中选择。
+
+        Returns:
+            int: 删除的邮件数量
+        """
+        from quota import QuotaReclaimer, MB
+        free_bytes = int(self.config['EMAIL'].getfloat('quota_free_mb', 0) * MB)
+        if free_bytes <= 0:
+            self.logger.info("未配置 quota_free_mb")
+            return 0
+            
+        if not self.connect_to_mailbox():
+            return 0
+            
+        try:
+            dry_run = self.config['EMAIL'].getboolean('dry_run', True)
+            days_before_delete = int(self.config['EMAIL'].get('days_before_delete', 3))
+            batch_size = self.config['EMAIL'].getint('fetch_batch_size', 500)
+            
+            self.mail.select('INBOX')
+            reclaimer = QuotaReclaimer(self.mail, batch_size, self.logger)
+            target_bytes = reclaimer.bytes_to_free(free_bytes)
+            if target_bytes <= 0:
+                self.logger.info(f"剩余空间已超过 {free_bytes / MB:.1f} MB，无需清理")
+                return 0
+                
+            candidates = None
+            if self.config['EMAIL'].getboolean('quota_senders_only', True):
+                candidates = UidSet()
+                for sender in self.get_target_senders():
+                    candidates = candidates | self.search_uids(f'FROM "{sender}"')
+                if not candidates:
+                    self.logger.info("目标发送人没有邮件")
+                    return 0
+                    
+            self.logger.info(f"开始按容量清理，需要腾出 {target_bytes / MB:.1f} MB...")
+            # 按天数严格筛选后再从大到小选择，选中的邮件直接删除，
+            # 不再经过 delete_emails 按 Date 头二次筛选，否则选中的大邮件可能被跳过而达不到目标
+            criteria = self.get_age_criteria(days_before_delete, strict=True)
+            uids, planned = reclaimer.plan(criteria, target_bytes, candidates)
+            if not uids:
+                self.logger.info("没有找到符合条件的邮件")
+                return 0
+                
+            self.logger.info(f"选中 {len(uids)} 封邮件，共 {planned / MB:.1f} MB")
+            metrics.add(matched=len(uids))
+            if dry_run:
+                self.logger.info(f"[模拟删除] {len(uids)} 封邮件，共 {planned / MB:.1f} MB")
+                if self.config['EMAIL'].get('plan_file', ''):
+                    self.record_plan(uids, 'INBOX', 'quota')
+                return len(uids)
+            return self.remove_messages(uids, 'INBOX')
+            
+        except Exception as e:
+            self.logger.error(f"按容量清理时出错: {str(e)}")
+            return 0
+        finally:
+            self.disconnect()
+
+    def run_action_rules(self, rules, dry_run=True, folder='INBOX'):
+        """
+        在当前连接上按规则对匹配的邮件执行批量操作
+
+        每条规则一次 SEARCH，操作按UID区间执行；delete 与其他清理规则一样
+        经过归档和 Gmail 垃圾箱处理，模拟运行时记入删除计划。
+        移动、复制、标记操作不是删除，结果摘要追加到 action_summaries。
+
+        Args:
+            rules (list): actions.parse_rules 的结果，按顺序执行
+            dry_run (bool): 是否只记录将要执行的操作
+            folder (str): 规则作用的文件夹
+
+        Returns:
+            dict: delete 规则 -> 删除的邮件数量
+        """
+        from actions import apply_action
+        from gmail import server_capabilities
+        self.mail.select(folder)
+        capabilities = server_capabilities(self.mail)
+        counts = {}
+        for rule in rules:
+            if self.deadline_reached():
+                self.logger.warning("已到达运行时间上限，剩余批量操作规则留到下次执行")
+                break
+            criteria = rule.search_criteria(self.get_age_criteria)
+            uids = self.search_uids(criteria)
+            metrics.add(scanned=len(uids), matched=len(uids))
+            if not uids:
+                self.logger.info(f"规则 {rule} 没有匹配的邮件")
+                continue
+            if dry_run:
+                self.logger.info(f"[模拟操作] {rule.action}: {len(uids)} 封邮件（{criteria}）")
+                if rule.action.kind != 'delete':
+                    self.action_summaries.append(f"[模拟] {rule.action}: {len(uids)} 封")
+                    continue
+                if self.config['EMAIL'].get('plan_file', ''):
+                    self.record_plan(uids, folder, 'action_rules')
+                counts[str(rule)] = len(uids)
+            elif rule.action.kind == 'delete':
+                counts[str(rule)] = self.remove_messages(uids, folder)
+            else:
+                result = apply_action(self.mail, uids, rule.action, capabilities, self.logger,
+                                      self.deadline_reached)
+                self.logger.info(f"[批量操作] {result}")
+                self.action_summaries.append(str(result))
+        return counts
+        
+    def take_action_summaries(self):
+        """取出并清空批量操作（非删除）的结果摘要，用于通知的详细信息"""
+        summaries, self.action_summaries = self.action_summaries, []
+        return summaries
+        
+    def clean_action_rules(self):
+        """
+        执行 action_rules 中的批量操作规则（移动、复制、标记、删除）
+
+        Returns:
+            int: delete 规则删除的邮件数量，其他操作的结果见 take_action_summaries()
+        """
+        from actions import ActionError, parse_rules
+        try:
+            rules = parse_rules(self.config['EMAIL'].get('action_rules', '', raw=True))
+        except ActionError as e:
+            self.logger.error(f"批量操作规则格式错误: {str(e)}")
+            return 0
+        if not rules:
+            self.logger.info("未配置批量操作规则")
+            return 0
+            
+        if not self.connect_to_mailbox():
+            return 0
+            
+        try:
+            dry_run = self.config['EMAIL'].getboolean('dry_run', True)
+            self.logger.info(f"开始执行 {len(rules)} 条批量操作规则...")
+            counts = self.run_action_rules(rules, dry_run)
+            total = sum(counts.values())
+            self.logger.info(f"{'模拟' if dry_run else ''}批量操作完成，删除 {total} 封邮件")
+            return total
+            
+        except Exception as e:
+            self.logger.error(f"执行批量操作规则时出错: {str(e)}")
+            return 0
+        finally:
+            self.disconnect()
+
 
 def main():
-    """主函数"""
+    """主函数，带 --profile 参数时记录各项操作的性能数据，退出时写出报告"""
     print("邮箱自动清理工具")
     print("=" * 50)
     
     cleaner = QQEmailCleaner()
+    if '--profile' in sys.argv[1:]:
+        profiling.start_profiling('email_cleaner', 'email_cleaner.log')
+        print("已启用性能分析，退出时写出报告")
     
+    try:
+        menu_loop(cleaner)
+    finally:
+        profiling.stop_profiling()
+
+
+def menu_loop(cleaner):
+    """交互菜单，每次选择的操作作为一个性能分析阶段"""
     while True:
         print("\n请选择操作:")
         print("1. 清理指定发送人的邮件")
         print("2. 清理已读且不带附件的邮件")
         print("3. 查看邮件文件夹列表")
         print("4. 查看收件箱邮件数量")
-        print("5. 退出")
+        print("5. 清理重复邮件")
+        print("6. 退出")
         
-        choice = input("\n请输入选择 (1-5): ").strip()
+        choice = input("\n请输入选择 (1-6): ").strip()
         
         if choice == '1':
             print("\n开始清理指定发送人的邮件...")
-            cleaner.clean_emails()
+            with profiling.stage('清理指定发送人'):
+                cleaner.clean_emails()
             
         elif choice == '2':
             print("\n开始清理已读且不带附件的邮件...")
-            cleaner.clean_read_no_attachment_emails()
+            with profiling.stage('清理已读无附件'):
+                cleaner.clean_read_no_attachment_emails()
             
         elif choice == '3':
             print("\n获取文件夹列表...")
-            cleaner.list_folders()
+            with profiling.stage('文件夹列表'):
+                cleaner.list_folders()
             
         elif choice == '4':
             print("\n获取收件箱邮件数量...")
-            cleaner.get_email_count()
+            with profiling.stage('邮件数量'):
+                cleaner.get_email_count()
             
         elif choice == '5':
+            print("\n开始清理重复邮件...")
+            with profiling.stage('清理重复邮件'):
+                cleaner.clean_duplicate_emails()
+            
+        elif choice == '6':
             print("退出程序")
+            cleaner.wait_for_notifications()
             break
             
         else:
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置文件解析缓存
+解析后的配置以 marshal 格式保存在配置文件旁的隐藏文件中，
+配置文件的修改时间和大小不变时直接读取缓存，省去逐行解析
+"""
+
+import os
+import marshal
+import configparser
+
+CACHE_VERSION = 1
+
+
+def cache_path_for(config_file):
+    """配置文件对应的缓存文件路径，如 .email_config.ini.cache"""
+    directory, name = os.path.split(os.path.abspath(config_file))
+    return os.path.join(directory, f".{name}.cache")
+
+
+def load_cached_config(config_file):
+    """
+    读取配置文件，优先使用解析缓存
+
+    缓存不存在、已过期或无法读写时按原方式解析，并尽量写入新缓存；
+    缓存保存的是原始值，插值仍在读取配置项时进行，行为与直接解析一致。
+
+    Args:
+        config_file (str): 配置文件路径
+
+    Returns:
+        configparser.ConfigParser: 配置
+    """
+    stat = os.stat(config_file)
+    key = [CACHE_VERSION, stat.st_mtime_ns, stat.st_size]
+    cache_file = cache_path_for(config_file)
+
+    try:
+        with open(cache_file, 'rb') as f:
+            cached = marshal.load(f)
+        if cached.get('key') == key:
+            config = configparser.ConfigParser()
+            config.read_dict(cached['sections'])
+            return config
+    except (OSError, EOFError, ValueError, TypeError, KeyError):
+        pass
+
+    config = configparser.ConfigParser()
+    config.read(config_file, encoding='utf-8')
+    sections = {configparser.DEFAULTSECT: dict(config.defaults())}
+    for section in config.sections():
+        sections[section] = dict(config.items(section, raw=True))
+    try:
+        # 缓存中包含邮箱密码，权限与配置文件一样只允许本人读写
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump({'key': key, 'sections': sections}, f)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        pass
+    return config
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基于邮件正文的清理规则
+只下载正文部分的前N个字节，解码后用预编译的正则表达式匹配
+"""
+
+import re
+import base64
+import binascii
+import quopri
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_WHITESPACE_RE = re.compile(rb'\s+')
+
+
+class ContentMatcher:
+    """把多条正则表达式合并为一个预编译的模式，一次扫描完成匹配"""
+
+    def __init__(self, patterns):
+        """
+        Args:
+            patterns (list): 正则表达式字符串列表，匹配时忽略大小写
+        """
+        self.patterns = [pattern for pattern in patterns if pattern]
+        combined = '|'.join(f'(?:{pattern})' for pattern in self.patterns)
+        self.regex = re.compile(combined, re.IGNORECASE) if self.patterns else None
+
+    @classmethod
+    def from_config(cls, value):
+        """由配置值构建，每行一条正则表达式"""
+        return cls([line.strip() for line in (value or '').splitlines()])
+
+    def __bool__(self):
+        return self.regex is not None
+
+    def search(self, text):
+        """返回第一个匹配到的文本，未匹配时返回 None"""
+        if self.regex is None:
+            return None
+        match = self.regex.search(text)
+        return match.group(0) if match else None
+
+
+def decode_partial_body(data, encoding, charset, subtype='plain'):
+    """
+    解码截断的正文片段
+
+    base64 片段只解码到最后一个完整的4字符分组，HTML 去掉标签。
+
+    Args:
+        data (bytes): BODY.PEEK[section]<0.N> 返回的原始字节
+        encoding (str): Content-Transfer-Encoding
+        charset (str): 字符集
+        subtype (str): text 子类型
+    """
+    if encoding == 'base64':
+        data = _WHITESPACE_RE.sub(b'', data)
+        data = data[:len(data) - len(data) % 4]
+        try:
+            data = base64.b64decode(data)
+        except (binascii.Error, ValueError):
+            data = b''
+    elif encoding == 'quoted-printable':
+        data = quopri.decodestring(data)
+
+    try:
+        text = data.decode(charset, errors='ignore')
+    except LookupError:
+        text = data.decode('utf-8', errors='ignore')
+    if subtype == 'html':
+        text = _TAG_RE.sub(' ', text)
+    return text
@@ -8,27 +8,133 @@
 import sys
 import os
 import logging
+from contextlib import contextmanager
 from datetime import datetime
 from clear_qq_email import QQEmailCleaner
+import log_setup
+import profiling
+import metrics
+from scheduler import Deadline, RunLock, Scheduler, WorkItem, estimate_round_trips
+
+LOCK_FILE = 'cron_cleaner.lock'
 
 # 设置日志
 def setup_logging():
-    """设置日志配置"""
-    log_format = '%(asctime)s - %(levelname)s - %(message)s'
-    logging.basicConfig(
-        level=logging.INFO,
-        format=log_format,
-        handlers=[
-            logging.FileHandler('cron_cleaner.log', encoding='utf-8'),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+    """设置日志配置，格式和轮转设置读取自配置文件；清理器沿用此配置，不会重复添加处理器"""
+    options = log_setup.config_file_options('email_config.ini')
+    log_setup.setup_logging('cron_cleaner.log', stream=sys.stdout, **options)
     return logging.getLogger(__name__)
 
+@contextmanager
+def run_stage(name):
+    """进入一个处理阶段：更新指标中的当前阶段，启用 --profile 时同时记录性能数据"""
+    metrics.set_stage(name)
+    with profiling.stage(name):
+        yield
+
+def clean_sender(cleaner, sender, dry_run, days_before_delete):
+    """清理单个发送人的邮件，各发送人共用一个连接"""
+    if cleaner.mail is None and not cleaner.connect_to_mailbox():
+        return 0
+    return cleaner.clean_target_senders([sender], dry_run, days_before_delete).get(sender, 0)
+
+def run_rule(cleaner, method):
+    """清理规则方法自行连接和断开，先关闭发送人工作共用的连接"""
+    cleaner.disconnect()
+    return method()
+
+def build_work_items(cleaner, scheduler, logger):
+    """
+    用一次连接估算各项工作的收益并加入调度器
+
+    每个目标发送人、已读且不带附件规则只需一次 SEARCH 即可估算邮件数量；
+    按字节排序（schedule_by = bytes）时额外批量获取候选邮件的大小。
+    正文匹配、批量操作规则和去重无法事先估算，排在最后。
+    """
+    from quota import QuotaReclaimer, MB
+    config = cleaner.config['EMAIL']
+    dry_run = config.getboolean('dry_run', True)
+    days_before_delete = int(config.get('days_before_delete', 3))
+    batch_size = config.getint('fetch_batch_size', 500)
+    age = cleaner.get_age_criteria(days_before_delete)
+    by_bytes = scheduler.by == 'bytes'
+    
+    if not cleaner.connect_to_mailbox():
+        return
+    cleaner.mail.select('INBOX')
+    reclaimer = QuotaReclaimer(cleaner.mail, batch_size, logger)
+    gmail_support = cleaner.get_gmail_support()
+    
+    def estimate(criteria, per_message=0):
+        uids = cleaner.search_uids(criteria)
+        size = sum(reclaimer.fetch_sizes(uids).values()) if by_bytes and uids else 0
+        if gmail_support:
+            # Gmail 快速路径只需一次搜索和按区间移动
+            return uids, size, 1 + sum(1 for _ in uids.chunks())
+        return uids, size, estimate_round_trips(uids, batch_size, per_message)
+    
+    target_senders = cleaner.get_target_senders()
+    if target_senders and target_senders[0] != 'sender1@example.com':
+        for sender in target_senders:
+            uids, size, round_trips = estimate(f'FROM "{sender}" {age}')
+            if not uids:
+                logger.info(f"{sender} 没有需要清理的邮件")
+                continue
+            scheduler.add(WorkItem(
+                f"清理发送人 {sender}", sender,
+                lambda sender=sender: clean_sender(cleaner, sender, dry_run, days_before_delete),
+                len(uids), size, round_trips))
+    else:
+        logger.info("未配置目标发送人")
+    
+    if config.getboolean('clean_read_no_attachment', False):
+        # 每封候选邮件还要单独检查附件
+        uids, size, round_trips = estimate(f'SEEN {age}', per_message=1)
+        scheduler.add(WorkItem(
+            "清理已读且不带附件的邮件", '已读且不带附件的邮件',
+            lambda: run_rule(cleaner, cleaner.clean_read_no_attachment_emails),
+            len(uids), size, round_trips))
+    
+    if config.get('content_patterns', '', raw=True).strip():
+        scheduler.add(WorkItem(
+            "清理正文匹配规则的邮件", '正文匹配规则的邮件',
+            lambda: run_rule(cleaner, cleaner.clean_content_matched_emails)))
+    
+    if config.get('action_rules', '', raw=True).strip():
+        scheduler.add(WorkItem(
+            "执行批量操作规则", '批量操作规则删除的邮件',
+            lambda: run_rule(cleaner, cleaner.clean_action_rules)))
+    
+    if config.getboolean('clean_duplicates', False):
+        scheduler.add(WorkItem(
+            "清理重复邮件", '重复邮件',
+            lambda: run_rule(cleaner, cleaner.clean_duplicate_emails)))
+    
+    free_bytes = int(config.getfloat('quota_free_mb', 0) * MB)
+    if free_bytes > 0:
+        scheduler.add(WorkItem(
+            "按容量回收空间", '按容量清理的邮件',
+            lambda: run_rule(cleaner, cleaner.clean_for_quota),
+            0, reclaimer.bytes_to_free(free_bytes), 3))
+
 def main():
-    """主函数 - 无交互，适合cron执行"""
+    """
+    主函数 - 无交互，适合cron执行；带 --profile 参数时记录各项工作的性能数据
+
+    同一时间只允许一个实例运行；配置了 max_runtime 时，到时间后不再开始新的工作，
+    未完成的工作留到下次运行。
+    """
     logger = setup_logging()
     
+    lock = RunLock(LOCK_FILE)
+    if not lock.acquire():
+        logger.warning(f"上一次清理任务（进程 {lock.holder()}）仍在运行，本次跳过")
+        return
+    
+    if '--profile' in sys.argv[1:]:
+        profiling.start_profiling('cron_cleaner', 'cron_cleaner.log')
+        logger.info("已启用性能分析")
+    
     logger.info("=" * 60)
     logger.info("邮箱清理任务开始执行")
     logger.info(f"执行时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -42,57 +148,44 @@ def main():
         
         # 创建清理器实例
         cleaner = QQEmailCleaner()
+        config = cleaner.config['EMAIL']
+        deadline = Deadline(config.getint('max_runtime', 0))
+        cleaner.deadline = deadline
+        metrics.start_server(config.getint('metrics_port', 0), config.get('metrics_host', '127.0.0.1'))
+        if deadline.expires is not None:
+            logger.info(f"本次运行时间上限: {deadline.seconds} 秒")
         
-        # 执行清理任务
+        # 估算各项工作并按收益排序执行
         logger.info("开始执行邮箱清理任务...")
+        scheduler = Scheduler(deadline, config.get('schedule_by', 'messages'), logger)
+        with run_stage('估算工作量'):
+            build_work_items(cleaner, scheduler, logger)
+        metrics.set_expected(sum(item.messages for item in scheduler.items))
+        results = scheduler.run(run_stage)
+        cleaner.disconnect()
         
-        total_deleted = 0
-        details = []
-        
-        # 1. 清理指定发送人的邮件
-        logger.info("步骤1: 清理指定发送人的邮件")
-        try:
-            # 获取配置
-            target_senders = cleaner.config['EMAIL']['target_senders'].split(',')
-            target_senders = [sender.strip() for sender in target_senders if sender.strip()]
-            
-            if target_senders and target_senders[0] != 'sender1@example.com':
-                for sender in target_senders:
-                    logger.info(f"处理来自 {sender} 的邮件...")
-                    email_ids = cleaner.get_sender_emails(sender)
-                    if email_ids:
-                        deleted_count = cleaner.delete_emails(email_ids, False, int(cleaner.config['EMAIL'].get('days_before_delete', 3)))
-                        total_deleted += deleted_count
-                        details.append(f"{sender}: {deleted_count} 封")
-            else:
-                logger.info("未配置目标发送人，跳过此步骤")
-        except Exception as e:
-            logger.error(f"清理指定发送人邮件时出错: {str(e)}")
+        total_deleted = sum(count for _, count in results)
+        # 移动、复制、标记等批量操作不计入删除数量，在详细信息中单独列出
+        other_actions = cleaner.take_action_summaries()
+        details = [f"{label}: {count} 封" for label, count in results] + other_actions
+        counts = dict(results)
         
-        # 2. 清理已读且不带附件的邮件
-        logger.info("步骤2: 清理已读且不带附件的邮件")
-        try:
-            if cleaner.config['EMAIL'].getboolean('clean_read_no_attachment', False):
-                deleted_count = cleaner.clean_read_no_attachment_emails()
-                if deleted_count and deleted_count > 0:
-                    total_deleted += deleted_count
-                    details.append(f"已读且不带附件的邮件: {deleted_count} 封")
+        # 发送汇总通知邮件
+        with run_stage('发送通知'):
+            if total_deleted > 0 or other_actions:
+                logger.info("发送通知邮件")
+                try:
+                    details_str = "; ".join(details)
+                    cleaner.send_notification_email(total_deleted, details_str, counts)
+                except Exception as e:
+                    logger.error(f"发送通知邮件失败: {str(e)}")
             else:
-                logger.info("未启用清理已读邮件功能，跳过此步骤")
-        except Exception as e:
-            logger.error(f"清理已读邮件时出错: {str(e)}")
+                logger.info("没有删除任何邮件，跳过通知邮件发送")
+                # 启用汇总时，时间窗口到期的汇总仍要发送
+                cleaner.flush_digest()
         
-        # 3. 发送汇总通知邮件
-        if total_deleted > 0:
-            logger.info("步骤3: 发送通知邮件")
-            try:
-                details_str = "; ".join(details)
-                cleaner.send_notification_email(total_deleted, details_str)
-                logger.info("通知邮件发送成功")
-            except Exception as e:
-                logger.error(f"发送通知邮件失败: {str(e)}")
-        else:
-            logger.info("没有删除任何邮件，跳过通知邮件发送")
+        # 等待后台通知邮件发送完毕
+        cleaner.wait_for_notifications()
         
         logger.info("=" * 60)
         logger.info("邮箱清理任务执行完成")
@@ -103,6 +196,10 @@ def main():
         logger.error(f"邮箱清理任务执行失败: {str(e)}")
         logger.error(f"错误详情: {sys.exc_info()}")
         sys.exit(1)
+    finally:
+        profiling.stop_profiling()
+        metrics.stop_server()
+        lock.release()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
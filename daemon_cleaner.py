@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+邮箱清理工具 - 常驻进程版本
+保持一个IMAP连接，通过IDLE（服务器不支持时用NOOP轮询）获知新邮件，
+只对新到达的邮件应用发送人规则；按天数删除的规则由定时全量扫描处理
+"""
+
+import sys
+import os
+import ssl
+import time
+import heapq
+import signal
+import select
+import logging
+import imaplib
+from datetime import datetime
+
+import log_setup
+import metrics
+from clear_qq_email import QQEmailCleaner
+from content_rules import ContentMatcher
+from notifier import shutdown_dispatcher
+
+
+def has_buffered_data(mail):
+    """
+    连接上是否已有可立即读取的数据
+
+    readline 经由 imaplib 的 BufferedReader（mail.file）读取，同一个TCP段中的后续响应行
+    可能已读入缓冲区，SSL层也可能缓存了已解密的数据，这两种情况下套接字都不再可读。
+    临时把套接字设为非阻塞后 peek：缓冲区有数据时直接返回，否则最多做一次不等待的读取。
+    """
+    timeout = mail.sock.gettimeout()
+    mail.sock.settimeout(0)
+    try:
+        return bool(mail.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        mail.sock.settimeout(timeout)
+
+
+def imap_idle(mail, timeout):
+    """
+    执行一次IMAP IDLE（RFC 2177），等待服务器推送或超时
+
+    Args:
+        mail: 已选择文件夹的 imaplib 连接
+        timeout (float): 最长等待秒数
+
+    Returns:
+        list: IDLE期间收到的未标记响应行，例如 b'* 12 EXISTS'
+    """
+    tag = mail._new_tag()
+    mail.send(tag + b' IDLE\r\n')
+    line = mail.readline()
+    if not line.startswith(b'+'):
+        raise imaplib.IMAP4.error(f"IDLE 被拒绝: {line!r}")
+
+    responses = []
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        # 缓冲区中已有数据时无需等待套接字可读
+        if not has_buffered_data(mail):
+            readable, _, _ = select.select([mail.sock], [], [], remaining)
+            if not readable:
+                break
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("IDLE 期间连接已关闭")
+        responses.append(line.rstrip())
+        if b'EXISTS' in line or b'BYE' in line:
+            break
+
+    mail.send(b'DONE\r\n')
+    while True:
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("结束 IDLE 时连接已关闭")
+        if line.startswith(tag):
+            break
+        responses.append(line.rstrip())
+    # _new_tag 登记的标签不会被 imaplib 自己的响应处理移除
+    mail.tagged_commands.pop(tag, None)
+    return responses
+
+
+class CleanerDaemon:
+    """
+    常驻清理进程
+
+    新邮件到达时只获取新UID的元数据，匹配目标发送人后按到期时间加入待删除队列，
+    到期后删除；每隔 daemon_sweep_interval 秒在同一连接上执行一次全量清理。
+    """
+
+    def __init__(self, cleaner, logger=None):
+        self.cleaner = cleaner
+        self.logger = logger or logging.getLogger(__name__)
+        config = cleaner.config['EMAIL']
+        self.idle_timeout = config.getint('daemon_idle_timeout', 1500)
+        self.poll_interval = config.getint('daemon_poll_interval', 60)
+        self.sweep_interval = config.getint('daemon_sweep_interval', 3600)
+        self.dry_run = config.getboolean('dry_run', True)
+        self.days_before_delete = int(config.get('days_before_delete', 3))
+        self.target_senders = {sender.lower() for sender in cleaner.get_target_senders()}
+        self.last_uid = 0
+        self.next_sweep = 0
+        # (到期时间, UID, 发送人) 小顶堆
+        self.pending = []
+        self.running = True
+
+    @property
+    def mail(self):
+        return self.cleaner.mail
+
+    def connect(self):
+        """建立连接并记录当前最大UID，之后只处理更新的邮件"""
+        if not self.cleaner.connect_to_mailbox():
+            return False
+        status, data = self.mail.status('INBOX', '(UIDNEXT)')
+        if status == 'OK':
+            self.last_uid = int(data[0].split(b'UIDNEXT')[1].strip(b' )')) - 1
+        self.mail.select('INBOX')
+        self.supports_idle = 'IDLE' in self.mail.capabilities
+        mode = 'IDLE' if self.supports_idle else f'NOOP轮询（{self.poll_interval}秒）'
+        self.logger.info(f"常驻模式已连接，等待新邮件方式: {mode}，当前最大UID: {self.last_uid}")
+        return True
+
+    def wait_for_changes(self):
+        """等待新邮件，返回后由调用方检查是否有新UID"""
+        timeout = max(min(self.idle_timeout, self.seconds_until_next_task()), 1)
+        metrics.set_stage('等待新邮件')
+        if self.supports_idle:
+            imap_idle(self.mail, timeout)
+        else:
+            time.sleep(min(timeout, self.poll_interval))
+            self.mail.noop()
+
+    def seconds_until_next_task(self):
+        """距离下一次全量扫描或待删除邮件到期的秒数"""
+        next_task = self.next_sweep
+        if self.pending:
+            next_task = min(next_task, self.pending[0][0])
+        return next_task - time.time()
+
+    def process_new_messages(self):
+        """获取新到达邮件的元数据，匹配目标发送人的邮件按到期时间加入队列"""
+        new_uids = self.cleaner.search_uids(f'UID {self.last_uid + 1}:*')
+        # "n:*" 在没有新邮件时也会返回最大的那封邮件
+        new_uids = [uid for uid in new_uids if uid > self.last_uid]
+        if not new_uids:
+            return
+        self.last_uid = max(new_uids)
+        metrics.set_stage('处理新邮件')
+
+        batch = self.cleaner.fetch_email_records(new_uids)
+        matched = 0
+        for record in batch:
+            # 与 IMAP FROM 搜索一致，按子串匹配发送人
+            if not any(target in record.sender for target in self.target_senders):
+                continue
+            due = max(record.timestamp, 0) + self.days_before_delete * 86400
+            heapq.heappush(self.pending, (due, record.uid, record.sender))
+            matched += 1
+        self.logger.info(f"收到新邮件 {len(batch)} 封，其中 {matched} 封匹配目标发送人")
+
+    def process_due_messages(self):
+        """删除已到期的待删除邮件"""
+        now = time.time()
+        due_uids = []
+        counts = {}
+        while self.pending and self.pending[0][0] <= now:
+            _, uid, sender = heapq.heappop(self.pending)
+            due_uids.append(uid)
+            counts[sender] = counts.get(sender, 0) + 1
+        if not due_uids:
+            return
+        metrics.set_stage('删除到期邮件')
+        deleted = self.cleaner.delete_emails(due_uids, self.dry_run, self.days_before_delete, rule='target_senders')
+        if deleted > 0:
+            details = "; ".join(f"{sender}: {count} 封" for sender, count in counts.items())
+            self.cleaner.send_notification_email(deleted, details, counts)
+
+    def sweep(self):
+        """在当前连接上执行一次全量清理"""
+        self.logger.info("开始定时全量扫描")
+        metrics.set_stage('定时全量扫描')
+        # 每次全量扫描重新生成删除计划，同一批邮件不会在计划中累计多次
+        self.cleaner.plan = None
+        counts = self.cleaner.clean_target_senders(
+            self.cleaner.get_target_senders(), self.dry_run, self.days_before_delete)
+
+        if self.cleaner.config['EMAIL'].getboolean('clean_read_no_attachment', False):
+            emails = self.cleaner.get_read_no_attachment_emails(self.days_before_delete)
+            if emails:
+                deleted = self.cleaner.delete_emails(emails, self.dry_run, self.days_before_delete,
+                                                     rule='read_no_attachment')
+                counts['已读且不带附件的邮件'] = deleted
+
+        matcher = ContentMatcher.from_config(self.cleaner.config['EMAIL'].get('content_patterns', '', raw=True))
+        if matcher:
+            max_bytes = self.cleaner.config['EMAIL'].getint('content_max_bytes', 4096)
+            emails = self.cleaner.get_content_matched_emails(matcher, self.days_before_delete, max_bytes)
+            if emails:
+                deleted = self.cleaner.delete_emails(emails, self.dry_run, self.days_before_delete,
+                                                     rule='content_patterns')
+                counts['正文匹配规则的邮件'] = deleted
+
+        action_rules = self.cleaner.config['EMAIL'].get('action_rules', '', raw=True)
+        if action_rules.strip():
+            from actions import ActionError, parse_rules
+            try:
+                deleted = sum(self.cleaner.run_action_rules(parse_rules(action_rules), self.dry_run).values())
+                if deleted:
+                    counts['批量操作规则删除的邮件'] = deleted
+            except ActionError as e:
+                self.logger.error(f"批量操作规则格式错误: {str(e)}")
+
+        self.mail.select('INBOX')
+        total_deleted = sum(counts.values())
+        other_actions = self.cleaner.take_action_summaries()
+        self.logger.info(f"定时全量扫描完成，共删除 {total_deleted} 封邮件")
+        if total_deleted > 0 or other_actions:
+            details = "; ".join([f"{sender}: {count} 封" for sender, count in counts.items()] + other_actions)
+            self.cleaner.send_notification_email(total_deleted, details, counts)
+        else:
+            self.cleaner.flush_digest()
+        self.next_sweep = time.time() + self.sweep_interval
+
+    def run(self):
+        """主循环，连接断开时退避重连"""
+        retry_delay = 5
+        while self.running:
+            try:
+                if not self.connect():
+                    raise imaplib.IMAP4.abort("连接邮箱失败")
+                retry_delay = 5
+                self.next_sweep = time.time()
+                while self.running:
+                    if time.time() >= self.next_sweep:
+                        self.sweep()
+                    self.process_due_messages()
+                    self.wait_for_changes()
+                    self.process_new_messages()
+            except (imaplib.IMAP4.abort, OSError) as e:
+                self.logger.error(f"连接中断: {str(e)}，{retry_delay} 秒后重连")
+                self.cleaner.disconnect()
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 600)
+        self.cleaner.disconnect()
+
+
+def main():
+    """主函数 - 常驻运行，收到 SIGTERM/SIGINT 后退出"""
+    log_setup.setup_logging('daemon_cleaner.log', stream=sys.stdout,
+                            **log_setup.config_file_options('email_config.ini'))
+    logger = logging.getLogger(__name__)
+
+    if not os.path.exists('email_config.ini'):
+        logger.error("配置文件 email_config.ini 不存在")
+        sys.exit(1)
+
+    def handle_signal(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    logger.info(f"邮箱清理常驻进程启动: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    cleaner = QQEmailCleaner()
+    config = cleaner.config['EMAIL']
+    metrics.start_server(config.getint('metrics_port', 0), config.get('metrics_host', '127.0.0.1'))
+    daemon = CleanerDaemon(cleaner, logger)
+    try:
+        daemon.run()
+    except (KeyboardInterrupt, SystemExit):
+        logger.info("收到退出信号，正在退出")
+    finally:
+        cleaner.disconnect()
+        metrics.stop_server()
+        shutdown_dispatcher(cleaner.config['EMAIL'].getint('notification_timeout', 60))
+
+
+if __name__ == "__main__":
+    main()
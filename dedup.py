@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重复邮件检测
+按 Message-ID（没有时按发件人、日期、主题）加邮件大小计算指纹，
+一次扫描一个或多个文件夹，每组重复邮件只保留最先扫描到的一封
+"""
+
+import re
+import hashlib
+import logging
+from email.parser import BytesHeaderParser
+
+from mail_records import iter_fetch_responses
+from uid_set import UidSet
+
+DEDUP_FETCH_ITEMS = '(UID RFC822.SIZE BODY.PEEK[HEADER.FIELDS (MESSAGE-ID FROM DATE SUBJECT)])'
+# Gmail 同一封邮件出现在它的每个标签文件夹中，额外获取 X-GM-MSGID 识别同一封邮件
+GMAIL_DEDUP_FETCH_ITEMS = '(UID X-GM-MSGID RFC822.SIZE BODY.PEEK[HEADER.FIELDS (MESSAGE-ID FROM DATE SUBJECT)])'
+
+_UID_RE = re.compile(rb'UID (\d+)')
+_SIZE_RE = re.compile(rb'RFC822\.SIZE (\d+)')
+_GM_MSGID_RE = re.compile(rb'X-GM-MSGID (\d+)')
+_header_parser = BytesHeaderParser()
+
+
+def message_fingerprint(header_bytes, size):
+    """
+    计算邮件指纹
+
+    Args:
+        header_bytes (bytes): HEADER.FIELDS 返回的邮件头
+        size (int): RFC822.SIZE
+
+    Returns:
+        int: 128位指纹；没有 Message-ID 且发件人、日期、主题都为空时返回 None（不参与去重）
+    """
+    headers = _header_parser.parsebytes(header_bytes)
+    message_id = (headers.get('Message-ID') or '').strip().strip('<>').lower()
+    if message_id:
+        key = f"id\0{message_id}\0{size}"
+    else:
+        fields = [' '.join(str(headers.get(name) or '').split()) for name in ('From', 'Date', 'Subject')]
+        if not any(fields):
+            return None
+        key = "hdr\0" + "\0".join(fields) + f"\0{size}"
+    digest = hashlib.blake2b(key.encode('utf-8', errors='replace'), digest_size=16).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class DuplicateFinder:
+    """
+    跨文件夹的重复邮件查找
+
+    只保存已见指纹的集合，每封邮件约占几十字节；邮件头按批获取，
+    扫描十万封以上的邮箱时内存占用也有上限。
+
+    Gmail 中同一封邮件在每个标签文件夹里各出现一次，Message-ID 和大小都相同，
+    但删除任一个都会把邮件移到垃圾箱，所以 X-GM-MSGID 已扫描过的邮件不算重复。
+    """
+
+    def __init__(self, mail, batch_size=500, logger=None, gmail=False):
+        """
+        Args:
+            mail: imaplib 连接
+            batch_size (int): 每次FETCH请求包含的UID数量
+            logger: 日志记录器
+            gmail (bool): 服务器是否支持 X-GM-MSGID（Gmail 扩展）
+        """
+        self.mail = mail
+        self.batch_size = batch_size
+        self.logger = logger or logging.getLogger(__name__)
+        self.gmail = gmail
+        self.seen = set()
+        # Gmail 已扫描过的 X-GM-MSGID
+        self.seen_messages = set()
+        self.scanned = 0
+
+    def scan_folder(self, folder):
+        """
+        扫描当前已选择的文件夹
+
+        Args:
+            folder (str): 文件夹名，仅用于日志
+
+        Returns:
+            UidSet: 该文件夹中与之前扫描到的邮件重复的UID
+        """
+        status, data = self.mail.uid('SEARCH', None, 'ALL')
+        if status != 'OK':
+            self.logger.error(f"搜索文件夹 {folder} 失败")
+            return UidSet()
+        uids = UidSet.from_search_response(data[0])
+
+        duplicates = []
+        fetch_items = GMAIL_DEDUP_FETCH_ITEMS if self.gmail else DEDUP_FETCH_ITEMS
+        for chunk in uids.batches(self.batch_size):
+            status, msg_data = self.mail.uid('FETCH', str(chunk), fetch_items)
+            if status != 'OK':
+                self.logger.error(f"获取邮件头失败: {chunk}")
+                continue
+            # 服务器返回顺序不一定按UID排列，按UID排序保证保留最早到达的一封
+            responses = []
+            for meta, literals in iter_fetch_responses(msg_data):
+                uid_match = _UID_RE.search(meta)
+                size_match = _SIZE_RE.search(meta)
+                if uid_match and literals:
+                    size = int(size_match.group(1)) if size_match else 0
+                    message_match = _GM_MSGID_RE.search(meta) if self.gmail else None
+                    message_id = int(message_match.group(1)) if message_match else None
+                    responses.append((int(uid_match.group(1)), literals[0], size, message_id))
+            responses.sort()
+            for uid, header, size, message_id in responses:
+                self.scanned += 1
+                if message_id is not None:
+                    if message_id in self.seen_messages:
+                        # 同一封邮件的另一个标签
+                        continue
+                    self.seen_messages.add(message_id)
+                fingerprint = message_fingerprint(header, size)
+                if fingerprint is None:
+                    continue
+                if fingerprint in self.seen:
+                    duplicates.append(uid)
+                else:
+                    self.seen.add(fingerprint)
+
+        self.logger.info(f"文件夹 {folder} 共 {len(uids)} 封邮件，其中重复 {len(duplicates)} 封")
+        return UidSet(duplicates)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+通知汇总
+每次清理的结果先追加到本地暂存文件，达到时间窗口或运行次数后合并为一条汇总通知
+"""
+
+import os
+import json
+import time
+import unicodedata
+from datetime import datetime
+
+
+def pad_text(text, width, align_right=False):
+    """按显示宽度补齐文本，中文字符按两个字符宽度计算"""
+    text = str(text)
+    display_width = sum(2 if unicodedata.east_asian_width(ch) in 'WF' else 1 for ch in text)
+    padding = ' ' * max(width - display_width, 0)
+    return padding + text if align_right else text + padding
+
+
+class NotificationDigest:
+    """
+    清理结果暂存与汇总
+
+    暂存文件每行一条JSON记录。多个进程可同时追加；汇总时先把暂存文件
+    原子地改名，保证同一批记录只会被汇总一次。追加和改名都持有暂存文件的
+    fcntl.flock 锁，改名前已打开文件的进程拿到锁后发现文件已被改名，会改为追加到新的暂存文件。
+    """
+
+    def __init__(self, spool_path='notification_spool.jsonl'):
+        """
+        Args:
+            spool_path (str): 暂存文件路径
+        """
+        self.spool_path = spool_path
+
+    def record(self, account, total_deleted, counts):
+        """
+        追加一次运行的结果
+
+        Args:
+            account (str): 邮箱账号
+            total_deleted (int): 本次删除的邮件总数
+            counts (dict): 发送人/规则 -> 删除数量
+        """
+        entry = {
+            'time': int(time.time()),
+            'account': account,
+            'total_deleted': total_deleted,
+            'counts': counts or {}
+        }
+        self._append([entry])
+
+    def restore(self, entries):
+        """把 take() 取出但未能发送的记录写回暂存文件，保留原来的时间，留到下次汇总"""
+        if entries:
+            self._append(entries)
+
+    def _append(self, entries):
+        data = ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+        fd = self._open_locked(os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+        try:
+            os.write(fd, data.encode('utf-8'))
+        finally:
+            os.close(fd)
+
+    def load(self, path=None):
+        """读取暂存的全部记录"""
+        entries = []
+        path = path or self.spool_path
+        if not os.path.exists(path):
+            return entries
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        return entries
+
+    def should_flush(self, interval_hours=24, max_runs=0):
+        """
+        是否应该发送汇总
+
+        Args:
+            interval_hours (float): 最早一条记录距今超过该小时数时发送，0 表示不按时间发送
+            max_runs (int): 记录数达到该值时发送，0 表示不按次数发送
+        """
+        entries = self.load()
+        if not entries:
+            return False
+        if max_runs and len(entries) >= max_runs:
+            return True
+        # 写回的记录排在新记录之后，按最早的时间计算
+        if interval_hours and time.time() - min(entry['time'] for entry in entries) >= interval_hours * 3600:
+            return True
+        return False
+
+    def take(self):
+        """
+        取出并清空暂存的记录
+
+        Returns:
+            list: 暂存的记录，没有记录或已被其他进程取走时为空列表
+        """
+        fd = self._open_locked(os.O_RDONLY)
+        if fd is None:
+            return []
+        flushing_path = f"{self.spool_path}.{os.getpid()}.flushing"
+        try:
+            # 持有锁时改名，正在追加的进程写完后才会改名，之后的追加写入新的暂存文件
+            os.replace(self.spool_path, flushing_path)
+            return self.load(flushing_path)
+        finally:
+            os.close(fd)
+            if os.path.exists(flushing_path):
+                os.remove(flushing_path)
+
+    def _open_locked(self, flags):
+        """
+        打开暂存文件并加排他锁
+
+        等待锁期间文件可能已被 take() 改名，此时重新打开，保证持有锁的
+        描述符对应当前的暂存文件；平台不支持 fcntl 时不加锁。
+
+        Returns:
+            int: 文件描述符，不带 O_CREAT 且文件不存在时为 None
+        """
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None
+        while True:
+            try:
+                fd = os.open(self.spool_path, flags, 0o600)
+            except FileNotFoundError:
+                return None
+            if fcntl is None:
+                return fd
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.path.samestat(os.fstat(fd), os.stat(self.spool_path)):
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    @staticmethod
+    def build_summary(entries):
+        """
+        生成汇总通知的标题和正文，包含按账号和按发送人统计的表格
+
+        Returns:
+            tuple: (标题, 正文)
+        """
+        entries = sorted(entries, key=lambda entry: entry['time'])
+        by_account = {}
+        by_sender = {}
+        for entry in entries:
+            account = by_account.setdefault(entry['account'], [0, 0])
+            account[0] += 1
+            account[1] += entry['total_deleted']
+            for sender, count in entry['counts'].items():
+                by_sender[sender] = by_sender.get(sender, 0) + count
+
+        total = sum(deleted for _, deleted in by_account.values())
+        start = datetime.fromtimestamp(entries[0]['time']).strftime('%Y-%m-%d %H:%M')
+        end = datetime.fromtimestamp(entries[-1]['time']).strftime('%Y-%m-%d %H:%M')
+
+        lines = [
+            "邮箱清理汇总",
+            "",
+            f"统计时间: {start} ~ {end}",
+            f"运行次数: {len(entries)}",
+            f"总共删除邮件: {total} 封",
+            "",
+            "按邮箱统计:",
+            "  " + pad_text('邮箱', 36) + pad_text('运行次数', 10, True) + pad_text('删除数量', 10, True),
+        ]
+        for account, (runs, deleted) in sorted(by_account.items(), key=lambda item: -item[1][1]):
+            lines.append("  " + pad_text(account, 36) + pad_text(runs, 10, True) + pad_text(deleted, 10, True))
+        lines.append("")
+        lines.append("按发送人统计:")
+        lines.append("  " + pad_text('发送人', 36) + pad_text('删除数量', 10, True))
+        for sender, count in sorted(by_sender.items(), key=lambda item: -item[1]):
+            lines.append("  " + pad_text(sender, 36) + pad_text(count, 10, True))
+        lines.append("")
+        lines.append("此邮件由邮箱自动清理工具发送")
+
+        title = f"邮箱清理汇总 - {end}（{len(entries)} 次运行，共 {total} 封）"
+        return title, "\n".join(lines)
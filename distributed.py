@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多机/多进程分布式清理
+协调端把（配置文件 × 文件夹）作为工作单元写入 SQLite 队列，
+任意数量的工作进程（可在多台机器上共享同一个数据库文件）领取租约、执行清理并上报结果。
+租约到期未续约的单元会被重新领取；同一邮箱类型的并发数在所有工作进程间受统一限制。
+本机启动多个工作进程时，每个进程写自己的日志文件（email_cleaner.worker<序号>.log）；
+dry_run 生成的删除计划按账号和文件夹分别保存（见 unit_plan_path），用 plan.py apply --plan 逐个执行。
+
+用法:
+    python distributed.py enqueue a.ini b.ini --folders INBOX    # 加入工作单元
+    python distributed.py caps qq=2 163=4                         # 设置各邮箱类型的并发上限
+    python distributed.py worker --processes 4                    # 启动工作进程
+    python distributed.py status                                  # 查看队列和工作进程统计
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import socket
+import sqlite3
+import logging
+import argparse
+import threading
+import configparser
+import multiprocessing
+from contextlib import contextmanager
+
+DEFAULT_DB = 'work_queue.db'
+# 未单独设置时每种邮箱类型的并发上限
+DEFAULT_PROVIDER_CAP = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY,
+    config_path TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_run REAL NOT NULL DEFAULT 0,
+    result TEXT,
+    updated REAL,
+    UNIQUE (config_path, folder)
+);
+CREATE INDEX IF NOT EXISTS units_status ON units (status, next_run);
+CREATE TABLE IF NOT EXISTS provider_caps (
+    provider TEXT PRIMARY KEY,
+    cap INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    started REAL,
+    last_seen REAL,
+    units_done INTEGER NOT NULL DEFAULT 0,
+    units_failed INTEGER NOT NULL DEFAULT 0,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class WorkQueue:
+    """
+    基于 SQLite 的租约队列
+
+    每次操作使用独立连接并以 BEGIN IMMEDIATE 开始事务，
+    多个进程和续约线程可以安全地同时访问同一个数据库文件。
+    """
+
+    def __init__(self, db_path=DEFAULT_DB, max_attempts=3, retry_delay=300):
+        """
+        Args:
+            db_path (str): 数据库文件路径
+            max_attempts (int): 单元最多执行次数，超过后标记为失败
+            retry_delay (int): 失败后重新执行前等待的秒数
+        """
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        db = sqlite3.connect(db_path, timeout=30)
+        try:
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                yield db
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+        finally:
+            db.close()
+
+    def enqueue(self, config_path, folder, provider):
+        """加入工作单元；已完成或失败的同名单元重新置为待执行，正在执行的不受影响"""
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO units (config_path, folder, provider, next_run, updated) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (config_path, folder) DO UPDATE SET "
+                "status = 'pending', attempts = 0, next_run = excluded.next_run, provider = excluded.provider, "
+                "updated = excluded.updated WHERE units.status IN ('done', 'failed')",
+                (config_path, folder, provider, now, now))
+
+    def set_cap(self, provider, cap):
+        """设置邮箱类型的并发上限"""
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO provider_caps (provider, cap) VALUES (?, ?)", (provider, cap))
+
+    def claim(self, worker_id, lease_seconds=600):
+        """
+        领取一个工作单元
+
+        先回收已过期的租约，再跳过已达到并发上限的邮箱类型，按计划时间先后领取。
+
+        Returns:
+            dict: 工作单元，没有可领取的单元时返回 None
+        """
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE units SET status = 'pending', lease_owner = NULL "
+                "WHERE status = 'leased' AND lease_expires < ?", (now,))
+            active = dict(db.execute(
+                "SELECT provider, COUNT(*) FROM units WHERE status = 'leased' GROUP BY provider").fetchall())
+            caps = dict(db.execute("SELECT provider, cap FROM provider_caps").fetchall())
+            db.execute(
+                "INSERT INTO workers (worker_id, started, last_seen) VALUES (?, ?, ?) "
+                "ON CONFLICT (worker_id) DO UPDATE SET last_seen = excluded.last_seen",
+                (worker_id, now, now))
+
+            rows = db.execute(
+                "SELECT * FROM units WHERE status = 'pending' AND next_run <= ? ORDER BY next_run, id", (now,))
+            for row in rows:
+                if active.get(row['provider'], 0) >= caps.get(row['provider'], DEFAULT_PROVIDER_CAP):
+                    continue
+                db.execute(
+                    "UPDATE units SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE id = ?",
+                    (worker_id, now + lease_seconds, now, row['id']))
+                unit = dict(row)
+                unit['attempts'] += 1
+                return unit
+        return None
+
+    def renew(self, unit_id, worker_id, lease_seconds=600):
+        """
+        续约
+
+        Returns:
+            bool: 租约仍属于该工作进程时返回 True
+        """
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE units SET lease_expires = ?, updated = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (now + lease_seconds, now, unit_id, worker_id))
+            db.execute("UPDATE workers SET last_seen = ? WHERE worker_id = ?", (now, worker_id))
+            return cursor.rowcount == 1
+
+    def complete(self, unit_id, worker_id, metrics, success=True):
+        """
+        上报执行结果
+
+        失败时未超过最多执行次数的单元延迟后重新排队，否则标记为失败。
+        租约已被其他工作进程接管时只记录工作进程统计。
+        """
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT attempts FROM units WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (unit_id, worker_id)).fetchone()
+            if row is not None:
+                if success:
+                    status, next_run = 'done', now
+                elif row['attempts'] < self.max_attempts:
+                    status, next_run = 'pending', now + self.retry_delay
+                else:
+                    status, next_run = 'failed', now
+                db.execute(
+                    "UPDATE units SET status = ?, lease_owner = NULL, lease_expires = NULL, next_run = ?, "
+                    "result = ?, updated = ? WHERE id = ?",
+                    (status, next_run, json.dumps(metrics, ensure_ascii=False), now, unit_id))
+            db.execute(
+                "UPDATE workers SET last_seen = ?, units_done = units_done + ?, units_failed = units_failed + ?, "
+                "deleted = deleted + ? WHERE worker_id = ?",
+                (now, 1 if success else 0, 0 if success else 1, metrics.get('deleted', 0), worker_id))
+
+    def pending_configs(self):
+        """
+        每种邮箱类型取一个待执行单元的配置文件
+
+        Returns:
+            list: 配置文件路径
+        """
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT provider, MIN(config_path) FROM units WHERE status = 'pending' GROUP BY provider").fetchall()
+        return [row[1] for row in rows]
+
+    def stats(self):
+        """
+        队列统计
+
+        Returns:
+            dict: units（状态 -> 数量）、providers（邮箱类型 -> 各状态数量）、workers（工作进程列表）
+        """
+        with self._transaction() as db:
+            units = dict(db.execute("SELECT status, COUNT(*) FROM units GROUP BY status").fetchall())
+            providers = {}
+            for row in db.execute("SELECT provider, status, COUNT(*) AS n FROM units GROUP BY provider, status"):
+                providers.setdefault(row['provider'], {})[row['status']] = row['n']
+            workers = [dict(row) for row in db.execute("SELECT * FROM workers ORDER BY last_seen DESC")]
+        return {'units': units, 'providers': providers, 'workers': workers}
+
+
+def provider_of(config_path):
+    """读取配置文件中的邮箱类型"""
+    config = configparser.ConfigParser()
+    config.read(config_path, encoding='utf-8')
+    return config.get('EMAIL', 'email_type', fallback='qq')
+
+
+def unit_plan_path(plan_file, account, folder):
+    """
+    工作单元的删除计划文件：在 plan_file 的文件名中加入账号和文件夹，
+    并行执行的单元不会覆盖彼此的计划，例如 deletion_plan.json -> deletion_plan.a_qq.com.INBOX.json
+    """
+    root, ext = os.path.splitext(plan_file)
+    name = re.sub(r'[^A-Za-z0-9._-]+', '_', f"{account}.{folder}")
+    return f"{root}.{name}{ext or '.json'}"
+
+
+def process_unit(unit, logger):
+    """
+    执行一个工作单元：在指定文件夹上应用发送人规则；
+    收件箱还应用已读无附件、正文匹配和按容量回收规则，与 cron_cleaner.py 一致
+
+    Returns:
+        dict: 执行结果
+    """
+    from clear_qq_email import QQEmailCleaner
+
+    cleaner = QQEmailCleaner(unit['config_path'])
+    config = cleaner.config['EMAIL']
+    dry_run = config.getboolean('dry_run', True)
+    days_before_delete = int(config.get('days_before_delete', 3))
+    folder = unit['folder']
+    if config.get('plan_file', ''):
+        config['plan_file'] = unit_plan_path(config['plan_file'], config['email'], folder)
+
+    if not cleaner.connect_to_mailbox():
+        raise RuntimeError(f"连接邮箱失败: {unit['config_path']}")
+    try:
+        counts = cleaner.clean_target_senders(cleaner.get_target_senders(), dry_run, days_before_delete, folder)
+    finally:
+        cleaner.disconnect()
+
+    if folder == 'INBOX':
+        if config.getboolean('clean_read_no_attachment', False):
+            counts['已读且不带附件的邮件'] = cleaner.clean_read_no_attachment_emails() or 0
+        if config.get('content_patterns', '', raw=True).strip():
+            counts['正文匹配规则的邮件'] = cleaner.clean_content_matched_emails()
+        if config.get('action_rules', '', raw=True).strip():
+            counts['批量操作规则删除的邮件'] = cleaner.clean_action_rules()
+        if config.getfloat('quota_free_mb', 0) > 0:
+            counts['按容量清理的邮件'] = cleaner.clean_for_quota()
+
+    counts = {key: value for key, value in counts.items() if value}
+    total_deleted = sum(counts.values())
+    # 移动、复制、标记等批量操作不计入删除数量，在详细信息中单独列出
+    other_actions = cleaner.take_action_summaries()
+    if total_deleted > 0 or other_actions:
+        details = "; ".join([f"{key}: {value} 封" for key, value in counts.items()] + other_actions)
+        cleaner.send_notification_email(total_deleted, details, counts)
+    else:
+        cleaner.flush_digest()
+    logger.info(f"工作单元完成: {unit['config_path']} {folder}，删除 {total_deleted} 封邮件")
+    return {'deleted': total_deleted, 'counts': counts, 'actions': other_actions, 'dry_run': dry_run}
+
+
+class Worker:
+    """工作进程：循环领取单元，执行期间由后台线程续约"""
+
+    def __init__(self, queue, lease_seconds=600, poll_interval=30, logger=None):
+        self.queue = queue
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    def _heartbeat(self, unit_id, stop):
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                if not self.queue.renew(unit_id, self.worker_id, self.lease_seconds):
+                    self.logger.warning(f"工作单元 {unit_id} 的租约已失效")
+                    return
+            except sqlite3.Error as e:
+                self.logger.error(f"续约失败: {str(e)}")
+
+    def run_one(self, unit):
+        """执行一个已领取的单元并上报结果"""
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(unit['id'], stop), daemon=True)
+        heartbeat.start()
+        started = time.time()
+        try:
+            metrics = process_unit(unit, self.logger)
+            success = True
+        except Exception as e:
+            self.logger.error(f"工作单元失败: {unit['config_path']} {unit['folder']}: {str(e)}")
+            metrics = {'deleted': 0, 'error': str(e)}
+            success = False
+        finally:
+            stop.set()
+            heartbeat.join()
+        metrics['duration'] = round(time.time() - started, 3)
+        metrics['worker'] = self.worker_id
+        self.queue.complete(unit['id'], self.worker_id, metrics, success)
+
+    def prewarm(self):
+        """并行连接队列中各邮箱类型的服务器，预先解析域名并取得可恢复的TLS会话"""
+        from clear_qq_email import QQEmailCleaner
+        import imap_connection
+
+        endpoints = []
+        for config_path in self.queue.pending_configs():
+            try:
+                endpoints.append(QQEmailCleaner(config_path).get_imap_endpoint())
+            except Exception as e:
+                self.logger.warning(f"读取配置失败: {config_path}: {str(e)}")
+        imap_connection.prewarm(endpoints)
+
+    def run(self, once=False):
+        """
+        主循环
+
+        Args:
+            once (bool): 没有可领取的单元时退出，否则等待 poll_interval 秒后重试
+        """
+        self.logger.info(f"工作进程启动: {self.worker_id}")
+        self.prewarm()
+        while True:
+            unit = self.queue.claim(self.worker_id, self.lease_seconds)
+            if unit is None:
+                if once:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            self.logger.info(f"领取工作单元: {unit['config_path']} {unit['folder']}（第 {unit['attempts']} 次）")
+            self.run_one(unit)
+        self.logger.info(f"工作进程退出: {self.worker_id}")
+
+
+def _worker_main(db_path, lease_seconds, poll_interval, once, log_file='email_cleaner.log'):
+    import log_setup
+    from notifier import shutdown_dispatcher
+
+    # 每个进程各自轮转日志文件，多个进程轮转同一个文件会互相改名而丢失日志
+    log_setup.setup_logging(log_file, stream=sys.stdout)
+    try:
+        Worker(WorkQueue(db_path), lease_seconds, poll_interval, logging.getLogger(__name__)).run(once)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown_dispatcher()
+        if 'imap_connection' in sys.modules:
+            sys.modules['imap_connection'].close_warm_connections()
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='分布式邮箱清理')
+    parser.add_argument('--db', default=DEFAULT_DB, help='队列数据库路径（多台机器共享时放在共享存储上）')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    enqueue = commands.add_parser('enqueue', help='加入工作单元')
+    enqueue.add_argument('configs', nargs='+', help='邮箱配置文件')
+    enqueue.add_argument('--folders', default='INBOX', help='逗号分隔的文件夹列表')
+
+    caps = commands.add_parser('caps', help='设置邮箱类型的并发上限')
+    caps.add_argument('caps', nargs='+', help='如 qq=2')
+
+    worker = commands.add_parser('worker', help='启动工作进程')
+    worker.add_argument('--processes', type=int, default=1, help='本机启动的工作进程数')
+    worker.add_argument('--lease', type=int, default=600, help='租约秒数')
+    worker.add_argument('--poll', type=int, default=30, help='没有工作时的等待秒数')
+    worker.add_argument('--once', action='store_true', help='队列中没有可领取的单元时退出')
+
+    commands.add_parser('status', help='查看队列统计')
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.db)
+    if args.command == 'enqueue':
+        folders = [folder.strip() for folder in args.folders.split(',') if folder.strip()]
+        for config_path in args.configs:
+            config_path = os.path.abspath(config_path)
+            provider = provider_of(config_path)
+            for folder in folders:
+                queue.enqueue(config_path, folder, provider)
+        print(f"已加入 {len(args.configs) * len(folders)} 个工作单元")
+
+    elif args.command == 'caps':
+        for item in args.caps:
+            provider, _, cap = item.partition('=')
+            queue.set_cap(provider.strip(), int(cap))
+        print("并发上限已更新")
+
+    elif args.command == 'worker':
+        worker_args = (args.db, args.lease, args.poll, args.once)
+        if args.processes <= 1:
+            _worker_main(*worker_args)
+        else:
+            processes = [multiprocessing.Process(target=_worker_main,
+                                                 args=worker_args + (f'email_cleaner.worker{index}.log',))
+                         for index in range(args.processes)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+
+    else:
+        stats = queue.stats()
+        print("工作单元:", ", ".join(f"{status} {count}" for status, count in sorted(stats['units'].items())) or "无")
+        for provider, counts in sorted(stats['providers'].items()):
+            print(f"  {provider}: " + ", ".join(f"{status} {count}" for status, count in sorted(counts.items())))
+        print("工作进程:")
+        for worker_stats in stats['workers']:
+            last_seen = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(worker_stats['last_seen']))
+            print(f"  {worker_stats['worker_id']}: 完成 {worker_stats['units_done']}，"
+                  f"失败 {worker_stats['units_failed']}，删除 {worker_stats['deleted']} 封，最后活动 {last_seen}")
+
+
+if __name__ == "__main__":
+    main()
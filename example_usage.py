@@ -60,6 +60,7 @@ def run_email_cleaner():
     
     total_deleted = 0
     details = []
+    counts = {}
     
     if target_senders and target_senders != 'sender1@example.com,sender2@example.com':
         print("\n开始清理指定发送人的邮件...")
@@ -68,6 +69,7 @@ def run_email_cleaner():
         if deleted_count and deleted_count > 0:
             total_deleted += deleted_count
             details.append(f"指定发送人邮件: {deleted_count} 封")
+            counts['指定发送人邮件'] = deleted_count
     else:
         print("\n未配置目标发送人，跳过指定发送人邮件清理")
     
@@ -79,6 +81,7 @@ def run_email_cleaner():
         if deleted_count and deleted_count > 0:
             total_deleted += deleted_count
             details.append(f"已读且不带附件的邮件: {deleted_count} 封")
+            counts['已读且不带附件的邮件'] = deleted_count
     else:
         print("\n未启用清理已读邮件功能，跳过此步骤")
     
@@ -91,7 +94,7 @@ def run_email_cleaner():
         print("\n=== 4. 发送通知邮件 ===")
         details_str = "; ".join(details)
         try:
-            cleaner.send_notification_email(total_deleted, details_str)
+            cleaner.send_notification_email(total_deleted, details_str, counts)
             print("通知邮件发送成功！")
         except Exception as e:
             print(f"通知邮件发送失败: {str(e)}")
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gmail 快速路径
+把清理规则编译为 X-GM-RAW 搜索语句（如 from:(a@b.com) older_than:3d -has:attachment is:read），
+由服务器完成全部筛选，不逐封获取邮件头；删除时按UID区间移动到垃圾箱，
+因为在 Gmail 中从收件箱 EXPUNGE 只是去掉“收件箱”标签，邮件仍保留在“所有邮件”中
+"""
+
+import re
+
+from uid_set import UidSet
+
+GMAIL_EXTENSION = 'X-GM-EXT-1'
+DEFAULT_TRASH = '"[Gmail]/Trash"'
+
+_LIST_RE = re.compile(rb'^\((?P<flags>[^)]*)\) (?:"(?:[^"\\]|\\.)*"|NIL) (?P<name>.+)$')
+
+
+def server_capabilities(mail):
+    """
+    登录后重新查询服务器能力
+
+    imaplib 只保存登录前的能力列表，Gmail 登录后才公布 MOVE 等扩展。
+    """
+    status, data = mail.capability()
+    if status == 'OK' and data and data[-1]:
+        return set(data[-1].decode('ascii', errors='ignore').upper().split())
+    return set(getattr(mail, 'capabilities', ()))
+
+
+def quote(text):
+    """转换为IMAP带引号字符串"""
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def build_query(sender=None, days_before_delete=0, read=None, has_attachment=None):
+    """
+    生成 X-GM-RAW 搜索语句
+
+    Args:
+        sender (str): 发件人地址或其一部分
+        days_before_delete (int): 只匹配几天前的邮件，0 表示不限
+        read (bool): True 只匹配已读，False 只匹配未读，None 不限
+        has_attachment (bool): True 只匹配带附件，False 只匹配不带附件，None 不限
+
+    Returns:
+        str: Gmail 搜索语句
+    """
+    terms = []
+    if sender:
+        terms.append(f"from:({sender})")
+    if days_before_delete > 0:
+        terms.append(f"older_than:{days_before_delete}d")
+    if read is not None:
+        terms.append('is:read' if read else 'is:unread')
+    if has_attachment is not None:
+        terms.append('has:attachment' if has_attachment else '-has:attachment')
+    return ' '.join(terms)
+
+
+def search_raw(mail, query):
+    """
+    在当前文件夹中执行 X-GM-RAW 搜索
+
+    Returns:
+        bytes: SEARCH 响应中的UID列表，没有结果时为 b''
+    """
+    try:
+        query.encode('ascii')
+        status, data = mail.uid('SEARCH', 'X-GM-RAW', quote(query))
+    except UnicodeEncodeError:
+        # 非ASCII搜索语句以 literal 发送
+        mail.literal = query.encode('utf-8')
+        status, data = mail.uid('SEARCH', 'CHARSET', 'UTF-8', 'X-GM-RAW')
+    if status != 'OK':
+        raise RuntimeError(f"X-GM-RAW 搜索失败: {query}")
+    return data[0] if data and data[0] else b''
+
+
+def find_trash_folder(mail):
+    """
+    按 \\Trash 特殊用途标志查找垃圾箱（界面语言不同时名称不同）
+
+    Returns:
+        str: 可直接用于命令参数的文件夹名，找不到时返回 "[Gmail]/Trash"
+    """
+    status, data = mail.list()
+    if status == 'OK':
+        for item in data:
+            if not isinstance(item, bytes):
+                continue
+            match = _LIST_RE.match(item)
+            if match and b'\\trash' in match.group('flags').lower().split():
+                name = match.group('name').decode('ascii', errors='ignore')
+                return name if name.startswith('"') else quote(name)
+    return DEFAULT_TRASH
+
+
+def move_to_trash(mail, uids, trash, can_move=True, logger=None, should_stop=None):
+    """
+    按UID区间把当前文件夹中的邮件移动到垃圾箱
+
+    服务器不支持 MOVE 时用 COPY 加删除标记代替，并在最后执行一次 EXPUNGE。
+
+    Args:
+        mail: 已选择文件夹的IMAP连接
+        uids (UidSet): 要移动的邮件
+        trash (str): find_trash_folder 返回的垃圾箱名称
+        can_move (bool): 服务器是否支持 MOVE
+        logger: 日志记录器
+        should_stop: 可选，返回 True 时不再移动剩余的区间
+
+    Returns:
+        int: 成功移动的邮件数量
+    """
+    moved = 0
+    for chunk in uids.chunks():
+        if should_stop is not None and should_stop():
+            if logger:
+                logger.warning(f"已到达运行时间上限，剩余 {len(uids) - moved} 封邮件留到下次移动")
+            break
+        try:
+            if can_move:
+                status, _ = mail.uid('MOVE', chunk, trash)
+            else:
+                status, _ = mail.uid('COPY', chunk, trash)
+                if status == 'OK':
+                    status, _ = mail.uid('STORE', chunk, '+FLAGS', '\\Deleted')
+            if status == 'OK':
+                moved += len(UidSet.parse(chunk))
+            elif logger:
+                logger.error(f"移动邮件到垃圾箱失败: {chunk}")
+        except Exception as e:
+            if logger:
+                logger.error(f"移动邮件到垃圾箱时出错: {str(e)}")
+    if not can_move and moved:
+        mail.expunge()
+    return moved
+
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+IMAP 连接复用
+进程内共享一个 SSLContext，并按 (服务器, 端口) 保存 TLS 会话用于会话恢复；
+DNS 解析结果按 TTL 缓存；可在正式处理前并行预先建立连接，
+多连接、多账号运行时不必每次都付出完整握手和域名解析的延迟；
+连接数和每条命令的耗时记入 metrics
+"""
+
+import ssl
+import time
+import socket
+import imaplib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+DNS_TTL = 300
+# 预先建立的连接在服务器断开未登录连接之前使用
+WARM_CONNECTION_TTL = 60
+
+_lock = threading.Lock()
+_ssl_context = None
+_sessions = {}
+_dns_cache = {}
+_warm_pool = {}
+
+logger = logging.getLogger(__name__)
+
+
+def get_ssl_context():
+    """进程内共享的 SSLContext，TLS 会话只能在创建它的 SSLContext 中恢复"""
+    global _ssl_context
+    with _lock:
+        if _ssl_context is None:
+            _ssl_context = ssl.create_default_context()
+        return _ssl_context
+
+
+def resolve(host, port):
+    """
+    解析服务器地址，结果缓存 DNS_TTL 秒
+
+    Returns:
+        list: getaddrinfo 返回的 (family, type, proto, canonname, sockaddr) 列表
+    """
+    key = (host, port)
+    now = time.monotonic()
+    with _lock:
+        cached = _dns_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+    addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    with _lock:
+        _dns_cache[key] = (now + DNS_TTL, addresses)
+    return addresses
+
+
+def open_tcp(host, port, timeout=None):
+    """按缓存的地址依次尝试建立TCP连接，全部失败时清除该服务器的DNS缓存"""
+    last_error = None
+    for family, socktype, proto, _, sockaddr in resolve(host, port):
+        sock = socket.socket(family, socktype, proto)
+        try:
+            if timeout is not None:
+                sock.settimeout(timeout)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as e:
+            last_error = e
+            sock.close()
+    with _lock:
+        _dns_cache.pop((host, port), None)
+    raise last_error or OSError(f"无法解析 {host}")
+
+
+class ResumableIMAP4_SSL(imaplib.IMAP4_SSL):
+    """使用共享 SSLContext、DNS 缓存和 TLS 会话恢复的 IMAP4_SSL"""
+
+    def __init__(self, host='', port=imaplib.IMAP4_SSL_PORT, timeout=None):
+        self.session_reused = False
+        self.counted = False
+        self.opened_at = time.monotonic()
+        super().__init__(host, port, ssl_context=get_ssl_context(), timeout=timeout)
+        # TLS 1.3 的会话票据在握手之后才发送，读取服务器问候后再保存
+        self.save_session()
+        metrics.connection_opened()
+        self.counted = True
+
+    def _create_socket(self, timeout):
+        sock = open_tcp(self.host, self.port, timeout)
+        with _lock:
+            session = _sessions.get((self.host, self.port))
+        try:
+            ssl_sock = self.ssl_context.wrap_socket(sock, server_hostname=self.host, session=session)
+        except Exception:
+            sock.close()
+            raise
+        self.session_reused = ssl_sock.session_reused
+        return ssl_sock
+
+    def save_session(self):
+        """保存当前TLS会话，供下一次连接同一服务器时恢复"""
+        session = getattr(self.sock, 'session', None)
+        if session is not None:
+            with _lock:
+                _sessions[(self.host, self.port)] = session
+
+    def _simple_command(self, name, *args):
+        # UID 命令按子命令分别统计，如 "UID FETCH"
+        label = f"UID {args[0].upper()}" if name == 'UID' and args else name
+        with metrics.command(label):
+            return super()._simple_command(name, *args)
+
+    def shutdown(self):
+        self.save_session()
+        if self.counted:
+            self.counted = False
+            metrics.connection_closed()
+        super().shutdown()
+
+
+def connect(host, port=imaplib.IMAP4_SSL_PORT, timeout=None):
+    """
+    获取一个已完成握手、尚未登录的连接
+
+    优先使用预先建立且未过期的连接，否则新建连接。
+    """
+    now = time.monotonic()
+    found = None
+    expired = []
+    with _lock:
+        pool = _warm_pool.get((host, port), [])
+        while pool:
+            conn = pool.pop()
+            if now - conn.opened_at < WARM_CONNECTION_TTL:
+                found = conn
+                break
+            expired.append(conn)
+    # 关闭连接时 save_session 要获取 _lock，必须在释放锁之后关闭
+    for conn in expired:
+        _close_quietly(conn)
+    if found is not None:
+        return found
+    return ResumableIMAP4_SSL(host, port, timeout)
+
+
+def _close_quietly(conn):
+    try:
+        conn.shutdown()
+    except Exception:
+        pass
+
+
+def prewarm(endpoints, connections=1, workers=8, timeout=30):
+    """
+    并行解析域名、完成TLS握手并把连接放入预热池
+
+    Args:
+        endpoints: (服务器, 端口) 序列，重复项只处理一次
+        connections (int): 每个服务器预先建立的连接数
+        workers (int): 并行线程数
+        timeout (float): 单个连接的超时秒数
+
+    Returns:
+        int: 成功建立的连接数
+    """
+    tasks = [endpoint for endpoint in dict.fromkeys(endpoints) for _ in range(connections)]
+    if not tasks:
+        return 0
+
+    def open_one(endpoint):
+        try:
+            return endpoint, ResumableIMAP4_SSL(endpoint[0], endpoint[1], timeout)
+        except Exception as e:
+            logger.warning(f"预先连接 {endpoint[0]}:{endpoint[1]} 失败: {str(e)}")
+            return endpoint, None
+
+    opened = 0
+    with ThreadPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+        for endpoint, conn in executor.map(open_one, tasks):
+            if conn is None:
+                continue
+            with _lock:
+                _warm_pool.setdefault(endpoint, []).append(conn)
+            opened += 1
+    logger.info(f"已预先建立 {opened}/{len(tasks)} 个IMAP连接")
+    return opened
+
+
+def close_warm_connections():
+    """关闭预热池中未被使用的连接"""
+    with _lock:
+        pools = list(_warm_pool.values())
+        _warm_pool.clear()
+    for pool in pools:
+        for conn in pool:
+            _close_quietly(conn)
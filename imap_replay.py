@@ -0,0 +1,676 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+录制与回放真实IMAP会话
+配置 record_transcript 后，connect_to_mailbox 建立的每个连接都会把收发的数据和时间
+匿名化后追加到会话记录（JSON Lines）中；回放服务器在本机按记录应答，延迟可按原样或按比例缩放，
+获取、搜索、删除路径的性能改动可以离线用生产邮箱的真实流量做对比测试
+
+匿名化保持每段数据的字节长度不变（字面量长度仍然有效）：邮件地址和邮件内容中的单词
+用只保存在本机 .key 文件中的密钥做 HMAC 替换，同一个词总是替换为同一个结果；
+非ASCII字节替换为 x；MIME 结构、IMAP 协议关键字、数字和文件夹名保持原样。
+客户端的 SEARCH/SORT 命令中，搜索关键字以外的搜索词（如 SUBJECT "invoice"、X-GM-RAW 语句中的词）
+同样替换。LOGIN 命令的用户名和密码不记录
+
+用法:
+    python imap_replay.py show imap_transcript.jsonl
+    python imap_replay.py serve imap_transcript.jsonl --port 1143 --latency-scale 1
+    python imap_replay.py bench imap_transcript.jsonl --config email_config.ini --latency-scale 0.5
+"""
+
+import os
+import re
+import hmac
+import json
+import time
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+
+from uid_set import UidSet
+
+TRANSCRIPT_VERSION = 1
+# 短于此时间的读取视为直接从缓冲区返回，不计为等待
+MIN_WAIT = 0.00002
+
+_ADDRESS_RE = rb'[A-Za-z0-9._%+=-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+'
+_ADDRESS_ONLY_RE = re.compile(_ADDRESS_RE)
+_CONTENT_RE = re.compile(rb'(?P<address>' + _ADDRESS_RE + rb')|(?P<word>[A-Za-z0-9]*[A-Za-z][A-Za-z0-9]*)'
+                         rb'|(?P<binary>[\x80-\xff]+)')
+_ALNUM_RE = re.compile(rb'[A-Za-z0-9]+')
+_QUOTED_RE = re.compile(rb'"(?:[^"\\]|\\.)*"')
+_LITERAL_RE = re.compile(rb'\{(\d+)\}\r\n$')
+_FETCH_LINE_RE = re.compile(rb'\* \d+ FETCH ')
+_LOGIN_RE = re.compile(rb'^(\S+ LOGIN) .*?(\r\n)?$', re.IGNORECASE | re.DOTALL)
+_UID_RE = re.compile(rb'UID (\d+)')
+_SEARCH_COMMAND_RE = re.compile(rb'^(\S+ (?:UID )?(?:SEARCH|SORT) )(.*)$', re.IGNORECASE | re.DOTALL)
+_SEARCH_TOKEN_RE = re.compile(rb'"(?:[^"\\]|\\.)*"|[^\s()"]+')
+_ALPHABET = b'abcdefghijklmnopqrstuvwxyz0123456789'
+
+# 匿名化时保留的词：邮件头字段名、MIME 类型和参数、编码、字符集、日期、IMAP 关键字
+KEEP_WORDS = frozenset(word.encode('ascii') for word in '''
+from to cc bcc subject date message id content type transfer encoding disposition description mime version
+reply sender received return path references in delivered x mailer priority list unsubscribe post
+auto submitted precedence importance organization user agent original recipient
+text plain html enriched rfc822 multipart mixed alternative related signed encrypted report digest parallel
+application octet stream pdf msword zip json xml vnd ms excel powerpoint openxmlformats officedocument
+wordprocessingml spreadsheetml presentationml document sheet image jpeg jpg png gif bmp tiff webp svg
+audio video mpeg mp4 ics calendar delivery status partial external body headers
+charset boundary name filename attachment inline format flowed delsp size creation modification read method
+base64 quoted printable 7bit 8bit binary uuencode
+utf us ascii gb2312 gbk gb18030 big5 hz iso jp kr cn windows koi8 shift jis euc latin
+mon tue wed thu fri sat sun jan feb mar apr may jun jul aug sep oct nov dec gmt utc ut est edt cst cdt pst pdt
+nil fetch uid flags size body bodystructure envelope internaldate header fields peek not seen answered
+flagged deleted draft recent
+'''.split())
+
+# 客户端 SEARCH/SORT 命令中保留的搜索关键字（整个参数）
+SEARCH_KEYS = frozenset(word.encode('ascii') for word in '''
+ALL ANSWERED BCC BEFORE BODY CC DELETED DRAFT FLAGGED FROM HEADER KEYWORD LARGER NEW NOT OLD ON OR RECENT
+SEEN SENTBEFORE SENTON SENTSINCE SINCE SMALLER SUBJECT TEXT TO UID UNANSWERED UNDELETED UNDRAFT UNFLAGGED
+UNKEYWORD UNSEEN CHARSET UTF-8 US-ASCII RETURN REVERSE ARRIVAL CC DATE DISPLAYFROM DISPLAYTO SIZE
+X-GM-RAW X-GM-MSGID X-GM-THRID X-GM-LABELS OLDER YOUNGER
+'''.split())
+
+# 搜索词中额外保留的词：Gmail 搜索语句（X-GM-RAW）的运算符
+SEARCH_KEEP_WORDS = KEEP_WORDS | frozenset(word.encode('ascii') for word in '''
+older newer than is has label in category unread starred important larger smaller filename or and
+'''.split())
+
+
+class Anonymizer:
+    """保持长度的确定性匿名化"""
+
+    def __init__(self, key):
+        self.key = key
+        self._cache = {}
+
+    def _hash(self, word):
+        """同长度的替换词，首字符与原词同为字母或数字"""
+        cached = self._cache.get(word)
+        if cached is not None:
+            return cached
+        out = bytearray()
+        counter = 0
+        while len(out) < len(word):
+            digest = hmac.new(self.key, word + bytes([counter]), hashlib.sha256).digest()
+            out += bytes(_ALPHABET[b % len(_ALPHABET)] for b in digest)
+            counter += 1
+        out = out[:len(word)]
+        if word[:1].isdigit() != bytes(out[:1]).isdigit():
+            out[0] = _ALPHABET[26 + out[0] % 10] if word[:1].isdigit() else _ALPHABET[out[0] % 26]
+        result = bytes(out)
+        self._cache[word] = result
+        return result
+
+    def address(self, address):
+        """邮件地址：本地部分和域名（顶级域名除外）逐段替换"""
+        local, _, domain = address.rpartition(b'@')
+        labels = domain.split(b'.')
+        local = _ALNUM_RE.sub(lambda m: self._hash(m.group().lower()), local)
+        labels[:-1] = [_ALNUM_RE.sub(lambda m: self._hash(m.group().lower()), label) for label in labels[:-1]]
+        return local + b'@' + b'.'.join(labels)
+
+    def addresses(self, data):
+        """只替换其中的邮件地址"""
+        return _ADDRESS_ONLY_RE.sub(lambda m: self.address(m.group()), data)
+
+    def content(self, data, keep=KEEP_WORDS):
+        """替换邮件地址、不在 keep 中的单词和非ASCII字节"""
+        def replace(match):
+            if match.group('address'):
+                return self.address(match.group())
+            word = match.group('word')
+            if word:
+                if len(word) == 1 or word.lower() in keep:
+                    return word
+                return self._hash(word)
+            return b'x' * len(match.group())
+        return _CONTENT_RE.sub(replace, data)
+
+    def fetch_line(self, line):
+        """FETCH 响应行只替换带引号的字符串（BODYSTRUCTURE 中的文件名、ENVELOPE 中的主题等）"""
+        return _QUOTED_RE.sub(lambda m: self.content(m.group()), line)
+
+    def search_arguments(self, data):
+        """SEARCH/SORT 的参数：保留搜索关键字，其余的搜索词（带引号或不带）按内容替换"""
+        def replace(match):
+            token = match.group()
+            if token.upper() in SEARCH_KEYS:
+                return token
+            return self.content(token, SEARCH_KEEP_WORDS)
+        return _SEARCH_TOKEN_RE.sub(replace, data)
+
+    def client(self, data):
+        """客户端命令：去掉登录凭据，替换搜索词，其他命令只替换邮件地址"""
+        match = _LOGIN_RE.match(data)
+        if match:
+            return match.group(1) + b' "user" "password"' + (match.group(2) or b'')
+        match = _SEARCH_COMMAND_RE.match(data)
+        if match:
+            return match.group(1) + self.search_arguments(match.group(2))
+        return self.addresses(data)
+
+
+def load_key(path):
+    """读取或创建记录文件对应的匿名化密钥（path.key，仅本人可读写，不要随记录文件分享）"""
+    key_path = path + '.key'
+    try:
+        with open(key_path, 'r') as f:
+            return bytes.fromhex(f.read().strip())
+    except FileNotFoundError:
+        key = os.urandom(32)
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(key.hex())
+        return key
+
+
+class TranscriptRecorder:
+    """把一个连接收发的数据匿名化后追加到记录文件"""
+
+    def __init__(self, path, server, senders=(), capabilities=()):
+        self.anonymizer = Anonymizer(load_key(path))
+        self.out = open(path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.literal = None
+        self.literal_remaining = 0
+        self.literal_wait = 0.0
+        self.in_fetch = False
+        self.search_literal = False
+        self.write({'session': {
+            'version': TRANSCRIPT_VERSION,
+            'server': server,
+            # imaplib 在开始录制之前已查询过服务器能力
+            'capabilities': list(capabilities),
+            'recorded': datetime.now().isoformat(timespec='seconds'),
+            # 回放测试时用匿名化后的发送人替换配置中的 target_senders
+            'senders': [self.anonymizer.address(sender.encode('utf-8')).decode('ascii', errors='replace')
+                        if '@' in sender else sender for sender in senders],
+        }})
+
+    def write(self, event):
+        with self.lock:
+            if self.out is not None:
+                self.out.write(json.dumps(event, ensure_ascii=True) + '\n')
+
+    def event(self, kind, data, wait=None):
+        event = {'t': round(time.perf_counter() - self.started, 6), kind: data.decode('latin-1')}
+        if wait is not None:
+            event['w'] = round(wait, 6) if wait >= MIN_WAIT else 0
+        self.write(event)
+
+    def client(self, data):
+        """记录客户端数据；SEARCH 命令以字面量发送的搜索词（例如 CHARSET UTF-8 的中文）同样替换"""
+        if self.search_literal:
+            scrubbed = self.anonymizer.search_arguments(data)
+        else:
+            scrubbed = self.anonymizer.client(data)
+        self.search_literal = bool(_LITERAL_RE.search(data)) and (
+            self.search_literal or _SEARCH_COMMAND_RE.match(data) is not None)
+        self.event('c', scrubbed)
+
+    def server(self, data, wait=0.0):
+        """
+        记录服务器数据：整行或字面量（字面量可能分多次读入，读完后一起记录）
+
+        Args:
+            data (bytes): 读到的数据
+            wait (float): 读取时阻塞等待的秒数，即服务器和网络的延迟，不含客户端处理数据的时间
+        """
+        if self.literal is not None:
+            self.literal += data
+            self.literal_remaining -= len(data)
+            self.literal_wait += wait
+            if self.literal_remaining <= 0:
+                literal, self.literal = bytes(self.literal), None
+                self.event('l', self.anonymizer.content(literal) if self.in_fetch else literal, self.literal_wait)
+            return
+        if _FETCH_LINE_RE.match(data):
+            self.in_fetch = True
+        self.event('s', self.anonymizer.fetch_line(data) if self.in_fetch else self.anonymizer.addresses(data), wait)
+        match = _LITERAL_RE.search(data)
+        if match and int(match.group(1)) > 0:
+            self.literal = bytearray()
+            self.literal_remaining = int(match.group(1))
+            self.literal_wait = 0.0
+        elif not match:
+            self.in_fetch = False
+
+    def close(self):
+        with self.lock:
+            if self.out is not None:
+                self.out.close()
+                self.out = None
+
+
+class _RecordingReader:
+    """包装 imaplib 连接的读取器，读到的数据交给记录器"""
+
+    def __init__(self, raw, recorder):
+        self._raw = raw
+        self._recorder = recorder
+
+    def readline(self, size=-1):
+        started = time.perf_counter()
+        data = self._raw.readline(size)
+        if data:
+            self._recorder.server(data, time.perf_counter() - started)
+        return data
+
+    def read(self, size=-1):
+        started = time.perf_counter()
+        data = self._raw.read(size)
+        if data:
+            self._recorder.server(data, time.perf_counter() - started)
+        return data
+
+    def readinto(self, buffer):
+        started = time.perf_counter()
+        count = self._raw.readinto(buffer)
+        if count:
+            self._recorder.server(bytes(memoryview(buffer)[:count]), time.perf_counter() - started)
+        return count
+
+    def close(self):
+        self._raw.close()
+        self._recorder.close()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+def start_recording(mail, path, server='', senders=()):
+    """
+    开始录制一个已建立、尚未登录的 imaplib 连接
+
+    Args:
+        mail: imaplib 连接
+        path (str): 记录文件，追加写入
+        server (str): 服务器地址，写入会话信息
+        senders: 配置中的目标发送人，匿名化后写入会话信息
+
+    Returns:
+        TranscriptRecorder: 连接关闭时自动关闭
+    """
+    recorder = TranscriptRecorder(path, server, senders, getattr(mail, 'capabilities', ()))
+    # 问候语在连接时已读取
+    recorder.event('s', recorder.anonymizer.addresses((mail.welcome or b'') + b'\r\n'), 0.0)
+    send = mail.send
+
+    def recording_send(data):
+        recorder.client(bytes(data))
+        return send(data)
+
+    mail.send = recording_send
+    mail.file = _RecordingReader(mail.file, recorder)
+    return recorder
+
+
+class Exchange:
+    """一条命令及其响应"""
+
+    __slots__ = ('command', 'responses')
+
+    def __init__(self, command):
+        self.command = command
+        # [(等待秒数, 数据)]，最后一个为带标签的完成响应（标签已去掉）
+        self.responses = []
+
+
+def _command_end(data):
+    """完整命令（含字面量）在 data 中的结束位置，不完整时返回 None"""
+    position = 0
+    while True:
+        end = data.find(b'\r\n', position)
+        if end < 0:
+            return None
+        match = _LITERAL_RE.search(data, position, end + 2)
+        if not match:
+            return end + 2
+        position = end + 2 + int(match.group(1))
+
+
+def _split_client(events):
+    """把客户端数据拆成去掉换行的命令行（字面量并入所在的命令）"""
+    commands = []
+    pending = b''
+    for data in events:
+        pending += data
+        while True:
+            end = _command_end(pending)
+            if end is None:
+                break
+            commands.append(pending[:end - 2])
+            pending = pending[end:]
+    return commands
+
+
+def _split_server(events):
+    """把服务器数据拆成响应：[(等待秒数, 数据)]，字面量并入所在的响应"""
+    responses = []
+    current = b''
+    wait = 0.0
+    for kind, data, event_wait in events:
+        current += data
+        wait += event_wait
+        if kind == 's' and not _LITERAL_RE.search(data):
+            responses.append((wait, current))
+            current = b''
+            wait = 0.0
+    return responses
+
+
+class Transcript:
+    """
+    加载后的会话记录
+
+    按 (文件夹, 命令) 保存完整的应答；UID FETCH 还按 (文件夹, 数据项, UID) 保存每封邮件的响应，
+    客户端分批方式改变后仍能拼出应答。
+    """
+
+    def __init__(self):
+        self.sessions = []
+        self.greeting = b'* OK IMAP4rev1 replay ready\r\n'
+        self.capabilities = ['IMAP4REV1']
+        self.exchanges = {}
+        self.messages = {}
+        # (文件夹, 数据项) -> [首个响应的等待秒数]，拼出的 FETCH 应答按平均值等待
+        self.first_waits = {}
+
+    @classmethod
+    def load(cls, path):
+        transcript = cls()
+        sessions = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if 'session' in event:
+                    sessions.append((event['session'], [], []))
+                    continue
+                if not sessions:
+                    raise ValueError(f"记录文件格式错误: {path}")
+                _, client, server = sessions[-1]
+                if 'c' in event:
+                    client.append(event['c'].encode('latin-1'))
+                else:
+                    kind = 's' if 's' in event else 'l'
+                    server.append((kind, event[kind].encode('latin-1'), event.get('w', 0.0)))
+        for info, client, server in sessions:
+            transcript.sessions.append(info)
+            transcript.capabilities = info.get('capabilities') or transcript.capabilities
+            transcript._index(client, server)
+        return transcript
+
+    def _index(self, client, server):
+        responses = _split_server(server)
+        if responses:
+            self.greeting = responses[0][1]
+            responses = responses[1:]
+        folder = b''
+        position = 0
+        for line in _split_client(client):
+            tag, _, command = line.partition(b' ')
+            if command.upper() == b'DONE' or not command:
+                continue
+            exchange = Exchange(command)
+            carried = 0.0
+            while position < len(responses):
+                wait, data = responses[position]
+                position += 1
+                if data.startswith(b'+'):
+                    # 回放服务器自己发送继续响应，等待时间计入下一个响应
+                    carried += wait
+                    continue
+                wait, carried = wait + carried, 0.0
+                if data.startswith(tag + b' '):
+                    exchange.responses.append((wait, data[len(tag) + 1:]))
+                    break
+                exchange.responses.append((wait, data))
+            if not exchange.responses or exchange.responses[-1][1].startswith(b'*'):
+                # 录制中断时最后一条命令没有完成响应
+                break
+            name, args = _command_name(command)
+            if name in (b'SELECT', b'EXAMINE'):
+                folder = args
+            self.exchanges.setdefault((folder, command), exchange)
+            if name == b'UID FETCH':
+                _, _, items = args.partition(b' ')
+                per_message = self.messages.setdefault((folder, items), {})
+                self.first_waits.setdefault((folder, items), []).append(exchange.responses[0][0])
+                for index, (wait, data) in enumerate(exchange.responses[:-1]):
+                    match = _FETCH_LINE_RE.match(data) and _UID_RE.search(data)
+                    if match:
+                        # 第一个响应的等待是整条命令的往返延迟，单独计入
+                        per_message.setdefault(int(match.group(1)), (wait if index else 0.0, data))
+
+    def respond(self, folder, command):
+        """
+        查找命令的应答
+
+        Returns:
+            list: [(等待秒数, 数据)]，最后一个为去掉标签的完成响应
+        """
+        exchange = self.exchanges.get((folder, command))
+        if exchange is not None:
+            return exchange.responses
+        name, args = _command_name(command)
+        if name == b'UID FETCH':
+            uids, _, items = args.partition(b' ')
+            per_message = self.messages.get((folder, items))
+            if per_message is not None:
+                try:
+                    wanted = UidSet.parse(uids.decode('ascii'))
+                except ValueError:
+                    wanted = UidSet()
+                found = [per_message[uid] for uid in sorted(per_message) if uid in wanted]
+                responses = found + [(0.0, b'OK FETCH completed (replay)\r\n')]
+                first_waits = self.first_waits[(folder, items)]
+                wait, data = responses[0]
+                responses[0] = (wait + sum(first_waits) / len(first_waits), data)
+                return responses
+        if name == b'CAPABILITY':
+            capabilities = ' '.join(self.capabilities).encode('ascii')
+            return [(0.0, b'* CAPABILITY ' + capabilities + b'\r\n'), (0.0, b'OK CAPABILITY completed\r\n')]
+        if name in (b'SEARCH', b'UID SEARCH'):
+            return [(0.0, b'* SEARCH\r\n'), (0.0, b'OK SEARCH completed (replay)\r\n')]
+        if name in (b'SELECT', b'EXAMINE'):
+            return [(0.0, b'* 0 EXISTS\r\n'), (0.0, b'OK [READ-WRITE] SELECT completed (replay)\r\n')]
+        return [(0.0, b'OK ' + name + b' completed (replay)\r\n')]
+
+
+def _command_name(command):
+    """(命令名, 参数)，UID 命令的名称包括子命令，如 b'UID FETCH'"""
+    parts = command.split(b' ', 2)
+    name = parts[0].upper()
+    if name == b'UID' and len(parts) > 1:
+        return b'UID ' + parts[1].upper(), parts[2] if len(parts) > 2 else b''
+    return name, command[len(parts[0]) + 1:]
+
+
+class ReplayServer:
+    """
+    在本机按会话记录应答的IMAP服务器（明文，不支持TLS）
+
+    不模拟邮箱状态：删除后再搜索仍返回记录中的结果；没有记录的命令返回 OK。
+    """
+
+    def __init__(self, transcript, latency_scale=1.0, host='127.0.0.1', port=0):
+        """
+        Args:
+            transcript (Transcript): 会话记录
+            latency_scale (float): 延迟倍数，1 为原样，0 不等待
+            host (str): 监听地址
+            port (int): 端口，0 表示由系统分配
+        """
+        import socketserver
+
+        self.transcript = transcript
+        self.latency_scale = latency_scale
+        self.commands = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server.serve_connection(self.rfile, self.request)
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self.server = Server((host, port), Handler)
+        self.address = self.server.server_address
+
+    def start(self):
+        """在后台线程中运行"""
+        threading.Thread(target=self.server.serve_forever, name='imap-replay', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def send(self, sock, responses, tag):
+        """按记录的延迟发送响应，小于1毫秒的延迟累积后再等待，减少系统调用"""
+        pending = []
+        due = 0.0
+        for index, (delay, data) in enumerate(responses):
+            due += delay * self.latency_scale
+            if due >= 0.001:
+                if pending:
+                    sock.sendall(b''.join(pending))
+                    pending = []
+                time.sleep(due)
+                due = 0.0
+            pending.append(tag + b' ' + data if index == len(responses) - 1 else data)
+        payload = b''.join(pending)
+        sock.sendall(payload)
+        with self.lock:
+            self.commands += 1
+            self.bytes_sent += sum(len(data) for _, data in responses)
+
+    def serve_connection(self, rfile, sock):
+        sock.sendall(self.transcript.greeting)
+        folder = b''
+        while True:
+            line = rfile.readline()
+            if not line:
+                return
+            # 客户端字面量：发送继续响应后读取
+            while True:
+                match = _LITERAL_RE.search(line)
+                if not match:
+                    break
+                sock.sendall(b'+ Ready\r\n')
+                line += rfile.read(int(match.group(1))) + rfile.readline()
+            tag, _, command = line.rstrip(b'\r\n').partition(b' ')
+            name, args = _command_name(command)
+            if name == b'LOGOUT':
+                sock.sendall(b'* BYE replay\r\n' + tag + b' OK LOGOUT completed\r\n')
+                return
+            if name == b'IDLE':
+                sock.sendall(b'+ idling\r\n')
+                if not rfile.readline():
+                    return
+                sock.sendall(tag + b' OK IDLE terminated\r\n')
+                continue
+            if name == b'LOGIN':
+                command = b'LOGIN "user" "password"'
+            elif name in (b'SELECT', b'EXAMINE'):
+                folder = args
+            self.send(sock, self.transcript.respond(folder, command), tag)
+
+
+def run_bench(transcript, config_file, latency_scale):
+    """
+    用回放服务器执行一次发送人清理和（已配置时）已读且不带附件规则，输出各步骤耗时
+
+    目标发送人使用记录中匿名化后的地址；不生成删除计划、不归档、不发送通知。
+    """
+    import imaplib
+    from clear_qq_email import QQEmailCleaner
+
+    server = ReplayServer(transcript, latency_scale).start()
+    host, port = server.address
+    cleaner = QQEmailCleaner(config_file)
+    config = cleaner.config['EMAIL']
+    senders = [sender for info in transcript.sessions for sender in info.get('senders', [])]
+    config['target_senders'] = ','.join(dict.fromkeys(senders))
+    config['plan_file'] = ''
+    config['archive_before_delete'] = 'False'
+    config['send_notification'] = 'False'
+    config['record_transcript'] = ''
+    cleaner.imap_factory = lambda *endpoint: imaplib.IMAP4(host, port)
+    dry_run = config.getboolean('dry_run', True)
+    days_before_delete = int(config.get('days_before_delete', 3))
+
+    results = []
+
+    def step(name, run):
+        commands, sent = server.commands, server.bytes_sent
+        started = time.perf_counter()
+        count = run()
+        results.append((name, time.perf_counter() - started, count,
+                        server.commands - commands, server.bytes_sent - sent))
+
+    try:
+        if not cleaner.connect_to_mailbox():
+            raise RuntimeError("无法连接回放服务器")
+        step('清理目标发送人', lambda: sum(cleaner.clean_target_senders(
+            cleaner.get_target_senders(), dry_run, days_before_delete).values()))
+        cleaner.disconnect()
+        if config.getboolean('clean_read_no_attachment', False):
+            step('清理已读且不带附件的邮件', cleaner.clean_read_no_attachment_emails)
+    finally:
+        cleaner.disconnect()
+        server.stop()
+
+    print(f"回放 {len(transcript.sessions)} 个会话，延迟倍数 {latency_scale}")
+    for name, seconds, count, commands, sent in results:
+        print(f"{name}: {seconds:.3f} 秒，处理 {count} 封，{commands} 条命令，接收 {sent / 1024:.1f} KB")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='录制的IMAP会话回放')
+    parser.add_argument('action', choices=['show', 'serve', 'bench'], help='查看记录、启动回放服务器或回放测试')
+    parser.add_argument('transcript', help='record_transcript 生成的记录文件')
+    parser.add_argument('--config', default='email_config.ini', help='bench 使用的配置文件')
+    parser.add_argument('--host', default='127.0.0.1', help='serve 监听地址')
+    parser.add_argument('--port', type=int, default=1143, help='serve 监听端口')
+    parser.add_argument('--latency-scale', type=float, default=1.0, help='延迟倍数，1 为原样，0 不等待')
+    args = parser.parse_args()
+
+    transcript = Transcript.load(args.transcript)
+    if args.action == 'show':
+        for info in transcript.sessions:
+            print(f"{info.get('recorded', '')} {info.get('server', '')} 发送人: {', '.join(info.get('senders', []))}")
+        names = {}
+        for (_, command), exchange in transcript.exchanges.items():
+            name = _command_name(command)[0].decode('ascii', errors='replace')
+            entry = names.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += sum(delay for delay, _ in exchange.responses)
+        for name, (count, seconds) in sorted(names.items()):
+            print(f"{name}: {count} 条不同的命令，平均 {seconds / count * 1000:.1f} 毫秒")
+    elif args.action == 'serve':
+        server = ReplayServer(transcript, args.latency_scale, args.host, args.port)
+        print(f"回放服务器已启动: {server.address[0]}:{server.address[1]}（明文IMAP），Ctrl+C 退出")
+        try:
+            server.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server.server_close()
+    else:
+        run_bench(transcript, args.config, args.latency_scale)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式读取 UID FETCH 响应
+imaplib 要等整个命令完成才返回，所有邮件的字面量都以独立的 bytes 留在内存中；
+这里直接从连接的缓冲读取器逐行读取，字面量用 readinto 读入可复用的缓冲区，
+每封邮件的响应一读完就以 memoryview 交给调用方，内存占用与批次大小无关
+"""
+
+import re
+import imaplib
+
+import metrics
+
+_LITERAL_RE = re.compile(rb'\{(\d+)\}\r\n$')
+_FETCH_RE = re.compile(rb'\* (\d+) FETCH ')
+
+
+class FetchError(Exception):
+    """FETCH 命令失败"""
+
+
+class FetchBuffer:
+    """
+    可复用的字面量缓冲区
+
+    空间不足时换成更大的 bytearray（不在原对象上扩容，已导出的 memoryview 仍然有效），
+    之后一直复用，不再为每个字面量分配新的 bytes。
+    """
+
+    __slots__ = ('data', 'used')
+
+    def __init__(self, size=1 << 20):
+        self.data = bytearray(size)
+        self.used = 0
+
+    def reset(self):
+        self.used = 0
+
+    def read_literal(self, reader, length):
+        """
+        从读取器读入一个字面量
+
+        Returns:
+            tuple: (起始偏移, 长度)，邮件读完后用 view() 取出
+        """
+        end = self.used + length
+        if end > len(self.data):
+            data = bytearray(max(end, len(self.data) * 2))
+            data[:self.used] = memoryview(self.data)[:self.used]
+            self.data = data
+        view = memoryview(self.data)
+        position = self.used
+        while position < end:
+            count = reader.readinto(view[position:end])
+            if not count:
+                raise imaplib.IMAP4.abort('读取字面量时连接已关闭')
+            position += count
+        start, self.used = self.used, end
+        return start, length
+
+    def view(self, start, length):
+        return memoryview(self.data)[start:start + length]
+
+
+def can_stream(mail):
+    """连接是否为可直接读取的 imaplib 连接（测试用的模拟连接等走普通路径）"""
+    return isinstance(mail, imaplib.IMAP4) and getattr(mail, 'file', None) is not None
+
+
+def _read_response(mail, buffer):
+    """
+    读取一条完整的响应（含其中的全部字面量）
+
+    Returns:
+        tuple: (去掉换行的各行拼接, [(偏移, 长度), ...])
+    """
+    parts = []
+    literals = []
+    while True:
+        line = mail.file.readline(imaplib._MAXLINE + 1)
+        if not line:
+            raise imaplib.IMAP4.abort('读取响应时连接已关闭')
+        if len(line) > imaplib._MAXLINE:
+            raise imaplib.IMAP4.error(f"响应行过长（超过 {imaplib._MAXLINE} 字节）")
+        match = _LITERAL_RE.search(line)
+        parts.append(line[:-2] if line.endswith(b'\r\n') else line)
+        if not match:
+            return b''.join(parts), literals
+        literals.append(buffer.read_literal(mail.file, int(match.group(1))))
+
+
+def iter_uid_fetch(mail, uids, items, buffer=None):
+    """
+    执行 UID FETCH，逐封返回响应
+
+    产出格式与 mail_records.iter_fetch_responses 相同；流式读取时字面量为 memoryview，
+    只在处理下一封邮件之前有效，需要保留时请自行复制。调用方中途停止迭代时，
+    剩余的响应会被读完丢弃，连接状态保持一致。
+
+    Args:
+        mail: 已选择文件夹的IMAP连接
+        uids (str): IMAP序列集，如 "1:500,700"
+        items (str): FETCH数据项
+        buffer (FetchBuffer): 可复用的缓冲区，默认新建
+
+    Yields:
+        tuple: (元数据 bytes, 字面量列表)
+
+    Raises:
+        FetchError: 服务器返回 NO 或 BAD
+    """
+    if not can_stream(mail):
+        status, data = mail.uid('FETCH', uids, items)
+        if status != 'OK':
+            raise FetchError(f"获取邮件失败: {uids}")
+        from mail_records import iter_fetch_responses
+        yield from iter_fetch_responses(data or [])
+        return
+
+    buffer = buffer or FetchBuffer()
+    tag = mail._new_tag()
+    token = metrics.current().command_started('UID FETCH')
+    mail.send(b'%s UID FETCH %s %s\r\n' % (tag, uids.encode('ascii'), items.encode('ascii')))
+    done = False
+    try:
+        while True:
+            buffer.reset()
+            response, literals = _read_response(mail, buffer)
+            if response.startswith(tag + b' '):
+                done = True
+                mail.tagged_commands.pop(tag, None)
+                status = response[len(tag) + 1:].split(b' ', 1)[0]
+                if status != b'OK':
+                    raise FetchError(f"获取邮件失败: {response.decode('utf-8', errors='replace')}")
+                return
+            # 与 imaplib 一致，元数据去掉 "* " 和 "FETCH "；其他未标记响应（EXISTS 等）丢弃
+            match = _FETCH_RE.match(response)
+            if match:
+                meta = match.group(1) + b' ' + response[match.end():]
+                yield meta, [buffer.view(start, length) for start, length in literals]
+    except GeneratorExit:
+        if not done:
+            # 调用方提前结束时读完剩余响应，保证下一条命令能正常读取
+            buffer.reset()
+            while not _read_response(mail, buffer)[0].startswith(tag + b' '):
+                buffer.reset()
+            mail.tagged_commands.pop(tag, None)
+        raise
+    finally:
+        # 从发送命令到读完标记响应的时间，包括调用方处理每封邮件的时间
+        metrics.current().command_finished(token)
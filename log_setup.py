@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志配置
+日志记录先进入内存队列，由后台线程写入按大小轮转的日志文件和控制台，
+调用方线程只做入队操作
+"""
+
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener = None
+_queue_handler = None
+_lock = threading.Lock()
+
+
+class TextFormatter(logging.Formatter):
+    """文本格式，结构化字段以紧凑JSON附加在消息之后"""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record):
+        text = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            text += ' ' + json.dumps(fields, ensure_ascii=False, separators=(',', ':'), default=str)
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """JSON Lines 格式，每条日志一行JSON"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'msg': record.getMessage()
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+class LocalQueueHandler(QueueHandler):
+    """
+    进程内队列的入队处理器
+
+    记录不需要序列化：只合并消息和参数，异常堆栈格式化为 exc_text 单独保留，
+    由写日志的格式化器决定写法（文本格式附在消息之后，JSON 格式写入 exc 字段）。
+    默认的 QueueHandler.prepare 会把堆栈并入消息并清除 exc_info。
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+            # 不在队列中保留 traceback 引用的栈帧
+            record.exc_info = None
+        return record
+
+
+_exception_formatter = logging.Formatter()
+
+
+def config_options(section):
+    """
+    配置 [EMAIL] 段中的日志设置
+
+    Returns:
+        dict: setup_logging 的 log_format、max_bytes、backup_count 参数
+    """
+    return {
+        'log_format': section.get('log_format', 'text'),
+        'max_bytes': section.getint('log_max_bytes', 10 * 1024 * 1024),
+        'backup_count': section.getint('log_backup_count', 5),
+    }
+
+
+def config_file_options(config_file):
+    """
+    在清理器读取配置之前，从配置文件中读取日志设置
+
+    cron 和常驻进程先配置日志再创建清理器，清理器之后的 setup_logging 调用不再生效。
+
+    Returns:
+        dict: setup_logging 的参数，文件不存在或无法解析时为空（使用默认设置）
+    """
+    import configparser
+    from config_cache import load_cached_config
+    try:
+        if os.path.exists(config_file):
+            config = load_cached_config(config_file)
+            if config.has_section('EMAIL'):
+                return config_options(config['EMAIL'])
+    except (OSError, ValueError, configparser.Error) as e:
+        print(f"读取日志设置失败，使用默认设置: {str(e)}", file=sys.stderr)
+    return {}
+
+
+def log_event(logger, message, level=logging.INFO, **fields):
+    """
+    记录一条结构化日志
+
+    字段在后台写日志的线程中序列化，未启用对应级别时不产生任何开销。
+
+    Args:
+        logger: 日志记录器
+        message (str): 日志消息
+        level (int): 日志级别
+        **fields: 结构化字段
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={'fields': fields})
+
+
+def setup_logging(log_file, level=logging.INFO, log_format='text', max_bytes=10 * 1024 * 1024,
+                  backup_count=5, stream=None):
+    """
+    配置根日志记录器
+
+    同一进程内只配置一次，之后的调用直接返回，不会重复添加处理器。
+
+    Args:
+        log_file (str): 日志文件路径
+        level (int): 日志级别
+        log_format (str): 'text' 或 'json'（JSON Lines）
+        max_bytes (int): 单个日志文件的最大字节数，超过后轮转
+        backup_count (int): 保留的轮转文件数量
+        stream: 控制台输出流，默认 sys.stderr
+
+    Returns:
+        logging.Logger: 根日志记录器
+    """
+    global _listener, _queue_handler
+    root = logging.getLogger()
+    with _lock:
+        if _listener is not None:
+            return root
+
+        formatter = JsonFormatter() if log_format == 'json' else TextFormatter()
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        file_handler.setFormatter(formatter)
+        stream_handler = logging.StreamHandler(stream or sys.stderr)
+        stream_handler.setFormatter(TextFormatter())
+
+        log_queue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+        _queue_handler = LocalQueueHandler(log_queue)
+        root.addHandler(_queue_handler)
+        root.setLevel(level)
+    return root
+
+
+def shutdown_logging():
+    """写完队列中剩余的日志并停止后台线程"""
+    global _listener, _queue_handler
+    with _lock:
+        listener, _listener = _listener, None
+        handler, _queue_handler = _queue_handler, None
+    if handler is not None:
+        logging.getLogger().removeHandler(handler)
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+邮件元数据的紧凑表示
+MailRecord 为单封邮件的 __slots__ 记录，MailBatch 为按列存储的批量邮件
+"""
+
+import re
+import sys
+import time
+from array import array
+from datetime import datetime
+
+from uid_set import UidSet
+
+# 邮件标志位
+FLAG_SEEN = 1
+FLAG_ANSWERED = 2
+FLAG_FLAGGED = 4
+FLAG_DELETED = 8
+FLAG_DRAFT = 16
+FLAG_RECENT = 32
+
+_FLAG_BITS = {
+    b'\\seen': FLAG_SEEN,
+    b'\\answered': FLAG_ANSWERED,
+    b'\\flagged': FLAG_FLAGGED,
+    b'\\deleted': FLAG_DELETED,
+    b'\\draft': FLAG_DRAFT,
+    b'\\recent': FLAG_RECENT,
+}
+
+# 无法确定邮件日期时使用的时间戳
+UNKNOWN_TIMESTAMP = -1
+
+# 批量获取邮件元数据时使用的FETCH数据项（只取邮件头，不下载正文和附件）
+HEADER_FETCH_ITEMS = '(UID FLAGS RFC822.SIZE INTERNALDATE BODY.PEEK[HEADER.FIELDS (FROM SUBJECT DATE)])'
+
+_UID_RE = re.compile(rb'UID (\d+)')
+_SIZE_RE = re.compile(rb'RFC822\.SIZE (\d+)')
+_FLAGS_RE = re.compile(rb'FLAGS \(([^)]*)\)')
+_INTERNALDATE_RE = re.compile(rb'INTERNALDATE "[^"]+"')
+_FETCH_START_RE = re.compile(rb'\d+ \(')
+
+# email 包的导入耗时较长，第一次解析邮件头时才创建
+_header_parser = None
+
+
+def _get_header_parser():
+    global _header_parser
+    if _header_parser is None:
+        from email.parser import HeaderParser
+        _header_parser = HeaderParser()
+    return _header_parser
+
+
+def parse_flags(flags_bytes):
+    """将FLAGS数据项转换为标志位掩码"""
+    mask = 0
+    for flag in flags_bytes.lower().split():
+        mask |= _FLAG_BITS.get(flag, 0)
+    return mask
+
+
+def decode_mime_header(value):
+    """解码MIME编码的邮件头"""
+    if not value:
+        return ''
+    from email.header import decode_header, make_header
+    try:
+        return str(make_header(decode_header(value)))
+    except Exception:
+        text, charset = decode_header(value)[0]
+        if isinstance(text, bytes):
+            return text.decode(charset or 'utf-8', errors='ignore')
+        return text
+
+
+def parse_date_header(value):
+    """将Date邮件头解析为Unix时间戳，失败时返回 UNKNOWN_TIMESTAMP"""
+    if not value:
+        return UNKNOWN_TIMESTAMP
+    from email.utils import parsedate_to_datetime
+    try:
+        return int(parsedate_to_datetime(value).timestamp())
+    except Exception:
+        return UNKNOWN_TIMESTAMP
+
+
+def iter_fetch_responses(data):
+    """
+    将imaplib的FETCH返回数据按邮件拆分
+
+    imaplib 把带字面量的响应拆成 (前缀, 字面量) 元组，字面量之后的
+    数据项（例如部分服务器在正文之后返回的 FLAGS）以单独的 bytes 出现。
+    每封邮件的响应都以 "<序号> (" 开头，据此划分边界。
+
+    Yields:
+        tuple: (拼接后的元数据 bytes, 字面量 bytes 列表)
+    """
+    meta = None
+    literals = []
+    for item in data:
+        if isinstance(item, tuple):
+            head, literal = item[0], item[1]
+        elif isinstance(item, bytes):
+            head, literal = item, None
+        else:
+            continue
+        if _FETCH_START_RE.match(head):
+            if meta is not None:
+                yield meta, literals
+            meta, literals = head, []
+        elif meta is None:
+            continue
+        else:
+            meta += head
+        if literal is not None:
+            literals.append(literal)
+    if meta is not None:
+        yield meta, literals
+
+
+class MailRecord:
+    """单封邮件的元数据记录"""
+
+    __slots__ = ('uid', 'sender', 'subject', 'timestamp', 'size', 'flags')
+
+    def __init__(self, uid, sender='', subject='', timestamp=UNKNOWN_TIMESTAMP, size=0, flags=0):
+        self.uid = uid
+        self.sender = sender
+        self.subject = subject
+        self.timestamp = timestamp
+        self.size = size
+        self.flags = flags
+
+    def has_flag(self, flag):
+        """是否带有指定标志位"""
+        return bool(self.flags & flag)
+
+    @property
+    def date(self):
+        """格式化后的邮件日期，用于日志输出"""
+        if self.timestamp == UNKNOWN_TIMESTAMP:
+            return '未知'
+        return datetime.fromtimestamp(self.timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+    def __repr__(self):
+        return f"MailRecord(uid={self.uid}, sender={self.sender!r}, date={self.date})"
+
+
+class MailBatch:
+    """
+    按列存储的一批邮件元数据
+
+    UID、时间戳、大小和标志位分别存放在 array 中，发件人地址经过 intern，
+    相同发件人只保留一份字符串。筛选操作返回新的 MailBatch。
+    """
+
+    __slots__ = ('uids', 'timestamps', 'sizes', 'flags', 'senders', 'subjects')
+
+    def __init__(self):
+        self.uids = array('I')
+        self.timestamps = array('q')
+        self.sizes = array('Q')
+        self.flags = array('B')
+        self.senders = []
+        self.subjects = []
+
+    def __len__(self):
+        return len(self.uids)
+
+    def __iter__(self):
+        for i in range(len(self.uids)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        return MailRecord(
+            self.uids[index],
+            self.senders[index],
+            self.subjects[index],
+            self.timestamps[index],
+            self.sizes[index],
+            self.flags[index]
+        )
+
+    def __repr__(self):
+        return f"MailBatch({len(self)} 封)"
+
+    def append(self, uid, sender='', subject='', timestamp=UNKNOWN_TIMESTAMP, size=0, flags=0):
+        """追加一封邮件"""
+        self.uids.append(uid)
+        self.timestamps.append(timestamp)
+        self.sizes.append(size)
+        self.flags.append(flags)
+        self.senders.append(sys.intern(sender))
+        self.subjects.append(subject)
+
+    def extend(self, other):
+        """追加另一个批次的全部邮件"""
+        self.uids.extend(other.uids)
+        self.timestamps.extend(other.timestamps)
+        self.sizes.extend(other.sizes)
+        self.flags.extend(other.flags)
+        self.senders.extend(other.senders)
+        self.subjects.extend(other.subjects)
+
+    def take(self, indices):
+        """按下标选取邮件，返回新的批次"""
+        batch = MailBatch()
+        batch.uids = array('I', [self.uids[i] for i in indices])
+        batch.timestamps = array('q', [self.timestamps[i] for i in indices])
+        batch.sizes = array('Q', [self.sizes[i] for i in indices])
+        batch.flags = array('B', [self.flags[i] for i in indices])
+        batch.senders = [self.senders[i] for i in indices]
+        batch.subjects = [self.subjects[i] for i in indices]
+        return batch
+
+    def older_than(self, cutoff):
+        """选取日期不晚于 cutoff（Unix时间戳）的邮件，日期未知的邮件不会被选中"""
+        return self.take([i for i, ts in enumerate(self.timestamps) if 0 <= ts <= cutoff])
+
+    def newer_than(self, cutoff):
+        """选取日期晚于 cutoff 或日期未知的邮件，即 older_than 的补集"""
+        return self.take([i for i, ts in enumerate(self.timestamps) if ts < 0 or ts > cutoff])
+
+    def with_flags(self, mask):
+        """选取带有全部指定标志位的邮件"""
+        return self.take([i for i, f in enumerate(self.flags) if f & mask == mask])
+
+    def without_flags(self, mask):
+        """选取不带任何指定标志位的邮件"""
+        return self.take([i for i, f in enumerate(self.flags) if not f & mask])
+
+    def uid_set(self):
+        """批次内邮件的UID集合"""
+        return UidSet(self.uids)
+
+    def total_size(self):
+        """批次内邮件的总字节数"""
+        return sum(self.sizes)
+
+    @classmethod
+    def from_fetch_response(cls, data):
+        """
+        从 HEADER_FETCH_ITEMS 的FETCH响应构建批次
+
+        Args:
+            data: imaplib fetch/uid('FETCH') 返回的数据列表
+        """
+        batch = cls()
+        batch.add_fetch_response(data)
+        return batch
+
+    def add_fetch_response(self, data):
+        """解析FETCH响应并追加到当前批次"""
+        for meta, literals in iter_fetch_responses(data or []):
+            self.add_fetch_record(meta, literals)
+
+    def add_fetch_record(self, meta, literals):
+        """
+        解析单封邮件的FETCH响应并追加到当前批次
+
+        Args:
+            meta (bytes): 元数据
+            literals: 字面量列表，元素为 bytes 或 imap_stream 产出的 memoryview
+        """
+        uid_match = _UID_RE.search(meta)
+        if not uid_match:
+            return
+        size_match = _SIZE_RE.search(meta)
+        flags_match = _FLAGS_RE.search(meta)
+
+        sender = ''
+        subject = ''
+        timestamp = UNKNOWN_TIMESTAMP
+        if literals:
+            from email.utils import parseaddr
+            # 与 BytesHeaderParser 相同的解码方式，memoryview 无需先复制为 bytes
+            headers = _get_header_parser().parsestr(str(literals[0], 'ascii', 'surrogateescape'))
+            sender = parseaddr(str(headers['from'] or ''))[1].lower()
+            subject = decode_mime_header(headers['subject'])
+            timestamp = parse_date_header(headers['date'])
+        if timestamp == UNKNOWN_TIMESTAMP:
+            # Date头缺失或无法解析时，以服务器接收时间为准
+            internal = _INTERNALDATE_RE.search(meta)
+            if internal:
+                import imaplib
+                parsed = imaplib.Internaldate2tuple(internal.group(0))
+                if parsed:
+                    timestamp = int(time.mktime(parsed))
+
+        self.append(
+            int(uid_match.group(1)),
+            sender,
+            subject,
+            timestamp,
+            int(size_match.group(1)) if size_match else 0,
+            parse_flags(flags_match.group(1)) if flags_match else 0
+        )
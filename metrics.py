@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行进度与性能指标
+清理过程中累计扫描、匹配、删除的邮件数，打开的IMAP连接数和各IMAP命令的耗时；
+配置了 metrics_port 时在后台线程用 http.server 提供 /status（JSON）和
+/metrics（Prometheus 文本格式），长时间运行时可以实时查看进度、速率、预计剩余时间，
+并通过正在执行的命令已等待的时间发现卡住的连接
+"""
+
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+# 计算速率的时间窗口（秒）
+RATE_WINDOW = 60
+# 每个命令保留最近多少次耗时用于计算分位数
+LATENCY_SAMPLES = 1024
+QUANTILES = (0.5, 0.9, 0.99)
+
+logger = logging.getLogger(__name__)
+
+
+class CommandStats:
+    """单个IMAP命令的耗时统计"""
+
+    __slots__ = ('count', 'total', 'recent')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=LATENCY_SAMPLES)
+
+    def quantiles(self):
+        """最近 LATENCY_SAMPLES 次耗时的分位数"""
+        ordered = sorted(self.recent)
+        if not ordered:
+            return {}
+        return {q: ordered[min(int(q * len(ordered)), len(ordered) - 1)] for q in QUANTILES}
+
+
+class RunMetrics:
+    """进程内的运行指标，各记录方法线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.stage = ''
+        self.stage_started = self.started
+        self.scanned = 0
+        self.matched = 0
+        self.deleted = 0
+        self.expected = 0
+        self.open_connections = 0
+        self.commands = {}
+        self._inflight = {}
+        self._next_token = 0
+        # (时间, 扫描数, 删除数)，每秒最多一个样本
+        self._samples = deque([(time.monotonic(), 0, 0)])
+
+    def set_stage(self, name):
+        with self._lock:
+            self.stage = name
+            self.stage_started = time.time()
+
+    def set_expected(self, count):
+        """设置预计要扫描的邮件总数，用于计算预计剩余时间"""
+        with self._lock:
+            self.expected = count
+
+    def add(self, scanned=0, matched=0, deleted=0):
+        with self._lock:
+            self.scanned += scanned
+            self.matched += matched
+            self.deleted += deleted
+            self._sample(time.monotonic())
+
+    def connection_opened(self):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self):
+        with self._lock:
+            self.open_connections -= 1
+
+    def command_started(self, name):
+        """
+        记录命令开始
+
+        Returns:
+            int: 传给 command_finished 的标识
+        """
+        with self._lock:
+            self._next_token += 1
+            self._inflight[self._next_token] = (name, time.monotonic())
+            return self._next_token
+
+    def command_finished(self, token):
+        with self._lock:
+            name, started = self._inflight.pop(token)
+            elapsed = time.monotonic() - started
+            stats = self.commands.get(name)
+            if stats is None:
+                stats = self.commands[name] = CommandStats()
+            stats.count += 1
+            stats.total += elapsed
+            stats.recent.append(elapsed)
+
+    def _sample(self, now):
+        if now - self._samples[-1][0] >= 1:
+            self._samples.append((now, self.scanned, self.deleted))
+        while len(self._samples) > 1 and now - self._samples[1][0] >= RATE_WINDOW:
+            self._samples.popleft()
+
+    def snapshot(self):
+        """
+        当前指标
+
+        Returns:
+            dict: 可直接序列化为JSON的指标
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._sample(now)
+            first_time, first_scanned, first_deleted = self._samples[0]
+            span = now - first_time
+            scan_rate = (self.scanned - first_scanned) / span if span > 0 else 0.0
+            delete_rate = (self.deleted - first_deleted) / span if span > 0 else 0.0
+            remaining = max(self.expected - self.scanned, 0)
+            eta = remaining / scan_rate if remaining and scan_rate > 0 else None
+            inflight = sorted(((name, now - started) for name, started in self._inflight.values()),
+                              key=lambda item: item[1], reverse=True)
+            commands = {name: {'count': stats.count, 'total_seconds': stats.total,
+                               'quantiles': stats.quantiles()}
+                        for name, stats in self.commands.items()}
+            return {
+                'uptime_seconds': time.time() - self.started,
+                'stage': self.stage,
+                'stage_seconds': time.time() - self.stage_started,
+                'messages': {'scanned': self.scanned, 'matched': self.matched, 'deleted': self.deleted},
+                'expected': self.expected,
+                'rate_per_second': {'scanned': scan_rate, 'deleted': delete_rate},
+                'eta_seconds': eta,
+                'open_connections': self.open_connections,
+                'inflight_commands': [{'command': name, 'seconds': seconds} for name, seconds in inflight],
+                'commands': commands,
+            }
+
+
+_metrics = RunMetrics()
+
+
+def current():
+    """进程内共享的 RunMetrics"""
+    return _metrics
+
+
+def set_stage(name):
+    _metrics.set_stage(name)
+
+
+def set_expected(count):
+    _metrics.set_expected(count)
+
+
+def add(scanned=0, matched=0, deleted=0):
+    _metrics.add(scanned, matched, deleted)
+
+
+def connection_opened():
+    _metrics.connection_opened()
+
+
+def connection_closed():
+    _metrics.connection_closed()
+
+
+class command:
+    """记录一条IMAP命令耗时的上下文管理器"""
+
+    __slots__ = ('name', 'token')
+
+    def __init__(self, name):
+        self.name = name
+        self.token = None
+
+    def __enter__(self):
+        self.token = _metrics.command_started(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        _metrics.command_finished(self.token)
+        return False
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def to_prometheus(snapshot):
+    """把 snapshot() 的结果转换为 Prometheus 文本格式"""
+    lines = []
+
+    def metric(name, metric_type, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in samples:
+            label_text = ','.join(f'{key}="{_escape_label(val)}"' for key, val in labels)
+            lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if label_text
+                         else f"{name} {_format_value(value)}")
+
+    metric('email_cleaner_uptime_seconds', 'gauge', '运行时间',
+           [((), snapshot['uptime_seconds'])])
+    metric('email_cleaner_stage_seconds', 'gauge', '当前阶段已执行的时间',
+           [((('stage', snapshot['stage']),), snapshot['stage_seconds'])])
+    metric('email_cleaner_messages_total', 'counter', '扫描、匹配、删除的邮件数',
+           [((('state', state),), count) for state, count in snapshot['messages'].items()])
+    metric('email_cleaner_messages_expected', 'gauge', '预计要扫描的邮件数',
+           [((), snapshot['expected'])])
+    metric('email_cleaner_messages_per_second', 'gauge', f'最近{RATE_WINDOW}秒的处理速率',
+           [((('state', state),), rate) for state, rate in snapshot['rate_per_second'].items()])
+    if snapshot['eta_seconds'] is not None:
+        metric('email_cleaner_eta_seconds', 'gauge', '预计剩余时间',
+               [((), snapshot['eta_seconds'])])
+    metric('email_cleaner_open_connections', 'gauge', '打开的IMAP连接数',
+           [((), snapshot['open_connections'])])
+    inflight = {}
+    for item in snapshot['inflight_commands']:
+        inflight[item['command']] = max(inflight.get(item['command'], 0.0), item['seconds'])
+    metric('email_cleaner_inflight_command_seconds', 'gauge', '正在执行的命令已等待的最长时间',
+           [((('command', name),), seconds) for name, seconds in inflight.items()])
+
+    # summary 的 _sum/_count 与分位数同名不同后缀，单独输出
+    lines.append(f"# HELP email_cleaner_imap_command_seconds IMAP命令耗时（分位数取最近{LATENCY_SAMPLES}次）")
+    lines.append("# TYPE email_cleaner_imap_command_seconds summary")
+    for name, stats in snapshot['commands'].items():
+        label = _escape_label(name)
+        for q, seconds in stats['quantiles'].items():
+            lines.append(f'email_cleaner_imap_command_seconds{{command="{label}",quantile="{q}"}} '
+                         f'{_format_value(seconds)}')
+        lines.append(f'email_cleaner_imap_command_seconds_sum{{command="{label}"}} '
+                     f'{_format_value(stats["total_seconds"])}')
+        lines.append(f'email_cleaner_imap_command_seconds_count{{command="{label}"}} {stats["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def serve(host, port, run_metrics=None):
+    """
+    在后台线程中提供指标
+
+    Args:
+        host (str): 监听地址
+        port (int): 监听端口，0 表示由系统分配
+        run_metrics (RunMetrics): 默认为进程内共享的指标
+
+    Returns:
+        ThreadingHTTPServer: 已启动的服务器，server_address 为实际地址
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    source = run_metrics or _metrics
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split('?', 1)[0]
+            if path == '/metrics':
+                body = to_prometheus(source.snapshot()).encode('utf-8')
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            elif path in ('/', '/status'):
+                body = json.dumps(source.snapshot(), ensure_ascii=False, indent=2).encode('utf-8')
+                content_type = 'application/json; charset=utf-8'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # 访问记录不写入清理日志
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    return server
+
+
+_server = None
+
+
+def start_server(port, host='127.0.0.1'):
+    """
+    按配置启动指标服务，端口不大于0时不启动；端口被占用等错误只记录警告，不影响清理
+
+    Returns:
+        bool: 是否已启动
+    """
+    global _server
+    if port <= 0 or _server is not None:
+        return _server is not None
+    try:
+        _server = serve(host, port)
+    except OSError as e:
+        logger.warning(f"启动指标服务失败 {host}:{port}: {str(e)}")
+        return False
+    logger.info(f"指标服务已启动: http://{host}:{port}/status （Prometheus: /metrics）")
+    return True
+
+
+def stop_server():
+    """停止指标服务"""
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程MIME解析
+少数判断必须下载完整邮件（例如 BODYSTRUCTURE 无法解析时的附件检查），
+email 解析是纯CPU工作，在主进程中执行时会占用GIL，网络读取只能等待。
+MimePool 把邮件原文按批交给进程池解析，主进程同时继续下载下一批，
+每封邮件只返回简短的结论（Verdict），不在进程间传回解析后的邮件对象
+"""
+
+import email
+import logging
+from collections import deque, namedtuple
+
+# 每批最多包含的邮件数和原文字节数，批次太小时进程间传输开销占比过高
+BATCH_MESSAGES = 20
+BATCH_BYTES = 8 * 1024 * 1024
+
+Verdict = namedtuple('Verdict', 'has_attachment parts defects')
+Verdict.__doc__ = """
+单封邮件的解析结论
+
+has_attachment: 任一非 multipart 部分带有 Content-Disposition，与 check_has_attachment 一致
+parts: 非 multipart 部分的数量
+defects: 解析时发现的格式问题数量（email 模块记录的 defects）
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def analyze(raw):
+    """
+    解析一封邮件的原文
+
+    Args:
+        raw (bytes): 邮件原文，也可以是读取缓冲区中的 memoryview
+
+    Returns:
+        Verdict: 解析结论
+    """
+    # 与 message_from_bytes 的解码方式相同，memoryview 无需先复制为 bytes
+    message = email.message_from_string(str(raw, 'ascii', 'surrogateescape'))
+    attachment = False
+    parts = 0
+    defects = 0
+    for part in message.walk():
+        defects += len(part.defects)
+        if part.get_content_maintype() == 'multipart':
+            continue
+        parts += 1
+        if part.get('Content-Disposition') is not None:
+            attachment = True
+    return Verdict(attachment, parts, defects)
+
+
+def analyze_batch(items):
+    """
+    解析一批邮件，在子进程中执行
+
+    Args:
+        items (list): [(UID, 原文)]
+
+    Returns:
+        list: [(UID, Verdict)]，解析出错的邮件结论为 None
+    """
+    results = []
+    for uid, raw in items:
+        try:
+            results.append((uid, analyze(raw)))
+        except Exception:
+            results.append((uid, None))
+    return results
+
+
+def iter_batches(messages, max_messages=BATCH_MESSAGES, max_bytes=BATCH_BYTES):
+    """
+    把逐封产出的 (UID, 原文) 组成批次
+
+    原文可以是读取缓冲区中的 memoryview，组批时复制为 bytes，
+    调用方可以在取下一封之前复用缓冲区
+
+    Yields:
+        list: [(UID, bytes)]
+    """
+    batch = []
+    size = 0
+    for uid, raw in messages:
+        batch.append((uid, bytes(raw)))
+        size += len(raw)
+        if len(batch) >= max_messages or size >= max_bytes:
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
+
+
+class MimePool:
+    """
+    解析邮件原文的进程池
+
+    workers 为 0 时在当前进程中按顺序解析，结果与多进程相同。
+    子进程用 spawn 方式启动，不继承主进程中的IMAP连接和后台线程。
+    """
+
+    def __init__(self, workers=0, max_pending=None):
+        """
+        Args:
+            workers (int): 子进程数量，0 表示不使用进程池
+            max_pending (int): 最多同时提交多少批，默认为子进程数量的两倍；
+                达到上限时先等最早的一批完成，避免下载速度快于解析时原文堆积在内存中
+        """
+        self.workers = max(workers, 0)
+        self.max_pending = max_pending or self.workers * 2
+        self.executor = None
+        if self.workers:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            try:
+                self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            except (OSError, ImportError, NotImplementedError) as e:
+                logger.warning(f"无法创建MIME解析进程池，改为在主进程中解析: {str(e)}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        """关闭进程池，未开始的批次直接丢弃"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def map(self, batches):
+        """
+        解析各批邮件，按提交顺序产出结论
+
+        batches 在主进程中按需读取，读取下一批（通常是下载邮件）的同时子进程解析已提交的批次
+
+        Args:
+            batches: 可迭代的 [(UID, bytes)] 批次，例如 iter_batches() 的结果
+
+        Yields:
+            tuple: (UID, Verdict 或 None)
+        """
+        if self.executor is None:
+            for items in batches:
+                yield from analyze_batch(items)
+            return
+
+        pending = deque()
+        try:
+            for items in batches:
+                if self.executor is None:
+                    yield from analyze_batch(items)
+                    continue
+                pending.append((items, self.executor.submit(analyze_batch, items)))
+                while pending and (len(pending) >= self.max_pending or pending[0][1].done()):
+                    yield from self._result(*pending.popleft())
+            while pending:
+                yield from self._result(*pending.popleft())
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def _result(self, items, future):
+        """取一批的结果，进程池异常退出时改为在主进程中解析"""
+        from concurrent.futures import CancelledError
+        from concurrent.futures.process import BrokenProcessPool
+        try:
+            return future.result()
+        except (BrokenProcessPool, CancelledError) as e:
+            if self.executor is not None:
+                logger.warning(f"MIME解析进程池异常退出，剩余邮件改为在主进程中解析: {str(e)}")
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+            return analyze_batch(items)
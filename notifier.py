@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+清理结果通知
+通知先进入队列，由后台线程并发发送到各个通知渠道（SMTP邮件、钉钉机器人），
+每个渠道独立限流、失败时按指数退避重试，不阻塞清理任务
+"""
+
+import time
+import queue
+import atexit
+import logging
+import threading
+from collections import deque
+
+
+class SmtpSessionPool:
+    """按 (服务器, 端口, 账号) 缓存已登录的SMTP会话"""
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+        self.sessions = {}
+
+    def get(self, smtp_config, username, password):
+        """获取可用的SMTP会话，必要时新建连接并登录"""
+        key = (smtp_config['server'], smtp_config['port'], username)
+        server = self.sessions.get(key)
+        if server is not None:
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except Exception:
+                pass
+            self.invalidate(key)
+
+        import smtplib
+        if smtp_config['use_tls']:
+            server = smtplib.SMTP(smtp_config['server'], smtp_config['port'], timeout=self.timeout)
+            server.starttls()
+        else:
+            server = smtplib.SMTP_SSL(smtp_config['server'], smtp_config['port'], timeout=self.timeout)
+        server.login(username, password)
+        self.sessions[key] = server
+        return server
+
+    def invalidate(self, key):
+        """丢弃指定会话"""
+        server = self.sessions.pop(key, None)
+        if server is not None:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def close_all(self):
+        """退出并关闭全部会话"""
+        for key in list(self.sessions):
+            server = self.sessions.pop(key)
+            try:
+                server.quit()
+            except Exception:
+                try:
+                    server.close()
+                except Exception:
+                    pass
+
+
+class RateLimiter:
+    """滑动窗口限流：任意 period 秒内最多 limit 次"""
+
+    def __init__(self, limit, period=60.0):
+        self.limit = limit
+        self.period = period
+        self.history = deque()
+
+    def acquire(self):
+        """阻塞直到允许再发送一次"""
+        while True:
+            now = time.monotonic()
+            while self.history and now - self.history[0] >= self.period:
+                self.history.popleft()
+            if len(self.history) < self.limit:
+                self.history.append(now)
+                return
+            time.sleep(self.period - (now - self.history[0]))
+
+
+class NotificationChannel:
+    """
+    通知渠道基类
+
+    子类实现 send()，发送失败时抛出异常。key 相同的渠道共用限流器并串行发送。
+    """
+
+    name = 'channel'
+    rate_limit = None
+
+    @property
+    def key(self):
+        return (self.name,)
+
+    def send(self, title, body):
+        raise NotImplementedError
+
+
+class SmtpChannel(NotificationChannel):
+    """通过SMTP发送通知邮件"""
+
+    name = 'smtp'
+
+    def __init__(self, smtp_config, username, password, to_email, pool):
+        """
+        Args:
+            smtp_config (dict): SMTP服务器配置（server, port, use_tls）
+            username (str): SMTP登录账号，同时作为发件人
+            password (str): SMTP授权码
+            to_email (str): 收件人地址
+            pool (SmtpSessionPool): SMTP会话池
+        """
+        self.smtp_config = smtp_config
+        self.username = username
+        self.password = password
+        self.to_email = to_email
+        self.pool = pool
+
+    @property
+    def key(self):
+        return (self.name, self.smtp_config['server'], self.smtp_config['port'], self.username)
+
+    def send(self, title, body):
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+
+        msg = MIMEMultipart()
+        msg['From'] = self.username
+        msg['To'] = self.to_email
+        msg['Subject'] = title
+        msg.attach(MIMEText(body, 'plain', 'utf-8'))
+
+        try:
+            server = self.pool.get(self.smtp_config, self.username, self.password)
+            server.sendmail(self.username, self.to_email, msg.as_string())
+        except Exception:
+            self.pool.invalidate(self.key[1:])
+            raise
+
+    def __str__(self):
+        return f"邮件 {self.to_email}"
+
+
+class DingTalkChannel(NotificationChannel):
+    """通过钉钉群机器人发送通知，钉钉限制每个机器人每分钟最多20条消息"""
+
+    name = 'dingtalk'
+
+    def __init__(self, webhook_url, secret=None, rate_limit=20):
+        """
+        Args:
+            webhook_url (str): 机器人Webhook地址
+            secret (str): 加签密钥
+            rate_limit (int): 每分钟最多发送的消息数
+        """
+        from pb import DingTalkRobot
+
+        # 重试由分发器统一处理
+        self.robot = DingTalkRobot(webhook_url, secret=secret, retries=1)
+        self.webhook_url = webhook_url
+        self.rate_limit = rate_limit
+
+    @property
+    def key(self):
+        return (self.name, self.webhook_url)
+
+    def send(self, title, body):
+        if not self.robot.send_text(f"{title}\n{body.strip()}"):
+            raise RuntimeError("钉钉消息发送失败")
+
+    def __str__(self):
+        return "钉钉机器人"
+
+
+class _Submission:
+    """一条通知在各渠道的发送结果，全部渠道结束后调用回调"""
+
+    def __init__(self, channels, callback):
+        self.remaining = channels
+        self.delivered = 0
+        self.callback = callback
+        self.lock = threading.Lock()
+
+    def done(self, delivered):
+        with self.lock:
+            self.remaining -= 1
+            self.delivered += 1 if delivered else 0
+            finished = self.remaining == 0
+        if finished:
+            self.callback(self.delivered)
+
+
+class NotificationDispatcher:
+    """
+    通知分发器
+
+    submit() 把通知按渠道拆成发送任务放入队列后立即返回，多个后台线程并发发送。
+    同一渠道的任务串行执行并受该渠道的限流约束，失败时按指数退避重试。
+    """
+
+    def __init__(self, workers=4, max_retries=3, backoff=2.0, max_backoff=60.0, logger=None):
+        """
+        Args:
+            workers (int): 后台发送线程数
+            max_retries (int): 每个渠道最多尝试发送的次数
+            backoff (float): 首次重试前等待的秒数，之后每次翻倍
+            max_backoff (float): 单次重试等待的最长秒数
+            logger: 日志记录器
+        """
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.logger = logger or logging.getLogger(__name__)
+        self.smtp_pool = SmtpSessionPool()
+        self.queue = queue.Queue()
+        self.threads = []
+        self.start_lock = threading.Lock()
+        self.channel_locks = {}
+        self.limiters = {}
+        self.sent_count = 0
+        self.failed_count = 0
+
+    def start(self):
+        """启动后台发送线程"""
+        with self.start_lock:
+            self.threads = [thread for thread in self.threads if thread.is_alive()]
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self._run, name='notification-dispatcher', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, channels, title, body, callback=None):
+        """
+        提交一条通知，发送到全部渠道
+
+        Args:
+            channels (list): NotificationChannel 列表
+            title (str): 通知标题
+            body (str): 通知正文
+            callback: 可选，全部渠道发送结束（含重试）后在后台线程中调用，参数为发送成功的渠道数
+        """
+        self.start()
+        tracker = _Submission(len(channels), callback) if callback is not None else None
+        for channel in channels:
+            self.queue.put((channel, title, body, tracker))
+
+    def send_now(self, channels, title, body, callback=None):
+        """
+        在当前线程依次发送到全部渠道
+
+        Args:
+            callback: 可选，发送结束后调用，参数为发送成功的渠道数
+
+        Returns:
+            bool: 是否全部发送成功
+        """
+        results = [self._deliver(channel, title, body) for channel in channels]
+        if callback is not None:
+            callback(sum(results))
+        return all(results)
+
+    def _run(self):
+        """后台线程主循环"""
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                channel, title, body, tracker = job
+                delivered = self._deliver(channel, title, body)
+                if tracker is not None:
+                    tracker.done(delivered)
+            except Exception as e:
+                self.logger.error(f"处理通知发送结果时出错: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    def _channel_state(self, channel):
+        """获取渠道的锁和限流器"""
+        with self.start_lock:
+            key = channel.key
+            if key not in self.channel_locks:
+                self.channel_locks[key] = threading.Lock()
+                if channel.rate_limit:
+                    self.limiters[key] = RateLimiter(channel.rate_limit, 60.0)
+            return self.channel_locks[key], self.limiters.get(key)
+
+    def _deliver(self, channel, title, body):
+        """发送到单个渠道，失败时退避重试"""
+        lock, limiter = self._channel_state(channel)
+        with lock:
+            for attempt in range(self.max_retries):
+                try:
+                    if limiter is not None:
+                        limiter.acquire()
+                    channel.send(title, body)
+                    self.sent_count += 1
+                    self.logger.info(f"通知发送成功: {channel}")
+                    return True
+                except Exception as e:
+                    self.logger.error(f"通知发送失败 {channel} (尝试 {attempt+1}/{self.max_retries}): {str(e)}")
+                    if attempt + 1 < self.max_retries:
+                        time.sleep(min(self.backoff * (2 ** attempt), self.max_backoff))
+            self.failed_count += 1
+            return False
+
+    def flush(self, timeout=None):
+        """
+        等待队列中的通知发送完毕
+
+        Args:
+            timeout (float): 最长等待秒数，None 表示一直等待
+
+        Returns:
+            bool: 队列是否已清空
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                self.logger.warning(f"等待通知发送超时，仍有 {self.queue.unfinished_tasks} 条未发送")
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout=None):
+        """发送剩余通知后停止后台线程并关闭SMTP会话"""
+        done = self.flush(timeout)
+        alive = [thread for thread in self.threads if thread.is_alive()]
+        if done:
+            for _ in alive:
+                self.queue.put(None)
+            for thread in alive:
+                thread.join(timeout)
+            self.smtp_pool.close_all()
+        return done
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """获取进程内共享的通知分发器，多账号运行时共用SMTP会话和限流状态"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = NotificationDispatcher()
+            atexit.register(shutdown_dispatcher, 60)
+        return _dispatcher
+
+
+def shutdown_dispatcher(timeout=60):
+    """等待共享分发器发送完毕并关闭"""
+    global _dispatcher
+    with _dispatcher_lock:
+        dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher is not None:
+        return dispatcher.close(timeout)
+    return True
@@ -2,7 +2,6 @@
 from datetime import datetime, timedelta
 import calendar
 
-import requests
 import json
 import time
 import hashlib
@@ -12,16 +11,21 @@ import logging
 from urllib.parse import quote_plus
 
 class DingTalkRobot:
-    def __init__(self, webhook_url, secret=None, retries=3):
+    # 所有机器人实例共用的HTTP会话，复用TCP/TLS连接
+    _session = None
+
+    def __init__(self, webhook_url, secret=None, retries=3, backoff=1.0):
         """
         初始化钉钉机器人
         :param webhook_url: 机器人Webhook地址 (必填)
         :param secret: 加签密钥 (安全设置选择加签时需要)
         :param retries: 消息发送失败重试次数
+        :param backoff: 首次重试前等待的秒数，之后每次翻倍
         """
         self.webhook_url = webhook_url
         self.secret = secret
         self.retries = retries
+        self.backoff = backoff
         self.logger = logging.getLogger("DingTalkRobot")
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
@@ -39,20 +43,30 @@ class DingTalkRobot:
         sign = quote_plus(base64.b64encode(hmac_code))
         return timestamp, sign
 
+    @classmethod
+    def _get_session(cls):
+        """获取共享的HTTP会话"""
+        if cls._session is None:
+            # requests 导入较慢，第一次发送时才导入
+            import requests
+            cls._session = requests.Session()
+            cls._session.headers.update({"Content-Type": "application/json"})
+        return cls._session
+
     def _send_message(self, payload):
         """发送消息核心逻辑 (含重试机制) [citation:3][citation:5]"""
-        timestamp, sign = self._generate_signature()
-        params = {"timestamp": timestamp}
-        if sign:
-            params["sign"] = sign
+        session = self._get_session()
 
         for attempt in range(self.retries):
+            # 签名带时间戳，每次重试重新生成
+            timestamp, sign = self._generate_signature()
+            params = {"timestamp": timestamp}
+            if sign:
+                params["sign"] = sign
             try:
-                headers = {"Content-Type": "application/json"}
-                response = requests.post(
+                response = session.post(
                     self.webhook_url,
                     params=params,
-                    headers=headers,
                     data=json.dumps(payload),
                     timeout=5
                 )
@@ -64,7 +78,8 @@ class DingTalkRobot:
                     self.logger.error(f"发送失败 (尝试 {attempt+1}/{self.retries}): {result.get('errmsg')}")
             except Exception as e:
                 self.logger.error(f"网络异常 (尝试 {attempt+1}/{self.retries}): {str(e)}")
-            time.sleep(2)  # 等待2秒后重试
+            if attempt + 1 < self.retries:
+                time.sleep(self.backoff * (2 ** attempt))  # 指数退避后重试
         return False
 
     def send_text(self, content, at_mobiles=None, at_all=False):
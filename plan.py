@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+删除计划
+dry_run 运行时把待删除邮件按文件夹和规则记录为 UID 区间集合，连同文件夹的 UIDVALIDITY
+和各发送人数量写入计划文件；审核后用 apply 命令直接按计划批量删除，不再重新搜索和获取邮件头。
+UIDVALIDITY 变化说明 UID 已被服务器重新分配，此时拒绝执行
+
+用法:
+    python plan.py show               # 查看计划
+    python plan.py apply              # 按计划删除
+    python plan.py apply --plan deletion_plan.json --config email_config.ini
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+
+from uid_set import UidSet
+
+DEFAULT_PLAN = 'deletion_plan.json'
+PLAN_VERSION = 1
+
+# 规则名称与通知邮件中使用的分类名称
+RULE_LABELS = {
+    'target_senders': '指定发送人的邮件',
+    'read_no_attachment': '已读且不带附件的邮件',
+    'content_patterns': '正文匹配规则的邮件',
+    'duplicates': '重复邮件',
+    'quota': '按容量清理的邮件',
+    'action_rules': '批量操作规则删除的邮件',
+}
+
+_UIDVALIDITY_RE = re.compile(rb'UIDVALIDITY (\d+)')
+
+
+class PlanError(Exception):
+    """计划无法执行"""
+
+
+def get_uidvalidity(mail, folder):
+    """
+    获取文件夹的 UIDVALIDITY
+
+    优先读取 SELECT 时服务器返回的值，没有时用 STATUS 命令查询。
+
+    Returns:
+        int: UIDVALIDITY，无法获取时返回 None
+    """
+    responses = getattr(mail, 'untagged_responses', {}).get('UIDVALIDITY')
+    if responses:
+        return int(responses[-1])
+    status, data = mail.status(f'"{folder}"', '(UIDVALIDITY)')
+    if status == 'OK':
+        for item in data:
+            match = _UIDVALIDITY_RE.search(item if isinstance(item, bytes) else str(item).encode())
+            if match:
+                return int(match.group(1))
+    return None
+
+
+class DeletionPlan:
+    """
+    删除计划
+
+    folders 结构为 {文件夹: {'uidvalidity': int, 'rules': {规则: {'uids': UidSet, 'senders': {发送人: 数量}}}}}，
+    保存时 UID 集合写为IMAP序列集语法，连续的UID只占一个区间。
+    """
+
+    def __init__(self, account):
+        self.account = account
+        self.created = int(time.time())
+        self.applied = None
+        self.folders = {}
+
+    def add(self, folder, uidvalidity, rule, uids, sender_counts=None):
+        """
+        记录一个规则在一个文件夹中选中的邮件，同一规则多次记录时合并
+
+        已全部记录过的邮件再次记录时不改变计划，发送人数量不会重复累计
+
+        Raises:
+            PlanError: 同一文件夹两次记录的 UIDVALIDITY 不一致
+        """
+        entry = self.folders.setdefault(folder, {'uidvalidity': uidvalidity, 'rules': {}})
+        if entry['uidvalidity'] != uidvalidity:
+            raise PlanError(f"文件夹 {folder} 的 UIDVALIDITY 在运行期间发生变化")
+        rule_entry = entry['rules'].setdefault(rule, {'uids': UidSet(), 'senders': {}})
+        if not uids - rule_entry['uids']:
+            return
+        rule_entry['uids'] = rule_entry['uids'] | uids
+        senders = rule_entry['senders']
+        for sender, count in (sender_counts or {}).items():
+            senders[sender] = senders.get(sender, 0) + count
+
+    def folder_uids(self, folder):
+        """文件夹中所有规则选中的邮件"""
+        uids = UidSet()
+        for rule_entry in self.folders[folder]['rules'].values():
+            uids = uids | rule_entry['uids']
+        return uids
+
+    def rule_counts(self):
+        """
+        各规则的邮件数量
+
+        Returns:
+            dict: 规则 -> 数量，同一封邮件被多个规则选中时分别计数
+        """
+        counts = {}
+        for entry in self.folders.values():
+            for rule, rule_entry in entry['rules'].items():
+                counts[rule] = counts.get(rule, 0) + len(rule_entry['uids'])
+        return counts
+
+    def __len__(self):
+        return sum(len(self.folder_uids(folder)) for folder in self.folders)
+
+    def to_dict(self):
+        folders = {}
+        for folder, entry in self.folders.items():
+            folders[folder] = {
+                'uidvalidity': entry['uidvalidity'],
+                'rules': {
+                    rule: {'uids': str(rule_entry['uids']), 'senders': rule_entry['senders']}
+                    for rule, rule_entry in entry['rules'].items()
+                }
+            }
+        return {'version': PLAN_VERSION, 'account': self.account, 'created': self.created,
+                'applied': self.applied, 'folders': folders}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != PLAN_VERSION:
+            raise PlanError(f"不支持的计划文件版本: {data.get('version')}")
+        plan = cls(data['account'])
+        plan.created = data['created']
+        plan.applied = data.get('applied')
+        for folder, entry in data['folders'].items():
+            plan.folders[folder] = {
+                'uidvalidity': entry['uidvalidity'],
+                'rules': {
+                    rule: {'uids': UidSet.parse(rule_entry['uids']), 'senders': rule_entry['senders']}
+                    for rule, rule_entry in entry['rules'].items()
+                }
+            }
+        return plan
+
+    def save(self, path):
+        """原子地写入计划文件"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """读取计划文件"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def describe(self, top=10):
+        """计划的可读摘要"""
+        lines = [
+            f"账号: {self.account}",
+            f"生成时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.created))}",
+        ]
+        if self.applied:
+            lines.append(f"已于 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.applied))} 执行")
+        for folder, entry in self.folders.items():
+            lines.append(f"文件夹 {folder}（UIDVALIDITY {entry['uidvalidity']}）: 共 {len(self.folder_uids(folder))} 封")
+            for rule, rule_entry in entry['rules'].items():
+                lines.append(f"  {RULE_LABELS.get(rule, rule)}: {len(rule_entry['uids'])} 封")
+                senders = sorted(rule_entry['senders'].items(), key=lambda item: item[1], reverse=True)
+                for sender, count in senders[:top]:
+                    lines.append(f"    {sender}: {count} 封")
+                if len(senders) > top:
+                    lines.append(f"    ……另有 {len(senders) - top} 个发送人")
+        return "\n".join(lines)
+
+
+def apply_plan(cleaner, plan):
+    """
+    按计划删除邮件
+
+    先检查所有文件夹的 UIDVALIDITY，任何一个发生变化都不删除任何邮件；
+    然后每个文件夹用一次批量 STORE 标记删除（配置了归档时先归档）并 EXPUNGE。
+
+    Args:
+        cleaner: 已连接的 QQEmailCleaner
+        plan (DeletionPlan): 删除计划
+
+    Returns:
+        dict: 文件夹 -> 删除数量
+
+    Raises:
+        PlanError: 账号不一致或 UIDVALIDITY 已变化
+    """
+    account = cleaner.config['EMAIL']['email']
+    if plan.account != account:
+        raise PlanError(f"计划属于账号 {plan.account}，当前配置为 {account}")
+
+    for folder, entry in plan.folders.items():
+        status, _ = cleaner.mail.select(folder, readonly=True)
+        if status != 'OK':
+            raise PlanError(f"选择文件夹失败: {folder}")
+        uidvalidity = get_uidvalidity(cleaner.mail, folder)
+        if uidvalidity != entry['uidvalidity']:
+            raise PlanError(f"文件夹 {folder} 的 UIDVALIDITY 已从 {entry['uidvalidity']} 变为 {uidvalidity}，"
+                            f"计划中的UID已失效，请重新生成计划")
+
+    results = {}
+    for folder, entry in plan.folders.items():
+        status, _ = cleaner.mail.select(folder)
+        # 两次 SELECT 之间也可能被重建
+        if status != 'OK' or get_uidvalidity(cleaner.mail, folder) != entry['uidvalidity']:
+            raise PlanError(f"文件夹 {folder} 在执行期间发生变化，已停止")
+        uids = plan.folder_uids(folder)
+        cleaner.logger.info(f"按计划删除文件夹 {folder} 中的 {len(uids)} 封邮件...")
+        results[folder] = cleaner.remove_messages(uids, folder)
+    return results
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='查看或执行 dry_run 生成的删除计划')
+    parser.add_argument('command', choices=('show', 'apply'), help='show 查看计划，apply 按计划删除')
+    parser.add_argument('--plan', help='计划文件，默认为配置中的 plan_file')
+    parser.add_argument('--config', default='email_config.ini', help='配置文件路径')
+    parser.add_argument('--force', action='store_true', help='计划已执行过时仍然执行')
+    args = parser.parse_args()
+
+    from clear_qq_email import QQEmailCleaner
+    cleaner = QQEmailCleaner(args.config)
+    plan_path = args.plan or cleaner.config['EMAIL'].get('plan_file', '') or DEFAULT_PLAN
+    if not os.path.exists(plan_path):
+        print(f"计划文件不存在: {plan_path}，请先在 dry_run = True 且配置 plan_file 时运行一次清理")
+        sys.exit(1)
+    plan = DeletionPlan.load(plan_path)
+
+    if args.command == 'show':
+        print(plan.describe())
+        return
+
+    logger = logging.getLogger(__name__)
+    if plan.applied and not args.force:
+        print("该计划已执行过，如需再次执行请加 --force")
+        sys.exit(1)
+    if not cleaner.connect_to_mailbox():
+        sys.exit(1)
+    try:
+        results = apply_plan(cleaner, plan)
+    except PlanError as e:
+        logger.error(f"拒绝执行删除计划: {str(e)}")
+        sys.exit(1)
+    finally:
+        cleaner.disconnect()
+
+    plan.applied = int(time.time())
+    plan.save(plan_path)
+    total_deleted = sum(results.values())
+    logger.info(f"删除计划执行完成，共删除 {total_deleted} 封邮件")
+
+    if total_deleted > 0:
+        counts = {RULE_LABELS.get(rule, rule): count for rule, count in plan.rule_counts().items()}
+        details = "; ".join(f"{label}: {count} 封" for label, count in counts.items())
+        cleaner.send_notification_email(total_deleted, details, counts)
+    cleaner.wait_for_notifications()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行性能分析
+--profile 时用 cProfile 和 tracemalloc 记录每个处理阶段的耗时、CPU时间、内存峰值和热点函数，
+运行结束后在日志旁写出报告；未启用时 stage() 只返回一个空的上下文管理器
+"""
+
+import os
+import io
+import time
+import logging
+import functools
+from contextlib import contextmanager, nullcontext
+
+_NULL_STAGE = nullcontext()
+_profiler = None
+
+
+class StageStats:
+    """单个阶段的累计统计"""
+
+    __slots__ = ('name', 'calls', 'wall', 'cpu', 'peak_memory', 'profile')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_memory = 0
+        self.profile = None
+
+
+class RunProfiler:
+    """
+    按阶段记录性能数据
+
+    最外层阶段各自使用一个 cProfile.Profile，嵌套阶段以 "外层/内层" 命名，
+    只记录耗时和内存峰值（同一时刻只能有一个 cProfile 处于启用状态）。
+    墙钟时间与CPU时间之差大致是等待网络的时间。
+    """
+
+    def __init__(self, name, output_dir='.', top=30):
+        """
+        Args:
+            name (str): 报告文件名前缀，如 cron_cleaner
+            output_dir (str): 报告目录
+            top (int): 每个阶段列出的热点函数数量
+        """
+        import cProfile
+        import tracemalloc
+
+        self._cProfile = cProfile
+        self._tracemalloc = tracemalloc
+        self.name = name
+        self.output_dir = output_dir
+        self.top = top
+        self.stages = {}
+        self._stack = []
+        self.started = time.perf_counter()
+        self.started_cpu = time.process_time()
+        tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        """记录一个阶段，可以嵌套"""
+        full_name = '/'.join(self._stack + [name])
+        stats = self.stages.get(full_name)
+        if stats is None:
+            stats = self.stages[full_name] = StageStats(full_name)
+        top_level = not self._stack
+        if top_level:
+            if stats.profile is None:
+                stats.profile = self._cProfile.Profile()
+            # 外层阶段开始时重置峰值；嵌套阶段的峰值包含在外层之内
+            self._tracemalloc.reset_peak()
+            stats.profile.enable()
+
+        self._stack.append(name)
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield stats
+        finally:
+            stats.wall += time.perf_counter() - wall
+            stats.cpu += time.process_time() - cpu
+            stats.calls += 1
+            stats.peak_memory = max(stats.peak_memory, self._tracemalloc.get_traced_memory()[1])
+            self._stack.pop()
+            if top_level:
+                stats.profile.disable()
+
+    def build_report(self):
+        """生成文本报告"""
+        import pstats
+        from digest import pad_text
+
+        total_wall = time.perf_counter() - self.started
+        total_cpu = time.process_time() - self.started_cpu
+        current, peak = self._tracemalloc.get_traced_memory()
+        out = io.StringIO()
+        out.write(f"性能分析报告: {self.name}  {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+        out.write(f"总耗时 {total_wall:.3f}s，CPU {total_cpu:.3f}s，"
+                  f"等待(网络等) {max(total_wall - total_cpu, 0):.3f}s\n\n")
+
+        columns = (('次数', 8), ('耗时(s)', 10), ('CPU(s)', 10), ('等待(s)', 10), ('内存峰值(MB)', 14))
+        out.write(pad_text('阶段', 48) + ''.join(pad_text(title, width, True) for title, width in columns) + "\n")
+        for stats in self.stages.values():
+            values = (stats.calls, f"{stats.wall:.3f}", f"{stats.cpu:.3f}",
+                      f"{max(stats.wall - stats.cpu, 0):.3f}", f"{stats.peak_memory / 1048576:.2f}")
+            out.write(pad_text(stats.name, 48)
+                      + ''.join(pad_text(value, width, True) for value, (_, width) in zip(values, columns)) + "\n")
+
+        out.write(f"\n内存: 当前 {current / 1048576:.2f} MB，整个运行峰值 {peak / 1048576:.2f} MB\n")
+        out.write("\n分配内存最多的代码行:\n")
+        snapshot = self._tracemalloc.take_snapshot().filter_traces((
+            self._tracemalloc.Filter(False, self._tracemalloc.__file__),
+            self._tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        for stat in snapshot.statistics('lineno')[:15]:
+            out.write(f"  {stat}\n")
+
+        for stats in self.stages.values():
+            if stats.profile is None:
+                continue
+            out.write(f"\n===== 阶段 {stats.name} 热点（按自身耗时排序） =====\n")
+            pstats.Stats(stats.profile, stream=out).sort_stats('tottime').print_stats(self.top)
+        return out.getvalue()
+
+    def write_report(self):
+        """
+        写出文本报告和可用 pstats/snakeviz 打开的合并 .prof 文件
+
+        Returns:
+            str: 文本报告路径
+        """
+        import pstats
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d_%H%M%S')
+        report_path = os.path.join(self.output_dir, f"{self.name}_profile_{stamp}.txt")
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(self.build_report())
+
+        profiles = [stats.profile for stats in self.stages.values() if stats.profile is not None]
+        if profiles:
+            combined = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                combined.add(profile)
+            combined.dump_stats(os.path.join(self.output_dir, f"{self.name}_profile_{stamp}.prof"))
+        return report_path
+
+    def stop(self):
+        """写出报告并停止内存跟踪"""
+        try:
+            return self.write_report()
+        finally:
+            self._tracemalloc.stop()
+
+
+def start_profiling(name, log_file):
+    """
+    启用性能分析，报告写在日志文件所在目录
+
+    Args:
+        name (str): 报告文件名前缀
+        log_file (str): 日志文件路径
+    """
+    global _profiler
+    _profiler = RunProfiler(name, os.path.dirname(os.path.abspath(log_file)))
+    return _profiler
+
+
+def stop_profiling():
+    """结束性能分析并写出报告，未启用时返回 None"""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is None:
+        return None
+    report_path = profiler.stop()
+    logging.getLogger(__name__).info(f"性能分析报告已写入: {report_path}")
+    return report_path
+
+
+def stage(name):
+    """
+    标记一个处理阶段
+
+    未启用性能分析时返回共享的空上下文管理器，开销只有一次函数调用。
+    """
+    if _profiler is None:
+        return _NULL_STAGE
+    return _profiler.stage(name)
+
+
+def profiled(name):
+    """
+    把函数标记为一个处理阶段的装饰器
+
+    未启用性能分析时只多一次判断，不进入任何上下文管理器。
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return func(*args, **kwargs)
+            with _profiler.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
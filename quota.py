@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按容量回收空间
+从最大的邮件开始选择，用最少的邮件数量腾出指定的空间。
+服务器支持 SORT 时由服务器按大小排序，否则先用 SEARCH LARGER 逐级缩小范围，
+只获取可能被选中的邮件的 RFC822.SIZE
+"""
+
+import re
+import logging
+
+from uid_set import UidSet
+
+MB = 1024 * 1024
+# 不支持 SORT 时依次尝试的 LARGER 阈值，越大的邮件越先获取大小
+LARGER_THRESHOLDS = (4 * MB, MB, 256 * 1024, 0)
+
+_SIZE_RE = re.compile(rb'UID (\d+) RFC822\.SIZE (\d+)|RFC822\.SIZE (\d+) UID (\d+)')
+_STORAGE_RE = re.compile(rb'STORAGE (\d+) (\d+)')
+
+
+def parse_storage_quota(data):
+    """
+    解析 GETQUOTAROOT 响应中的存储配额
+
+    Returns:
+        tuple: (已用字节数, 总字节数)，响应中没有 STORAGE 时返回 None
+    """
+    for item in data:
+        items = item if isinstance(item, list) else [item]
+        for line in items:
+            if isinstance(line, bytes):
+                match = _STORAGE_RE.search(line)
+                if match:
+                    # 配额单位为 KB
+                    return int(match.group(1)) * 1024, int(match.group(2)) * 1024
+    return None
+
+
+def select_largest_first(sizes, target_bytes):
+    """
+    从大到小选择邮件，直到总大小达到目标
+
+    按大小降序选择得到的邮件数量最少。
+
+    Args:
+        sizes: 按大小降序排列的 (UID, 大小) 序列
+        target_bytes (int): 需要腾出的字节数
+
+    Returns:
+        tuple: (选中的UID列表, 选中邮件的总字节数)
+    """
+    chosen = []
+    total = 0
+    for uid, size in sizes:
+        if total >= target_bytes:
+            break
+        chosen.append(uid)
+        total += size
+    return chosen, total
+
+
+class QuotaReclaimer:
+    """在当前已选择的文件夹中挑选需要删除的最大邮件"""
+
+    def __init__(self, mail, batch_size=500, logger=None):
+        """
+        Args:
+            mail: 已选择文件夹的 imaplib 连接
+            batch_size (int): 每次FETCH请求包含的UID数量
+            logger: 日志记录器
+        """
+        self.mail = mail
+        self.batch_size = batch_size
+        self.logger = logger or logging.getLogger(__name__)
+
+    def bytes_to_free(self, free_bytes, folder='INBOX'):
+        """
+        计算还需腾出的字节数
+
+        服务器支持 QUOTA 时按配额计算，剩余空间已足够则返回0；
+        否则每次都腾出 free_bytes。
+        """
+        if 'QUOTA' not in getattr(self.mail, 'capabilities', ()):
+            return free_bytes
+        try:
+            status, data = self.mail.getquotaroot(folder)
+        except Exception as e:
+            self.logger.warning(f"获取配额失败: {str(e)}")
+            return free_bytes
+        quota = parse_storage_quota(data) if status == 'OK' else None
+        if quota is None:
+            return free_bytes
+        used, limit = quota
+        self.logger.info(f"邮箱已用 {used / MB:.1f} MB / {limit / MB:.1f} MB")
+        return max(free_bytes - (limit - used), 0)
+
+    def fetch_sizes(self, uids):
+        """
+        批量获取邮件大小
+
+        Args:
+            uids: 邮件UID序列
+
+        Returns:
+            dict: UID -> 字节数
+        """
+        sizes = {}
+        uids = list(uids)
+        for start in range(0, len(uids), self.batch_size):
+            chunk = UidSet(uids[start:start + self.batch_size])
+            status, data = self.mail.uid('FETCH', str(chunk), '(UID RFC822.SIZE)')
+            if status != 'OK':
+                self.logger.error(f"获取邮件大小失败: {chunk}")
+                continue
+            for line in data:
+                if isinstance(line, tuple):
+                    line = line[0]
+                if not isinstance(line, bytes):
+                    continue
+                match = _SIZE_RE.search(line)
+                if match:
+                    if match.group(1):
+                        sizes[int(match.group(1))] = int(match.group(2))
+                    else:
+                        sizes[int(match.group(4))] = int(match.group(3))
+        return sizes
+
+    def largest_by_sort(self, criteria, candidates, target_bytes):
+        """服务器按大小降序排序，按顺序分批获取大小直到总大小达到目标"""
+        status, data = self.mail.uid('SORT', '(REVERSE SIZE)', 'UTF-8', criteria)
+        if status != 'OK':
+            raise RuntimeError(f"SORT 失败: {data}")
+        ordered = [int(uid) for uid in (data[0] or b'').split()]
+        if candidates is not None:
+            ordered = [uid for uid in ordered if uid in candidates]
+
+        result = []
+        total = 0
+        for start in range(0, len(ordered), self.batch_size):
+            chunk = ordered[start:start + self.batch_size]
+            sizes = self.fetch_sizes(chunk)
+            for uid in chunk:
+                if uid in sizes:
+                    result.append((uid, sizes[uid]))
+                    total += sizes[uid]
+            if total >= target_bytes:
+                break
+        return result
+
+    def largest_by_search(self, criteria, candidates, target_bytes):
+        """按 LARGER 阈值由大到小逐级搜索，已获取的邮件总大小达到目标后停止"""
+        found = {}
+        seen = UidSet()
+        for threshold in LARGER_THRESHOLDS:
+            search = f'LARGER {threshold} {criteria}' if threshold else criteria
+            status, data = self.mail.uid('SEARCH', None, search)
+            if status != 'OK':
+                continue
+            uids = UidSet.from_search_response(data[0] if data else b'')
+            if candidates is not None:
+                uids = uids & candidates
+            uids = uids - seen
+            seen = seen | uids
+            found.update(self.fetch_sizes(uids))
+            if sum(found.values()) >= target_bytes:
+                break
+        return sorted(found.items(), key=lambda item: (-item[1], item[0]))
+
+    def plan(self, criteria, target_bytes, candidates=None):
+        """
+        选出需要删除的邮件
+
+        Args:
+            criteria (str): 服务器端搜索条件（如日期条件）
+            target_bytes (int): 需要腾出的字节数
+            candidates (UidSet): 可选，只在这些UID中选择（如目标发送人的邮件）
+
+        Returns:
+            tuple: (UidSet, 选中邮件的总字节数)
+        """
+        if target_bytes <= 0:
+            return UidSet(), 0
+        sizes = None
+        if 'SORT' in getattr(self.mail, 'capabilities', ()):
+            try:
+                sizes = self.largest_by_sort(criteria, candidates, target_bytes)
+            except Exception as e:
+                self.logger.warning(f"服务器排序失败，改用 SEARCH LARGER: {str(e)}")
+        if sizes is None:
+            sizes = self.largest_by_search(criteria, candidates, target_bytes)
+        chosen, total = select_largest_first(sizes, target_bytes)
+        if total < target_bytes:
+            self.logger.warning(f"符合条件的邮件只有 {total / MB:.1f} MB，不足 {target_bytes / MB:.1f} MB")
+        return UidSet(chosen), total
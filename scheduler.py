@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按运行时间预算调度清理工作
+每项工作（每个目标发送人、每条清理规则）先用一次 SEARCH 估算能删除多少邮件、
+需要多少次往返，按单位往返的收益从高到低执行；到达 max_runtime 后不再开始新工作，
+正在执行的工作提交完当前批次后停止。RunLock 防止上一次运行未结束时再次启动
+"""
+
+import os
+import time
+import logging
+
+# 无法事先估算收益的工作（如按正文匹配、去重）排在最后
+UNKNOWN_VALUE = 0.0
+
+
+class Deadline:
+    """运行截止时间，seconds 不大于0 表示不限时"""
+
+    def __init__(self, seconds=0):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds if seconds > 0 else None
+
+    def remaining(self):
+        """剩余秒数，不限时返回 None"""
+        if self.expires is None:
+            return None
+        return max(self.expires - time.monotonic(), 0.0)
+
+    def expired(self):
+        return self.expires is not None and time.monotonic() >= self.expires
+
+
+def estimate_round_trips(uids, batch_size, per_message=0, searches=1):
+    """
+    估算处理一组邮件需要的往返次数
+
+    Args:
+        uids (UidSet): 候选邮件
+        batch_size (int): 每次FETCH的邮件数量
+        per_message (int): 每封邮件额外的往返次数（如逐封下载检查附件）
+        searches (int): 搜索次数
+
+    Returns:
+        int: 往返次数，包括搜索、分批获取邮件头、按区间标记删除和一次 EXPUNGE
+    """
+    count = len(uids)
+    if not count:
+        return searches
+    fetches = -(-count // batch_size)
+    stores = sum(1 for _ in uids.chunks())
+    return searches + fetches + count * per_message + stores + 1
+
+
+class WorkItem:
+    """一项清理工作"""
+
+    __slots__ = ('name', 'label', 'run', 'messages', 'size', 'round_trips')
+
+    def __init__(self, name, label, run, messages=0, size=0, round_trips=1):
+        """
+        Args:
+            name (str): 日志中显示的名称
+            label (str): 通知邮件中的分类名称
+            run: 无参数的可调用对象，返回删除的邮件数量
+            messages (int): 估计删除的邮件数量，未知时为 0
+            size (int): 估计释放的字节数，未知时为 0
+            round_trips (int): 估计的往返次数
+        """
+        self.name = name
+        self.label = label
+        self.run = run
+        self.messages = messages
+        self.size = size
+        self.round_trips = max(round_trips, 1)
+
+    def value(self, by='messages'):
+        """单位往返的收益：邮件数量或字节数"""
+        gain = self.size if by == 'bytes' else self.messages
+        return gain / self.round_trips if gain else UNKNOWN_VALUE
+
+
+class Scheduler:
+    """按收益排序执行工作，到达截止时间后停止"""
+
+    def __init__(self, deadline=None, by='messages', logger=None):
+        """
+        Args:
+            deadline (Deadline): 截止时间，None 表示不限时
+            by (str): 'messages' 按单位往返删除的邮件数排序，'bytes' 按单位往返释放的字节数排序
+            logger: 日志记录器
+        """
+        if by not in ('messages', 'bytes'):
+            raise ValueError(f"不支持的排序方式: {by}")
+        self.deadline = deadline or Deadline()
+        self.by = by
+        self.logger = logger or logging.getLogger(__name__)
+        self.items = []
+
+    def add(self, item):
+        self.items.append(item)
+
+    def ordered(self):
+        """按收益从高到低排列的工作，收益相同时保持加入顺序"""
+        return sorted(self.items, key=lambda item: item.value(self.by), reverse=True)
+
+    def run(self, stage=None):
+        """
+        依次执行工作
+
+        Args:
+            stage: 可选，接收名称并返回上下文管理器的函数（如 profiling.stage）
+
+        Returns:
+            list: [(分类名称, 删除数量), ...]，只包含删除数量大于0的工作
+        """
+        results = []
+        ordered = self.ordered()
+        for position, item in enumerate(ordered):
+            if self.deadline.expired():
+                skipped = ", ".join(pending.name for pending in ordered[position:])
+                self.logger.warning(f"已到达运行时间上限 {self.deadline.seconds} 秒，以下工作留到下次运行: {skipped}")
+                break
+            estimate = f"{item.messages} 封" if self.by == 'messages' else f"{item.size / 1048576:.1f} MB"
+            self.logger.info(f"开始: {item.name}（估计 {estimate}，{item.round_trips} 次往返）")
+            try:
+                if stage is not None:
+                    with stage(item.name):
+                        count = item.run()
+                else:
+                    count = item.run()
+            except Exception as e:
+                self.logger.error(f"{item.name} 出错: {str(e)}")
+                continue
+            if count and count > 0:
+                results.append((item.label, count))
+        return results
+
+
+class RunLock:
+    """
+    基于 fcntl.flock 的运行锁
+
+    进程退出（包括被杀死）时内核自动释放锁，不会留下需要手动删除的陈旧锁。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def acquire(self):
+        """
+        尝试获取锁，不等待
+
+        Returns:
+            bool: 是否获取成功；平台不支持 fcntl 时总是成功
+        """
+        try:
+            import fcntl
+        except ImportError:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self.fd = fd
+        return True
+
+    def holder(self):
+        """锁文件中记录的进程号"""
+        try:
+            with open(self.path, 'r') as f:
+                return f.read().strip()
+        except OSError:
+            return ''
+
+    def release(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
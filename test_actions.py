@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试批量邮件操作
+无需连接邮箱
+"""
+
+import os
+import tempfile
+
+from actions import Action, ActionError, apply_action, encode_folder, parse_rules
+from uid_set import UidSet
+
+
+class FakeMailbox:
+    """只实现 UID MOVE/COPY/STORE/EXPUNGE 的模拟连接，fail 中的区间返回 NO"""
+
+    def __init__(self, fail=()):
+        self.commands = []
+        self.expunged = False
+        self.fail = set(fail)
+
+    def uid(self, command, *args):
+        self.commands.append((command,) + args)
+        return ('NO' if args and args[0] in self.fail else 'OK'), []
+
+    def expunge(self):
+        self.expunged = True
+        return 'OK', []
+
+
+class FakeRuleMailbox(FakeMailbox):
+    """每次 SEARCH 都匹配 UID 1:3，支持 MOVE"""
+
+    def select(self, folder='INBOX', readonly=False):
+        return 'OK', [b'3']
+
+    def capability(self):
+        return 'OK', [b'IMAP4rev1 MOVE UIDPLUS']
+
+    def uid(self, command, *args):
+        if command == 'SEARCH':
+            return 'OK', [b'1 2 3']
+        return super().uid(command, *args)
+
+
+def test_actions():
+    """测试规则解析、按区间执行和结果汇总"""
+    print("测试批量邮件操作")
+    print("=" * 50)
+
+    rules = parse_rules('''
+        # 注释
+        FROM "news@example.com" OLDER_THAN 7 => move Newsletters
+        FROM "alerts@example.com" UNSEEN => flag \\Seen \\Flagged
+        SUBJECT "a => b" => copy "Archive/发票"
+        OLDER_THAN 0 => delete
+    ''')
+    assert [rule.action.kind for rule in rules] == ['move', 'flag', 'copy', 'delete']
+    assert rules[1].action.flags == ('\\Seen', '\\Flagged')
+    assert rules[2].criteria == 'SUBJECT "a => b"' and rules[2].action.folder == 'Archive/发票'
+    age = {7: 'BEFORE 13-Oct-2026', 0: 'ALL'}.get
+    assert rules[0].search_criteria(age) == 'FROM "news@example.com" BEFORE 13-Oct-2026'
+    assert rules[3].search_criteria(age) == 'ALL'
+    assert Action.parse('MOVE "My Folder"') == Action('move', folder='My Folder')
+    for bad in ('FROM x => archive', 'FROM x => move', 'FROM x => delete Trash', '=> delete', 'FROM x'):
+        try:
+            parse_rules(bad)
+        except ActionError as e:
+            print(f"格式错误: {e}")
+        else:
+            raise AssertionError(f"未报告格式错误: {bad}")
+
+    assert encode_folder('广告邮件') == '"&Xn9USpCuTvY-"'
+    assert encode_folder('A&B/发票') == '"A&-B/&U9F5aA-"'
+    assert encode_folder('Newsletters') == '"Newsletters"'
+
+    # 10万封邮件中每隔一段连续区间匹配，命令数只与区间数有关
+    uids = UidSet()
+    for start in range(1, 100000, 1000):
+        uids = uids.union(UidSet(range(start, start + 500)))
+    mailbox = FakeMailbox()
+    result = apply_action(mailbox, uids, Action.parse('move Newsletters'), {'MOVE'})
+    assert result.done == len(uids) == 50000
+    assert result.commands == len(mailbox.commands) < 20
+    assert all(command[0] == 'MOVE' and command[2] == '"Newsletters"' for command in mailbox.commands)
+    assert not mailbox.expunged
+    print(result)
+
+    # 不支持 MOVE 时复制后标记删除，支持 UIDPLUS 时只清除处理过的邮件
+    mailbox = FakeMailbox()
+    result = apply_action(mailbox, UidSet([1, 2, 3, 9]), Action.parse('move Newsletters'), {'UIDPLUS'})
+    assert [command[0] for command in mailbox.commands] == ['COPY', 'STORE', 'EXPUNGE']
+    assert mailbox.commands[1] == ('STORE', '1:3,9', '+FLAGS.SILENT', '(\\Deleted)')
+    assert mailbox.commands[2] == ('EXPUNGE', '1:3,9') and not mailbox.expunged
+
+    mailbox = FakeMailbox(fail={'1:3,9'})
+    result = apply_action(mailbox, UidSet([1, 2, 3, 9]), Action.parse('unflag \\Seen'))
+    assert mailbox.commands == [('STORE', '1:3,9', '-FLAGS.SILENT', '(\\Seen)')]
+    assert (result.done, result.failed) == (0, 4)
+
+    mailbox = FakeMailbox()
+    result = apply_action(mailbox, UidSet([5]), Action.parse('delete'), should_stop=lambda: True)
+    assert mailbox.commands == [] and result.skipped == 1 and not mailbox.expunged
+    result = apply_action(mailbox, UidSet([5, 6]), Action.parse('delete'))
+    assert result.done == 2 and mailbox.expunged
+    print(result)
+
+    # 移动、标记不计入删除数量，结果摘要单独列出
+    from clear_qq_email import QQEmailCleaner
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = os.path.join(tmp, 'email_config.ini')
+        with open(config_path, 'w', encoding='utf-8') as f:
+            f.write("[EMAIL]\nemail = a@qq.com\npassword = x\n")
+        cleaner = QQEmailCleaner(config_path)
+        cleaner.mail = FakeRuleMailbox()
+        rules = parse_rules('FROM "a" => move Newsletters\nFROM "b" => flag \\Seen\nFROM "c" => delete')
+        assert cleaner.run_action_rules(rules, dry_run=True) == {'FROM "c" => delete': 3}
+        assert cleaner.take_action_summaries() == ['[模拟] move "Newsletters": 3 封', '[模拟] flag \\Seen: 3 封']
+        assert cleaner.run_action_rules(rules[:2], dry_run=False) == {}
+        summaries = cleaner.take_action_summaries()
+        assert len(summaries) == 2 and summaries[0].startswith('move "Newsletters": 匹配 3 封，完成 3 封')
+        assert cleaner.take_action_summaries() == []
+
+    print("✅ 批量邮件操作测试通过")
+
+
+if __name__ == "__main__":
+    test_actions()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试发送人统计
+无需连接邮箱，索引和CSV写入临时目录
+"""
+
+import os
+import csv
+import time
+import calendar
+import tempfile
+
+from analytics import ANALYTICS_FETCH_ITEMS, HeaderIndex, aggregate, format_table, write_csv
+from uid_set import UidSet
+
+NOW = calendar.timegm((2026, 1, 31, 12, 0, 0))
+
+
+def days_ago(days):
+    """距 NOW 指定天数的 INTERNALDATE（UTC）"""
+    return time.strftime('%d-%b-%Y %H:%M:%S +0000', time.gmtime(NOW - days * 86400))
+
+
+# UID -> (FLAGS, RFC822.SIZE, INTERNALDATE, 邮件头)
+MESSAGES = {
+    1: (b'\\Seen', 1000, days_ago(2),
+        b'From: Shop <Deals@Shop.com>\r\nContent-Type: multipart/mixed; boundary="x"\r\n\r\n'),
+    2: (b'', 500, days_ago(60),
+        b'Content-Type: text/plain\r\nFrom: Shop <Deals@Shop.com>\r\n\r\n'),
+    3: (b'\\Seen \\Flagged', 3000, days_ago(400),
+        b'From: "News"\r\n <news@shop.com>\r\nContent-Type: application/pdf\r\n\r\n'),
+    4: (b'', 200, days_ago(20),
+        b'From: alice@qq.com\r\nContent-Type: multipart/alternative; boundary="y"\r\n\r\n'),
+    5: (b'\\Answered', 100, ' 2-Jan-2026 07:00:00 -0500',
+        b'Content-Type: text/html\r\n\r\n'),
+}
+
+
+class FakeAnalyticsMail:
+    """按 imaplib 的格式（(前缀, 字面量) 元组后跟 b')'）应答 UID FETCH 的模拟连接"""
+
+    def __init__(self):
+        self.commands = []
+
+    def uid(self, command, *args):
+        assert command == 'FETCH' and args[1] == ANALYTICS_FETCH_ITEMS
+        self.commands.append(args[0])
+        data = []
+        for seq, uid in enumerate(UidSet.parse(args[0]), 1):
+            flags, size, internaldate, header = MESSAGES[uid]
+            meta = b'%d (UID %d FLAGS (%s) RFC822.SIZE %d INTERNALDATE "%s" ' % (
+                seq, uid, flags, size, internaldate.encode())
+            data.append((meta + b'BODY[HEADER.FIELDS (FROM CONTENT-TYPE)] {%d}' % len(header), header))
+            data.append(b')')
+        return 'OK', data
+
+
+def test_analytics():
+    """测试分批扫描邮件头、发件人和附件解析、年龄分组统计，以及本地索引的保存和读取"""
+    print("测试发送人统计")
+    print("=" * 50)
+
+    mail = FakeAnalyticsMail()
+    index = HeaderIndex.scan(mail, UidSet(MESSAGES), batch_size=2)
+    assert mail.commands == ['1:2', '3:4', '5']
+    assert len(index) == 5
+
+    # 折行的 From 头和大小写不同的地址都能解析；没有 From 头时发送人为空
+    assert index.senders == ['deals@shop.com', 'deals@shop.com', 'news@shop.com', 'alice@qq.com', '']
+    assert index.senders[0] is index.senders[1]
+    assert list(index.sizes) == [1000, 500, 3000, 200, 100]
+    assert list(index.seen) == [1, 0, 1, 0, 0]
+    # multipart/mixed 和非文本单部分邮件算带附件，multipart/alternative 不算
+    assert list(index.attachments) == [1, 0, 1, 0, 0]
+    assert index.timestamps[0] == NOW - 2 * 86400
+    assert index.timestamps[4] == calendar.timegm((2026, 1, 2, 12, 0, 0))
+
+    rows = aggregate(index, 'sender', now=NOW)
+    assert [row['key'] for row in rows] == ['news@shop.com', 'deals@shop.com', 'alice@qq.com', '(未知)']
+    deals = rows[1]
+    assert (deals['count'], deals['bytes'], deals['read_ratio'], deals['attachment_ratio']) == (2, 1500, 0.5, 0.5)
+    assert deals['ages'] == [1, 0, 1, 0, 0]
+    assert rows[0]['ages'] == [0, 0, 0, 0, 1]
+    assert rows[3]['ages'] == [0, 1, 0, 0, 0]
+
+    domains = aggregate(index, 'domain', now=NOW)
+    assert [(row['key'], row['count'], row['bytes']) for row in domains] == [
+        ('shop.com', 3, 4500), ('qq.com', 1, 200), ('(未知)', 1, 100)]
+    assert domains[0]['ages'] == [1, 0, 1, 0, 1]
+
+    table = format_table(rows, top=2).splitlines()
+    assert len(table) == 4 and 'news@shop.com' in table[2] and '2.9KB' in table[2]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 保存后读取的索引统计结果不变
+        path = os.path.join(tmp, 'index.json')
+        index.save(path)
+        loaded = HeaderIndex.load(path)
+        assert loaded.senders == index.senders
+        assert aggregate(loaded, 'sender', now=NOW) == rows
+
+        csv_path = os.path.join(tmp, 'senders.csv')
+        write_csv(rows, csv_path)
+        with open(csv_path, encoding='utf-8-sig', newline='') as f:
+            lines = list(csv.reader(f))
+        assert lines[0][:3] == ['rank', 'key', 'count'] and len(lines) == len(rows) + 1
+        assert lines[2] == ['2', 'deals@shop.com', '2', '1500', '0.500', '0.500', '1', '0', '1', '0', '0']
+
+    print(f"统计 {len(index)} 封邮件，{len(rows)} 个发送人，{len(domains)} 个域名")
+    print("✅ 发送人统计测试通过")
+
+
+if __name__ == "__main__":
+    test_analytics()
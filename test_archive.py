@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试删除前归档
+无需连接邮箱，用内存中的响应代替服务器，归档写入临时目录
+"""
+
+import io
+import gzip
+import imaplib
+import tempfile
+
+from archive import MailArchiver
+from uid_set import UidSet
+
+BODIES = {
+    3: b'From: a@example.com\r\nSubject: one\r\n\r\nhello\r\n',
+    5: b'Subject: escaped\n\nFrom here on\n>From quoted\n>>From twice\nend',
+    9: b'Subject: last\r\n\r\n' + b'x' * 3000 + b'\r\n',
+}
+
+
+class ScriptedIMAP(imaplib.IMAP4):
+    """从预先写好的响应读取的 imaplib 连接，不建立网络连接"""
+
+    def __init__(self, responses):
+        self.file = io.BufferedReader(io.BytesIO(responses))
+        self.tagpre = b'T'
+        self.tagnum = 0
+        self.tagged_commands = {}
+        self._encoding = 'ascii'
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(data)
+
+
+def scripted_mail(batches):
+    """每批一条 UID FETCH 命令的响应，标签依次为 T0、T1……"""
+    responses = b''
+    for tag, uids in enumerate(batches):
+        for seq, uid in enumerate(uids, 1):
+            body = BODIES[uid]
+            responses += b'* %d FETCH (UID %d BODY[] {%d}\r\n%s)\r\n' % (seq, uid, len(body), body)
+        responses += b'T%d OK FETCH completed\r\n' % tag
+    return ScriptedIMAP(responses)
+
+
+def test_archive():
+    """测试 mbox 和 Maildir 归档的逐批写入、索引和单封恢复"""
+    print("测试删除前归档")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archiver = MailArchiver(tmp, 'me@qq.com', '已删除/Old', 'mbox', batch_size=2)
+        mail = scripted_mail([[3, 5], [9]])
+        batches = list(archiver.iter_archive(mail, UidSet(BODIES)))
+        assert batches == [UidSet([3, 5]), UidSet([9])]
+        assert mail.sent == [b'T0 UID FETCH 3,5 (UID BODY.PEEK[])\r\n', b'T1 UID FETCH 9 (UID BODY.PEEK[])\r\n']
+
+        # 每批一个 gzip 成员，索引记录成员起始偏移、成员内偏移和长度
+        with open(archiver.index_path, encoding='utf-8') as f:
+            index = [line.rstrip('\n').split('\t') for line in f]
+        assert [int(fields[0]) for fields in index] == [3, 5, 9]
+        assert index[0][1] == index[1][1] == '0' and int(index[2][1]) > 0
+        with open(archiver.path, 'rb') as raw:
+            raw.seek(int(index[2][1]))
+            member = gzip.GzipFile(fileobj=raw).read()
+        offset, length = int(index[2][2]), int(index[2][3])
+        assert member.startswith(b'From MAILER-DAEMON ') and member[offset:offset + length] == BODIES[9]
+
+        # mbox 中 "From " 行已转义，恢复时还原
+        with gzip.open(archiver.path) as f:
+            content = f.read()
+        assert b'\n>From here on\n>>From quoted\n>>>From twice\n' in content
+        for uid, body in BODIES.items():
+            assert archiver.restore(uid) == body, uid
+        assert archiver.restore(4) is None
+        print(f"mbox 归档 {len(index)} 封邮件，{len(content)} 字节")
+
+        archiver = MailArchiver(tmp, 'me@qq.com', 'INBOX', 'maildir', batch_size=5)
+        batches = list(archiver.iter_archive(scripted_mail([[3, 5, 9]]), UidSet(BODIES)))
+        assert batches == [UidSet(BODIES)]
+        for uid, body in BODIES.items():
+            assert archiver.restore(uid) == body, uid
+
+    print("✅ 删除前归档测试通过")
+
+
+if __name__ == "__main__":
+    test_archive()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 BODYSTRUCTURE 解析与正文片段解码
+无需连接邮箱
+"""
+
+import base64
+from mail_records import iter_fetch_responses
+from bodystructure import extract_bodystructure, iter_parts, has_attachment, find_text_part
+from content_rules import ContentMatcher, decode_partial_body
+
+# 模拟 imaplib 返回的FETCH数据：第一封为带PDF附件的 multipart/mixed，
+# 第二封为单部分邮件，字符集以字面量形式返回
+FETCH_DATA = [
+    b'1 (UID 7 BODYSTRUCTURE ((("TEXT" "PLAIN" ("CHARSET" "gbk") NIL NIL "BASE64" 1200 16 NIL NIL NIL)'
+    b'("TEXT" "HTML" ("CHARSET" "gbk") NIL NIL "QUOTED-PRINTABLE" 5000 80 NIL NIL NIL) "ALTERNATIVE" '
+    b'("BOUNDARY" "b1") NIL NIL)("APPLICATION" "PDF" ("NAME" "a.pdf") NIL NIL "BASE64" 30000 NIL '
+    b'("ATTACHMENT" ("FILENAME" "a.pdf")) NIL) "MIXED" ("BOUNDARY" "b0") NIL NIL))',
+    (b'2 (UID 8 BODYSTRUCTURE ("TEXT" "PLAIN" ("CHARSET" {5}', b'utf-8'),
+    b') NIL NIL "7BIT" 20 1 NIL NIL NIL))',
+    # 参数值和文件名为括号字符
+    b'3 (UID 9 BODYSTRUCTURE (("TEXT" "PLAIN" ("CHARSET" "utf-8" "X-NOTE" "(") NIL NIL "7BIT" 10 1 NIL NIL NIL)'
+    b'("APPLICATION" "OCTET-STREAM" ("NAME" ")") NIL NIL "BASE64" 40 NIL ("ATTACHMENT" ("FILENAME" "(")) NIL) '
+    b'"MIXED" ("BOUNDARY" "b2") NIL NIL))',
+]
+
+
+def test_bodystructure():
+    """测试结构解析、附件判断和正文定位"""
+    print("测试 BODYSTRUCTURE 解析")
+    print("=" * 50)
+
+    structures = [extract_bodystructure(meta, literals) for meta, literals in iter_fetch_responses(FETCH_DATA)]
+
+    mixed, single, parens = structures
+    assert [section for section, _ in iter_parts(mixed)] == ['1.1', '1.2', '2']
+    assert has_attachment(mixed)
+    assert find_text_part(mixed) == ('1.1', 'plain', 'gbk', 'base64')
+
+    assert not has_attachment(single)
+    assert find_text_part(single) == ('1', 'plain', 'utf-8', '7bit')
+
+    assert [section for section, _ in iter_parts(parens)] == ['1', '2']
+    assert parens[0][2] == ['CHARSET', 'utf-8', 'X-NOTE', '(']
+    assert parens[1][2] == ['NAME', ')'] and parens[1][8] == ['ATTACHMENT', ['FILENAME', '(']]
+    assert has_attachment(parens) and parens[-4] == 'MIXED'
+
+    # 截断的base64片段只解码完整分组
+    encoded = base64.b64encode('点击这里退订邮件'.encode('gbk'))[:-3]
+    text = decode_partial_body(encoded, 'base64', 'gbk')
+    print(f"解码结果: {text}")
+    assert text.startswith('点击这里退订')
+
+    matcher = ContentMatcher.from_config("退订\nUNSUBSCRIBE")
+    assert matcher.search(text) == '退订'
+    assert matcher.search('click to unsubscribe') == 'unsubscribe'
+    assert matcher.search('普通邮件') is None
+    assert not ContentMatcher.from_config('')
+
+    print("✅ BODYSTRUCTURE 解析测试通过")
+
+
+if __name__ == "__main__":
+    test_bodystructure()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试常驻进程的IMAP IDLE
+无需连接邮箱，用本机套接字对模拟服务器
+"""
+
+import time
+import socket
+import imaplib
+import threading
+
+from daemon_cleaner import imap_idle
+
+
+def make_connection(sock):
+    """构造使用给定套接字、不经过问候和登录的 imaplib 连接"""
+    mail = imaplib.IMAP4.__new__(imaplib.IMAP4)
+    mail.sock = sock
+    mail.file = sock.makefile('rb')
+    mail.tagpre = b'A'
+    mail.tagnum = 1
+    mail.tagged_commands = {}
+    mail._encoding = 'ascii'
+    return mail
+
+
+def serve_idle(server, first_write):
+    """应答一次 IDLE：first_write 一次写出（同一个TCP段），收到 DONE 后返回完成响应"""
+    data = b''
+    while b'IDLE\r\n' not in data:
+        data += server.recv(1024)
+    tag = data.split(b' ')[0]
+    server.sendall(first_write)
+    while b'DONE\r\n' not in data:
+        data += server.recv(1024)
+    server.sendall(tag + b' OK IDLE terminated\r\n')
+
+
+def test_daemon_cleaner():
+    """测试与 IDLE 确认同时到达、已在读取缓冲区中的 EXISTS 不用等到超时"""
+    print("测试常驻进程的IMAP IDLE")
+    print("=" * 50)
+
+    for first_write, expected in (
+            (b'+ idling\r\n* 3 EXISTS\r\n', [b'* 3 EXISTS']),
+            (b'+ idling\r\n* 2 RECENT\r\n* 3 EXISTS\r\n', [b'* 2 RECENT', b'* 3 EXISTS'])):
+        client, server = socket.socketpair()
+        mail = make_connection(client)
+        thread = threading.Thread(target=serve_idle, args=(server, first_write), daemon=True)
+        thread.start()
+        started = time.monotonic()
+        responses = imap_idle(mail, 5)
+        elapsed = time.monotonic() - started
+        thread.join(5)
+        assert responses == expected, responses
+        assert elapsed < 1, f"缓冲区中已有 EXISTS，却等待了 {elapsed:.1f} 秒"
+        assert mail.tagged_commands == {}
+        assert client.gettimeout() is None
+        client.close()
+        server.close()
+
+    # 没有推送时按超时结束
+    client, server = socket.socketpair()
+    mail = make_connection(client)
+    thread = threading.Thread(target=serve_idle, args=(server, b'+ idling\r\n'), daemon=True)
+    thread.start()
+    started = time.monotonic()
+    assert imap_idle(mail, 0.3) == []
+    assert time.monotonic() - started >= 0.3
+    thread.join(5)
+    client.close()
+    server.close()
+
+    print("✅ 常驻进程的IMAP IDLE测试通过")
+
+
+if __name__ == "__main__":
+    test_daemon_cleaner()
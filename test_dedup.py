@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试重复邮件检测
+无需连接邮箱
+"""
+
+from dedup import message_fingerprint, DuplicateFinder
+from uid_set import UidSet
+
+
+class FakeFolderMail:
+    """
+    只实现 UID SEARCH/FETCH 的模拟连接，headers 为 UID -> (邮件头, 大小)
+
+    message_ids 为 UID -> X-GM-MSGID 时模拟 Gmail 的标签文件夹
+    """
+
+    def __init__(self, headers, message_ids=None):
+        self.headers = headers
+        self.message_ids = message_ids
+
+    def uid(self, command, *args):
+        if command == 'SEARCH':
+            return 'OK', [' '.join(str(uid) for uid in self.headers).encode()]
+        data = []
+        # 倒序返回，检查按UID保留最早的一封
+        for uid in sorted(UidSet.parse(args[0]), reverse=True):
+            header, size = self.headers[uid]
+            gm = f'X-GM-MSGID {self.message_ids[uid]} ' if self.message_ids and 'X-GM-MSGID' in args[1] else ''
+            meta = f'{uid} (UID {uid} {gm}RFC822.SIZE {size} BODY[HEADER.FIELDS (MESSAGE-ID FROM DATE SUBJECT)] {{{len(header)}}}'
+            data.append((meta.encode(), header))
+            data.append(b')')
+        return 'OK', data
+
+
+def test_dedup():
+    """测试指纹计算和跨文件夹查找"""
+    print("测试重复邮件检测")
+    print("=" * 50)
+
+    header = b'Message-ID: <ABC@example.com>\r\nSubject: hi\r\n\r\n'
+    assert message_fingerprint(header, 100) == message_fingerprint(b'Message-ID: <abc@example.com>\r\n\r\n', 100)
+    assert message_fingerprint(header, 100) != message_fingerprint(header, 101)
+    no_id = b'From: a@example.com\r\nDate: Mon, 1 Jan 2024 00:00:00 +0000\r\nSubject: hi\r\n\r\n'
+    assert message_fingerprint(no_id, 100) is not None
+    assert message_fingerprint(b'\r\n', 100) is None
+
+    inbox = {uid: (b'Message-ID: <%d@example.com>\r\n\r\n' % (uid % 3), 100) for uid in range(1, 10)}
+    archive = {1: (b'Message-ID: <1@example.com>\r\n\r\n', 100), 2: (b'Message-ID: <9@example.com>\r\n\r\n', 100)}
+
+    finder = DuplicateFinder(FakeFolderMail(inbox), batch_size=4)
+    duplicates = finder.scan_folder('INBOX')
+    print(f"INBOX 重复: {duplicates}")
+    assert list(duplicates) == [4, 5, 6, 7, 8, 9]
+
+    finder.mail = FakeFolderMail(archive)
+    duplicates = finder.scan_folder('Archive')
+    print(f"Archive 重复: {duplicates}")
+    assert list(duplicates) == [1]
+    assert finder.scanned == 11
+
+    # Gmail: 同一封邮件出现在 INBOX 和标签文件夹中，不是重复邮件；
+    # 只有 X-GM-MSGID 不同而内容相同的邮件才算重复
+    header = b'Message-ID: <same@example.com>\r\n\r\n'
+    gmail_inbox = FakeFolderMail({1: (header, 100), 2: (b'Message-ID: <other@example.com>\r\n\r\n', 100)},
+                                 {1: 1001, 2: 1002})
+    gmail_label = FakeFolderMail({7: (header, 100), 8: (header, 100)}, {7: 1001, 8: 1003})
+    finder = DuplicateFinder(gmail_inbox, gmail=True)
+    assert not finder.scan_folder('INBOX')
+    finder.mail = gmail_label
+    duplicates = finder.scan_folder('Work')
+    print(f"Gmail 标签文件夹重复: {duplicates}")
+    assert list(duplicates) == [8]
+    # 不识别 Gmail 时同一封邮件的另一个标签会被当作重复
+    finder = DuplicateFinder(gmail_inbox)
+    finder.scan_folder('INBOX')
+    finder.mail = gmail_label
+    assert list(finder.scan_folder('Work')) == [7, 8]
+
+    print("✅ 重复邮件检测测试通过")
+
+
+if __name__ == "__main__":
+    test_dedup()
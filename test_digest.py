@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试通知汇总暂存文件
+无需连接邮箱，用线程模拟同时追加和汇总的进程（flock 对每次 open 独立加锁）
+"""
+
+import os
+import time
+import tempfile
+import threading
+
+import notifier
+from digest import NotificationDigest
+from notifier import NotificationChannel
+
+
+class FakeChannel(NotificationChannel):
+    """记录收到的通知，fail 为 True 时每次发送都失败"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.sent = []
+
+    @property
+    def key(self):
+        return (self.name, id(self))
+
+    def send(self, title, body):
+        if self.fail:
+            raise RuntimeError("发送失败")
+        self.sent.append(title)
+
+
+def test_digest():
+    """测试追加与取出互斥，取出时正在等待的追加不会丢失"""
+    print("测试通知汇总暂存文件")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'spool.jsonl')
+        digest = NotificationDigest(path)
+        digest.record('a@qq.com', 3, {'x@example.com': 3})
+        assert oct(os.stat(path).st_mode & 0o777) == '0o600'
+
+        # 追加的进程已打开暂存文件并在等锁时，文件被改名取走：追加应写入新的暂存文件
+        fd = digest._open_locked(os.O_RDONLY)
+        writer = threading.Thread(target=digest.record, args=('b@qq.com', 5, {}))
+        writer.start()
+        time.sleep(0.2)
+        os.replace(path, path + '.taken')
+        os.close(fd)
+        writer.join(5)
+        assert [entry['account'] for entry in digest.load(path + '.taken')] == ['a@qq.com']
+        assert [entry['account'] for entry in digest.load()] == ['b@qq.com']
+
+        # 追加进行中时 take() 等待写完，取出的记录包含这一条
+        fd = digest._open_locked(os.O_WRONLY | os.O_APPEND)
+        taken = []
+        flusher = threading.Thread(target=lambda: taken.extend(digest.take()))
+        flusher.start()
+        time.sleep(0.2)
+        os.write(fd, b'{"time": 0, "account": "c@qq.com", "total_deleted": 1, "counts": {}}\n')
+        os.close(fd)
+        flusher.join(5)
+        assert [entry['account'] for entry in taken] == ['b@qq.com', 'c@qq.com']
+        assert digest.take() == [] and not os.path.exists(path)
+
+        # 多个线程同时追加和取出，记录不丢失也不重复
+        def append(n):
+            for i in range(50):
+                digest.record(f'{n}@qq.com', i, {})
+        writers = [threading.Thread(target=append, args=(n,)) for n in range(4)]
+        collected = []
+        for thread in writers:
+            thread.start()
+        while any(thread.is_alive() for thread in writers):
+            collected.extend(digest.take())
+        collected.extend(digest.take())
+        assert len(collected) == 200
+        assert len({(entry['account'], entry['total_deleted']) for entry in collected}) == 200
+        print(f"并发追加 {len(collected)} 条记录，全部取出")
+
+        # 没有删除邮件的运行也按时间窗口发送汇总；全部渠道发送失败时记录写回暂存文件
+        from clear_qq_email import QQEmailCleaner
+        config_path = os.path.join(tmp, 'email_config.ini')
+        with open(config_path, 'w', encoding='utf-8') as f:
+            f.write(f"[EMAIL]\nemail = a@qq.com\npassword = x\nnotification_digest = True\n"
+                    f"digest_interval_hours = 24\ndigest_spool = {path}\nasync_notification = False\n")
+        cleaner = QQEmailCleaner(config_path)
+        notifier.get_dispatcher().backoff = 0
+        digest.record('a@qq.com', 2, {'x@example.com': 2})
+        assert not cleaner.flush_digest([FakeChannel()])
+        digest.restore([{'time': int(time.time()) - 2 * 86400, 'account': 'd@qq.com', 'total_deleted': 7, 'counts': {}}])
+        assert cleaner.flush_digest([FakeChannel(fail=True)])
+        assert sorted(entry['account'] for entry in digest.load()) == ['a@qq.com', 'd@qq.com']
+        channel = FakeChannel()
+        assert cleaner.flush_digest([FakeChannel(fail=True), channel])
+        assert channel.sent and '共 9 封' in channel.sent[0] and not os.path.exists(path)
+
+        # 后台发送时在全部渠道结束后写回
+        cleaner.config['EMAIL']['async_notification'] = 'True'
+        digest.restore([{'time': 0, 'account': 'e@qq.com', 'total_deleted': 1, 'counts': {}}])
+        assert cleaner.flush_digest([FakeChannel(fail=True), FakeChannel(fail=True)])
+        assert notifier.shutdown_dispatcher(10)
+        assert [entry['account'] for entry in digest.load()] == ['e@qq.com']
+
+    print("✅ 通知汇总暂存文件测试通过")
+
+
+if __name__ == "__main__":
+    test_digest()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试分布式清理的租约队列
+无需连接邮箱，使用临时目录中的 SQLite 数据库
+"""
+
+import os
+import time
+import tempfile
+
+from distributed import WorkQueue, unit_plan_path
+
+
+def test_distributed():
+    """测试领取、租约过期后重新领取、续约、并发上限和失败重试"""
+    print("测试分布式清理的租约队列")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = WorkQueue(os.path.join(tmp, 'queue.db'), max_attempts=2, retry_delay=0)
+        queue.enqueue('a.ini', 'INBOX', 'qq')
+        queue.enqueue('a.ini', 'Spam', 'qq')
+        queue.enqueue('b.ini', 'INBOX', '163')
+        queue.set_cap('qq', 1)
+
+        # qq 的并发上限为 1：领取一个 qq 单元后只能再领取 163 的单元
+        first = queue.claim('w1')
+        assert (first['config_path'], first['folder'], first['attempts']) == ('a.ini', 'INBOX', 1)
+        second = queue.claim('w2')
+        assert second['provider'] == '163'
+        assert queue.claim('w3') is None
+
+        # 完成后释放并发名额
+        queue.complete(second['id'], 'w2', {'deleted': 4})
+        queue.complete(first['id'], 'w1', {'deleted': 2})
+        third = queue.claim('w2', lease_seconds=-1)
+        assert third['folder'] == 'Spam'
+
+        # 租约过期未续约：其他工作进程重新领取，原进程不能再续约或上报
+        reclaimed = queue.claim('w3')
+        assert reclaimed['id'] == third['id'] and reclaimed['attempts'] == 2
+        assert not queue.renew(third['id'], 'w2')
+        assert queue.renew(reclaimed['id'], 'w3')
+        queue.complete(third['id'], 'w2', {'deleted': 9})
+        assert queue.stats()['units'] == {'done': 2, 'leased': 1}
+
+        # 失败时未超过最多执行次数则重新排队，否则标记为失败
+        queue.complete(reclaimed['id'], 'w3', {'deleted': 0, 'error': 'x'}, success=False)
+        assert queue.stats()['units'] == {'done': 2, 'failed': 1}
+        queue.enqueue('a.ini', 'Spam', 'qq')
+        retry = queue.claim('w1')
+        assert retry['attempts'] == 1
+        queue.complete(retry['id'], 'w1', {'deleted': 0}, success=False)
+        time.sleep(0.01)
+        assert queue.claim('w1')['attempts'] == 2
+
+        workers = {worker['worker_id']: worker for worker in queue.stats()['workers']}
+        assert workers['w2']['units_done'] == 2 and workers['w2']['deleted'] == 4 + 9
+        assert workers['w3']['units_failed'] == 1
+        assert queue.pending_configs() == []
+
+    assert unit_plan_path('deletion_plan.json', 'a@qq.com', 'INBOX') == 'deletion_plan.a_qq.com.INBOX.json'
+    assert unit_plan_path('plans/p', 'a@qq.com', '已发送/2024') == 'plans/p.a_qq.com._2024.json'
+
+    print("✅ 分布式清理的租约队列测试通过")
+
+
+if __name__ == "__main__":
+    test_distributed()
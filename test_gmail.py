@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 Gmail 快速路径
+无需连接邮箱
+"""
+
+import os
+import logging
+import tempfile
+
+import metrics
+from gmail import build_query, quote, find_trash_folder, move_to_trash, DEFAULT_TRASH
+from uid_set import UidSet
+
+
+class FakeGmail:
+    """只实现 LIST 和 UID MOVE/COPY/STORE 的模拟连接"""
+
+    def __init__(self, folders):
+        self.folders = folders
+        self.commands = []
+        self.expunged = False
+
+    def list(self):
+        return 'OK', self.folders
+
+    def uid(self, command, *args):
+        self.commands.append((command,) + args)
+        if command == 'SEARCH':
+            return 'OK', [b'1 2 3 7']
+        return 'OK', []
+
+    def expunge(self):
+        self.expunged = True
+        return 'OK', []
+
+
+def test_gmail():
+    """测试搜索语句生成、垃圾箱查找和按区间移动"""
+    print("测试 Gmail 快速路径")
+    print("=" * 50)
+
+    query = build_query(sender='news@example.com', days_before_delete=3, read=True, has_attachment=False)
+    print(f"搜索语句: {query}")
+    assert query == 'from:(news@example.com) older_than:3d is:read -has:attachment'
+    assert build_query(days_before_delete=0, read=False) == 'is:unread'
+    assert quote('a "b" \\c') == '"a \\"b\\" \\\\c"'
+
+    localized = FakeGmail([b'(\\HasNoChildren) "/" "INBOX"',
+                           b'(\\HasNoChildren \\Trash) "/" "[Gmail]/&XfJSIJZkkK5O9g-"'])
+    assert find_trash_folder(localized) == '"[Gmail]/&XfJSIJZkkK5O9g-"'
+    assert find_trash_folder(FakeGmail([b'(\\HasNoChildren) "/" "INBOX"'])) == DEFAULT_TRASH
+
+    uids = UidSet(list(range(1, 1001)) + [5000])
+    assert move_to_trash(localized, uids, DEFAULT_TRASH) == 1001
+    assert localized.commands == [('MOVE', '1:1000,5000', DEFAULT_TRASH)]
+    assert not localized.expunged
+
+    # 不支持 MOVE 时复制后标记删除，最后 EXPUNGE 一次
+    no_move = FakeGmail([])
+    assert move_to_trash(no_move, UidSet([1, 2, 3]), DEFAULT_TRASH, can_move=False) == 3
+    assert [command[0] for command in no_move.commands] == ['COPY', 'STORE']
+    assert no_move.expunged
+
+    # X-GM-RAW 由服务器筛选：不计入扫描数，按UID区间记录每次删除
+    from clear_qq_email import QQEmailCleaner
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = os.path.join(tmp, 'email_config.ini')
+        with open(config_path, 'w', encoding='utf-8') as f:
+            f.write("[EMAIL]\nemail = a@gmail.com\npassword = x\nemail_type = gmail\n")
+        cleaner = QQEmailCleaner(config_path)
+        cleaner.mail = FakeGmail([])
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        cleaner.logger.addHandler(handler)
+        try:
+            before = metrics.current().snapshot()['messages']
+            assert cleaner.delete_gmail_matches(query, dry_run=True, rule='target_senders') == 4
+            after = metrics.current().snapshot()['messages']
+        finally:
+            cleaner.logger.removeHandler(handler)
+        assert after['scanned'] == before['scanned'] and after['matched'] == before['matched'] + 4
+        audit = [record.fields for record in records if record.getMessage() == '[模拟删除]']
+        assert audit == [{'folder': 'INBOX', 'uids': '1:3,7', 'query': query}], audit
+
+    print("✅ Gmail 快速路径测试通过")
+
+
+if __name__ == "__main__":
+    test_gmail()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试IMAP连接复用
+无需连接邮箱，预热池中放入不经过握手构造的连接
+"""
+
+import io
+import time
+import threading
+
+import imap_connection
+from imap_connection import ResumableIMAP4_SSL
+
+
+class FakeSSLSocket:
+    """只提供 session 和关闭方法的模拟 SSL 套接字"""
+
+    def __init__(self):
+        self.session = object()
+        self.closed = False
+
+    def shutdown(self, how):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def make_connection(host, port, age):
+    """构造一个已存在 age 秒的连接，不建立网络连接"""
+    conn = ResumableIMAP4_SSL.__new__(ResumableIMAP4_SSL)
+    conn.host, conn.port = host, port
+    conn.sock = FakeSSLSocket()
+    conn.file = io.BytesIO()
+    conn.counted = False
+    conn.session_reused = False
+    conn.opened_at = time.monotonic() - age
+    return conn
+
+
+def test_imap_connection():
+    """测试预热池跳过并关闭过期连接，关闭时保存会话不会与取连接互相等待"""
+    print("测试IMAP连接复用")
+    print("=" * 50)
+
+    endpoint = ('imap.example.com', 993)
+    fresh = make_connection(*endpoint, 0)
+    expired = make_connection(*endpoint, imap_connection.WARM_CONNECTION_TTL + 5)
+    imap_connection._warm_pool[endpoint] = [fresh, expired]
+
+    result = []
+    worker = threading.Thread(target=lambda: result.append(imap_connection.connect(*endpoint)), daemon=True)
+    worker.start()
+    worker.join(5)
+    assert not worker.is_alive(), "取过期的预热连接时卡住"
+    assert result == [fresh]
+    assert expired.sock.closed and not fresh.sock.closed
+    assert imap_connection._sessions[endpoint] is expired.sock.session
+    assert imap_connection._warm_pool[endpoint] == []
+
+    imap_connection._warm_pool[endpoint] = [make_connection(*endpoint, 0)]
+    imap_connection.close_warm_connections()
+    assert imap_connection._warm_pool == {}
+    imap_connection._sessions.clear()
+
+    print("✅ IMAP连接复用测试通过")
+
+
+if __name__ == "__main__":
+    test_imap_connection()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试IMAP会话录制与回放
+无需连接邮箱，录制时用内存中的响应代替服务器，回放服务器监听本机随机端口
+"""
+
+import os
+import email
+import socket
+import imaplib
+import tempfile
+import threading
+
+from imap_replay import Anonymizer, Transcript, ReplayServer, start_recording
+from imap_stream import iter_uid_fetch
+
+MESSAGE = (b'From: =?UTF-8?B?5byg5LiJ?= <zhangsan@company.com>\r\n'
+           b'Subject: =?UTF-8?B?5Lya6K6u6YCa55+l?=\r\n'
+           b'Date: Mon, 01 Jan 2024 08:00:00 +0800\r\n'
+           b'MIME-Version: 1.0\r\n'
+           b'Content-Type: multipart/mixed; boundary="----=_Part_42"\r\n'
+           b'\r\n'
+           b'------=_Part_42\r\n'
+           b'Content-Type: text/plain; charset=utf-8\r\n'
+           b'\r\n' +
+           '明天下午开会 Quarterly budget review\r\n'.encode('utf-8') +
+           b'------=_Part_42\r\n'
+           b'Content-Type: application/pdf; name="budget.pdf"\r\n'
+           b'Content-Disposition: attachment; filename="budget.pdf"\r\n'
+           b'Content-Transfer-Encoding: base64\r\n'
+           b'\r\n'
+           b'JVBERi0xLjQK\r\n'
+           b'------=_Part_42--\r\n')
+
+
+class ScriptedServer:
+    """按顺序应答每条命令的本机IMAP服务器，应答中的 @TAG@ 替换为命令的标签"""
+
+    def __init__(self, replies):
+        self.sock = socket.create_server(('127.0.0.1', 0))
+        self.address = self.sock.getsockname()
+        self.replies = replies
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        conn, _ = self.sock.accept()
+        with conn, conn.makefile('rb') as f:
+            conn.sendall(b'* OK QQ IMAP ready\r\n')
+            for reply in self.replies:
+                line = f.readline()
+                if not line:
+                    break
+                conn.sendall(reply.replace(b'@TAG@', line.split(b' ', 1)[0]))
+        self.sock.close()
+
+
+def fetch_response(seq, uid, body):
+    return b'* %d FETCH (UID %d BODY[] {%d}\r\n%s)\r\n' % (seq, uid, len(body), body)
+
+
+def test_imap_replay():
+    """测试匿名化、录制和按不同批次回放"""
+    print("测试IMAP会话录制与回放")
+    print("=" * 50)
+
+    anonymizer = Anonymizer(b'k' * 32)
+    scrubbed = anonymizer.content(MESSAGE)
+    assert len(scrubbed) == len(MESSAGE)
+    assert b'zhangsan' not in scrubbed and b'company' not in scrubbed and b'budget' not in scrubbed
+    assert b'Quarterly' not in scrubbed and '明天'.encode('utf-8') not in scrubbed
+    assert anonymizer.address(b'zhangsan@company.com') in scrubbed
+    # MIME 结构保持不变，附件仍能识别
+    parsed = email.message_from_bytes(scrubbed)
+    assert parsed.get_content_type() == 'multipart/mixed'
+    parts = [part.get_content_disposition() for part in parsed.walk()]
+    assert 'attachment' in parts, parts
+    assert anonymizer.client(b'T1 LOGIN me@qq.com secret\r\n') == b'T1 LOGIN "user" "password"\r\n'
+    assert anonymizer.client(b'T2 UID SEARCH FROM "zhangsan@company.com"\r\n') == (
+        b'T2 UID SEARCH FROM "' + anonymizer.address(b'zhangsan@company.com') + b'"\r\n')
+    # 搜索词替换，搜索关键字、日期和 Gmail 搜索运算符保持不变；其他命令的文件夹名不变
+    command = b'T3 UID SEARCH SUBJECT "invoice" BEFORE 01-Jan-2024 NOT FROM budget\r\n'
+    scrubbed = anonymizer.client(command)
+    assert len(scrubbed) == len(command) and b'invoice' not in scrubbed and b'budget' not in scrubbed
+    assert scrubbed.startswith(b'T3 UID SEARCH SUBJECT "') and b'" BEFORE 01-Jan-2024 NOT FROM ' in scrubbed
+    scrubbed = anonymizer.client(b'T4 UID SEARCH X-GM-RAW "from:(zhangsan@company.com) older_than:7d budget"\r\n')
+    assert b'budget' not in scrubbed and b'zhangsan' not in scrubbed
+    assert b'X-GM-RAW "from:(' + anonymizer.address(b'zhangsan@company.com') + b') older_than:' in scrubbed
+    assert anonymizer.client(b'T5 UID MOVE 1:3 "Newsletters"\r\n') == b'T5 UID MOVE 1:3 "Newsletters"\r\n'
+    print(f"匿名化后: {scrubbed[:60]!r}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'imap_transcript.jsonl')
+        bodies = {uid: MESSAGE.replace(b'42', b'%d' % uid) for uid in (3, 5, 9)}
+        server = ScriptedServer([
+            b'* CAPABILITY IMAP4rev1 IDLE\r\n@TAG@ OK CAPABILITY completed\r\n',
+            b'@TAG@ OK LOGIN completed\r\n',
+            b'* 3 EXISTS\r\n@TAG@ OK [READ-WRITE] SELECT completed\r\n',
+            b'* SEARCH 3 5 9\r\n@TAG@ OK SEARCH completed\r\n',
+            b''.join(fetch_response(i + 1, uid, body) for i, (uid, body) in enumerate(bodies.items()))
+            + b'@TAG@ OK FETCH completed\r\n',
+            b'* BYE\r\n@TAG@ OK LOGOUT completed\r\n',
+        ])
+        mail = imaplib.IMAP4(*server.address)
+        start_recording(mail, path, 'imap.qq.com:993', ['zhangsan@company.com'])
+        mail.login('me@qq.com', 'secret')
+        mail.select('INBOX')
+        mail.uid('SEARCH', None, 'FROM "zhangsan@company.com"')
+        recorded = [bytes(literals[0]) for _, literals in iter_uid_fetch(mail, '3,5,9', '(UID BODY.PEEK[])')]
+        mail.logout()
+        assert [len(body) for body in recorded] == [len(body) for body in bodies.values()]
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        assert 'secret' not in text and 'zhangsan' not in text and 'me@qq.com' not in text
+        assert oct(os.stat(path + '.key').st_mode & 0o777) == '0o600'
+
+        transcript = Transcript.load(path)
+        assert transcript.sessions[0]['senders'] == [anonymizer_for(path).address(b'zhangsan@company.com').decode()]
+        server = ReplayServer(transcript, latency_scale=0).start()
+        try:
+            client = imaplib.IMAP4(*server.address)
+            client.login('anyone', 'anything')
+            assert client.select('INBOX')[1] == [b'3']
+            sender = transcript.sessions[0]['senders'][0]
+            status, data = client.uid('SEARCH', None, f'FROM "{sender}"')
+            assert data == [b'3 5 9']
+            # 与录制时相同的命令原样应答，分批不同时按UID拼出应答
+            whole = [bytes(literals[0]) for _, literals in iter_uid_fetch(client, '3,5,9', '(UID BODY.PEEK[])')]
+            split = [bytes(literals[0]) for uids in ('3', '4:9')
+                     for _, literals in iter_uid_fetch(client, uids, '(UID BODY.PEEK[])')]
+            assert whole == split and len(whole) == 3
+            assert client.uid('STORE', '3:9', '+FLAGS', '\\Deleted')[0] == 'OK'
+            client.logout()
+        finally:
+            server.stop()
+        print(f"回放 {server.commands} 条命令，发送 {server.bytes_sent} 字节")
+
+    print("✅ IMAP会话录制与回放测试通过")
+
+
+def anonymizer_for(path):
+    from imap_replay import load_key
+    return Anonymizer(load_key(path))
+
+
+if __name__ == "__main__":
+    test_imap_replay()
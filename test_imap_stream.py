@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试流式 FETCH 响应解析
+无需连接邮箱，用内存中的响应代替服务器
+"""
+
+import io
+import imaplib
+
+from imap_stream import FetchBuffer, FetchError, iter_uid_fetch
+from mail_records import iter_fetch_responses
+
+
+class ScriptedIMAP(imaplib.IMAP4):
+    """从预先写好的响应读取的 imaplib 连接，不建立网络连接"""
+
+    def __init__(self, responses):
+        self.file = io.BufferedReader(io.BytesIO(responses))
+        self.tagpre = b'T'
+        self.tagnum = 0
+        self.tagged_commands = {}
+        self._encoding = 'ascii'
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(data)
+
+
+def fetch_response(seq, uid, body):
+    return b'* %d FETCH (UID %d BODY[] {%d}\r\n%s FLAGS (\\Seen))\r\n' % (seq, uid, len(body), body)
+
+
+def test_imap_stream():
+    """测试逐封解析、缓冲区扩容、提前结束和错误响应"""
+    print("测试流式 FETCH 响应解析")
+    print("=" * 50)
+
+    bodies = {1: b'Subject: a\r\n\r\nhello', 2: b'Subject: b\r\n\r\n' + b'x' * 5000, 3: b''}
+    responses = (fetch_response(1, 1, bodies[1])
+                 + b'* 9 EXISTS\r\n'
+                 + fetch_response(2, 2, bodies[2])
+                 + fetch_response(3, 3, bodies[3])
+                 + b'T0 OK FETCH completed\r\n'
+                 + b'T1 OK FETCH completed\r\n')
+    mail = ScriptedIMAP(responses)
+
+    # 缓冲区小于邮件时自动换成更大的缓冲区
+    buffer = FetchBuffer(16)
+    messages = [(meta, [bytes(literal) for literal in literals])
+                for meta, literals in iter_uid_fetch(mail, '1:3', '(UID BODY.PEEK[])', buffer)]
+    assert mail.sent == [b'T0 UID FETCH 1:3 (UID BODY.PEEK[])\r\n']
+    assert mail.tagged_commands == {}
+    imaplib_style = [(b'%d (UID %d BODY[] {%d}' % (uid, uid, len(body)), body) for uid, body in bodies.items()]
+    expected = list(iter_fetch_responses([item for pair in imaplib_style for item in (pair, b' FLAGS (\\Seen))')]))
+    assert messages == expected, messages
+    assert len(buffer.data) >= 5000
+    print(f"解析 {len(messages)} 封邮件，缓冲区 {len(buffer.data)} 字节")
+
+    # 下一条命令的响应仍能正常读取
+    assert list(iter_uid_fetch(mail, '4', '(UID BODY.PEEK[])')) == []
+
+    # 提前结束迭代时读完剩余响应
+    mail = ScriptedIMAP(fetch_response(1, 1, b'a') + fetch_response(2, 2, b'b') + b'T0 OK done\r\n'
+                        + fetch_response(1, 5, b'c') + b'T1 OK done\r\n')
+    for meta, literals in iter_uid_fetch(mail, '1:2', '(UID BODY.PEEK[])'):
+        break
+    assert [bytes(literals[0]) for _, literals in iter_uid_fetch(mail, '5', '(UID BODY.PEEK[])')] == [b'c']
+
+    mail = ScriptedIMAP(b'T0 NO [SERVERBUG] failed\r\n')
+    try:
+        list(iter_uid_fetch(mail, '1', '(UID BODY.PEEK[])'))
+        assert False, "NO 响应应抛出 FetchError"
+    except FetchError as e:
+        print(f"错误响应: {e}")
+
+    print("✅ 流式 FETCH 响应解析测试通过")
+
+
+if __name__ == "__main__":
+    test_imap_stream()
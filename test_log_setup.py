@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试日志配置
+无需连接邮箱，日志写入临时目录
+"""
+
+import os
+import json
+import logging
+import tempfile
+
+import log_setup
+
+
+def test_log_setup():
+    """测试从配置文件读取日志设置，以及 JSON 格式中异常堆栈单独写入 exc 字段"""
+    print("测试日志配置")
+    print("=" * 50)
+
+    # 其他测试创建的清理器可能已配置过日志
+    log_setup.shutdown_logging()
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = os.path.join(tmp, 'email_config.ini')
+        with open(config_path, 'w', encoding='utf-8') as f:
+            f.write("[EMAIL]\nlog_format = json\nlog_max_bytes = 2048\nlog_backup_count = 2\n")
+        options = log_setup.config_file_options(config_path)
+        assert options == {'log_format': 'json', 'max_bytes': 2048, 'backup_count': 2}
+        assert log_setup.config_file_options(os.path.join(tmp, 'missing.ini')) == {}
+
+        log_path = os.path.join(tmp, 'test.log')
+        console = open(os.devnull, 'w')
+        log_setup.setup_logging(log_path, stream=console, **options)
+        assert log_setup._listener.handlers[0].maxBytes == 2048
+        logger = logging.getLogger('test_log_setup')
+        try:
+            raise ValueError("坏数据")
+        except ValueError:
+            logger.exception("处理 %s 失败", 'a@qq.com')
+        log_setup.log_event(logger, "[删除]", uid=7)
+        log_setup.shutdown_logging()
+        console.close()
+
+        with open(log_path, encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f]
+        assert entries[0]['msg'] == "处理 a@qq.com 失败"
+        assert entries[0]['exc'].startswith('Traceback') and 'ValueError: 坏数据' in entries[0]['exc']
+        assert entries[1]['msg'] == "[删除]" and entries[1]['uid'] == 7 and 'exc' not in entries[1]
+
+    print("✅ 日志配置测试通过")
+
+
+if __name__ == "__main__":
+    test_log_setup()
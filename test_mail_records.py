@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试邮件元数据批次的解析与筛选
+无需连接邮箱
+"""
+
+import time
+from mail_records import MailBatch, FLAG_SEEN, FLAG_FLAGGED, UNKNOWN_TIMESTAMP
+
+# 模拟 imaplib 返回的FETCH数据（第二封邮件的FLAGS位于邮件头之后）
+FETCH_DATA = [
+    (b'1 (UID 101 FLAGS (\\Seen) RFC822.SIZE 2048 BODY[HEADER.FIELDS (FROM SUBJECT DATE)] {91}',
+     b'From: =?utf-8?b?5rWL6K+V?= <A@Example.com>\r\nSubject: =?utf-8?b?5rWL6K+V?=\r\n'
+     b'Date: Mon, 1 Jan 2024 10:00:00 +0800\r\n\r\n'),
+    b')',
+    (b'2 (UID 102 RFC822.SIZE 10 INTERNALDATE "01-Jan-2024 10:00:00 +0800" '
+     b'BODY[HEADER.FIELDS (FROM SUBJECT DATE)] {17}', b'From: b@x.com\r\n\r\n'),
+    b' FLAGS (\\Flagged \\Seen))',
+    b'3 (UID 103 FLAGS () RFC822.SIZE 5)',
+]
+
+
+def test_mail_records():
+    """测试FETCH响应解析与批量筛选"""
+    print("测试邮件元数据批次")
+    print("=" * 50)
+
+    batch = MailBatch.from_fetch_response(FETCH_DATA)
+    print(f"解析结果: {list(batch)}")
+
+    assert list(batch.uids) == [101, 102, 103]
+    assert batch.senders == ['a@example.com', 'b@x.com', '']
+    assert batch.subjects[0] == '测试'
+    assert list(batch.sizes) == [2048, 10, 5]
+    assert list(batch.flags) == [FLAG_SEEN, FLAG_SEEN | FLAG_FLAGGED, 0]
+    assert batch.timestamps[0] == batch.timestamps[1] == 1704074400
+    assert batch.timestamps[2] == UNKNOWN_TIMESTAMP
+
+    # 日期未知的邮件不会被当作旧邮件删除
+    old = batch.older_than(time.time())
+    assert list(old.uids) == [101, 102]
+    assert list(batch.newer_than(time.time()).uids) == [103]
+    assert list(batch.with_flags(FLAG_SEEN | FLAG_FLAGGED).uids) == [102]
+    assert list(batch.without_flags(FLAG_SEEN).uids) == [103]
+    assert batch.total_size() == 2063
+
+    print("✅ 邮件元数据批次测试通过")
+
+
+if __name__ == "__main__":
+    test_mail_records()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试运行进度与性能指标
+无需连接邮箱，指标服务监听本机随机端口
+"""
+
+import json
+import urllib.request
+
+from metrics import RunMetrics, serve, to_prometheus
+
+
+def test_metrics():
+    """测试计数、分位数、预计剩余时间和 HTTP 输出"""
+    print("测试运行指标")
+    print("=" * 50)
+
+    run_metrics = RunMetrics()
+    run_metrics.set_stage('清理发送人 a@b.com')
+    run_metrics.set_expected(1000)
+    run_metrics.connection_opened()
+    run_metrics.add(scanned=500)
+    run_metrics.add(matched=200)
+    run_metrics.add(deleted=150)
+    for _ in range(100):
+        run_metrics.command_finished(run_metrics.command_started('UID FETCH'))
+    stalled = run_metrics.command_started('UID STORE')
+
+    snapshot = run_metrics.snapshot()
+    assert snapshot['stage'] == '清理发送人 a@b.com'
+    assert snapshot['messages'] == {'scanned': 500, 'matched': 200, 'deleted': 150}
+    assert snapshot['open_connections'] == 1
+    assert snapshot['rate_per_second']['scanned'] > 0
+    assert snapshot['eta_seconds'] is not None and snapshot['eta_seconds'] > 0
+    assert snapshot['commands']['UID FETCH']['count'] == 100
+    assert set(snapshot['commands']['UID FETCH']['quantiles']) == {0.5, 0.9, 0.99}
+    assert [item['command'] for item in snapshot['inflight_commands']] == ['UID STORE']
+    print(f"速率 {snapshot['rate_per_second']['scanned']:.1f} 封/秒，预计剩余 {snapshot['eta_seconds']:.1f} 秒")
+
+    text = to_prometheus(snapshot)
+    assert 'email_cleaner_messages_total{state="deleted"} 150\n' in text
+    assert 'email_cleaner_imap_command_seconds_count{command="UID FETCH"} 100\n' in text
+    assert 'email_cleaner_imap_command_seconds{command="UID FETCH",quantile="0.99"}' in text
+    assert 'email_cleaner_inflight_command_seconds{command="UID STORE"}' in text
+    assert 'email_cleaner_open_connections 1\n' in text
+
+    server = serve('127.0.0.1', 0, run_metrics)
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(base + '/status') as response:
+            status = json.loads(response.read().decode('utf-8'))
+        assert status['messages']['deleted'] == 150
+        with urllib.request.urlopen(base + '/metrics') as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            assert b'email_cleaner_messages_total' in response.read()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    run_metrics.command_finished(stalled)
+    assert run_metrics.snapshot()['inflight_commands'] == []
+
+    print("✅ 运行指标测试通过")
+
+
+if __name__ == "__main__":
+    test_metrics()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试多进程MIME解析
+无需连接邮箱，使用内存中构造的邮件原文
+"""
+
+from mime_pool import MimePool, analyze, iter_batches
+
+WITH_ATTACHMENT = (b'From: a@example.com\r\n'
+                   b'Subject: report\r\n'
+                   b'MIME-Version: 1.0\r\n'
+                   b'Content-Type: multipart/mixed; boundary="b1"\r\n'
+                   b'\r\n'
+                   b'--b1\r\n'
+                   b'Content-Type: text/plain; charset=utf-8\r\n'
+                   b'\r\n'
+                   b'see attached\r\n'
+                   b'--b1\r\n'
+                   b'Content-Type: application/pdf; name="r.pdf"\r\n'
+                   b'Content-Disposition: attachment; filename="r.pdf"\r\n'
+                   b'Content-Transfer-Encoding: base64\r\n'
+                   b'\r\n'
+                   b'JVBERi0xLjQK\r\n'
+                   b'--b1--\r\n')
+
+PLAIN = (b'From: b@example.com\r\n'
+         b'Subject: hello\r\n'
+         b'Content-Type: text/plain; charset=utf-8\r\n'
+         b'\r\n' +
+         '你好\r\n'.encode('utf-8'))
+
+# 缺少结束边界，服务器往往也无法给出正确的 BODYSTRUCTURE
+MALFORMED = WITH_ATTACHMENT[:WITH_ATTACHMENT.index(b'--b1\r\nContent-Type: application')] + (
+    b'--b1\r\n'
+    b'Content-Type: image/png\r\n'
+    b'Content-Disposition: inline; filename="a.png"\r\n'
+    b'\r\n'
+    b'iVBORw0KGgo=\r\n')
+
+
+def test_mime_pool():
+    """测试单封解析结论、组批和进程池结果与主进程一致"""
+    print("测试多进程MIME解析")
+    print("=" * 50)
+
+    verdict = analyze(WITH_ATTACHMENT)
+    assert verdict.has_attachment and verdict.parts == 2 and verdict.defects == 0
+    assert not analyze(PLAIN).has_attachment
+    assert analyze(memoryview(PLAIN)) == analyze(PLAIN)
+    broken = analyze(MALFORMED)
+    assert broken.has_attachment and broken.defects > 0, broken
+
+    messages = [(uid, [WITH_ATTACHMENT, PLAIN, MALFORMED][uid % 3]) for uid in range(1, 101)]
+    batches = list(iter_batches(iter(messages), max_messages=7))
+    assert [len(batch) for batch in batches] == [7] * 14 + [2]
+    assert all(isinstance(raw, bytes) for batch in batches for _, raw in batch)
+    assert len(list(iter_batches(iter(messages), max_bytes=len(WITH_ATTACHMENT) * 3))) > 1
+
+    with MimePool(0) as pool:
+        inline = list(pool.map(iter_batches(iter(messages), max_messages=7)))
+    with MimePool(2) as pool:
+        parallel = list(pool.map(iter_batches(iter(messages), max_messages=7)))
+    assert parallel == inline
+    assert [uid for uid, _ in parallel] == list(range(1, 101))
+    assert sum(verdict.has_attachment for _, verdict in parallel) == 66
+    print(f"解析 {len(parallel)} 封邮件，其中 {sum(v.defects > 0 for _, v in parallel)} 封格式有问题")
+
+    print("✅ 多进程MIME解析测试通过")
+
+
+if __name__ == "__main__":
+    test_mime_pool()
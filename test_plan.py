@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试删除计划
+无需连接邮箱
+"""
+
+import os
+import logging
+import tempfile
+
+from plan import DeletionPlan, PlanError, apply_plan, get_uidvalidity
+from uid_set import UidSet
+
+
+class FakePlanMail:
+    """只实现 SELECT/STATUS 的模拟连接，uidvalidity 为 文件夹 -> UIDVALIDITY"""
+
+    def __init__(self, uidvalidity):
+        self.uidvalidity = uidvalidity
+        self.untagged_responses = {}
+
+    def select(self, folder='INBOX', readonly=False):
+        self.untagged_responses = {}
+        return 'OK', [b'1']
+
+    def status(self, folder, items):
+        name = folder.strip('"')
+        return 'OK', [f'"{name}" (UIDVALIDITY {self.uidvalidity[name]})'.encode()]
+
+
+class FakeCleaner:
+    """记录 remove_messages 调用的模拟清理器"""
+
+    def __init__(self, mail, account='me@example.com'):
+        self.mail = mail
+        self.config = {'EMAIL': {'email': account}}
+        self.logger = logging.getLogger(__name__)
+        self.removed = {}
+
+    def remove_messages(self, uids, folder='INBOX'):
+        self.removed[folder] = uids
+        return len(uids)
+
+
+def test_plan():
+    """测试计划的合并、保存读取和 UIDVALIDITY 检查"""
+    print("测试删除计划")
+    print("=" * 50)
+
+    plan = DeletionPlan('me@example.com')
+    plan.add('INBOX', 7, 'target_senders', UidSet(range(1, 101)), {'a@example.com': 100})
+    plan.add('INBOX', 7, 'target_senders', UidSet([200]), {'a@example.com': 1})
+    # 再次记录已在计划中的邮件（例如常驻进程的下一次扫描）不重复计数
+    plan.add('INBOX', 7, 'target_senders', UidSet(range(1, 51)), {'a@example.com': 50})
+    plan.add('INBOX', 7, 'read_no_attachment', UidSet(range(50, 151)), {'b@example.com': 101})
+    plan.add('Archive', 3, 'duplicates', UidSet([5, 6]))
+    try:
+        plan.add('INBOX', 8, 'quota', UidSet([1]))
+        assert False, "UIDVALIDITY 变化时应拒绝合并"
+    except PlanError:
+        pass
+
+    path = os.path.join(tempfile.mkdtemp(), 'plan.json')
+    plan.save(path)
+    loaded = DeletionPlan.load(path)
+    print(loaded.describe())
+    assert str(loaded.folder_uids('INBOX')) == '1:150,200'
+    assert loaded.folders['INBOX']['rules']['target_senders']['senders'] == {'a@example.com': 101}
+    assert loaded.rule_counts() == {'target_senders': 101, 'read_no_attachment': 101, 'duplicates': 2}
+    assert len(loaded) == 153
+
+    mail = FakePlanMail({'INBOX': 7, 'Archive': 3})
+    assert get_uidvalidity(mail, 'INBOX') == 7
+    cleaner = FakeCleaner(mail)
+    assert apply_plan(cleaner, loaded) == {'INBOX': 151, 'Archive': 2}
+
+    # 任何一个文件夹的 UIDVALIDITY 变化都不删除任何邮件
+    mail.uidvalidity['Archive'] = 4
+    cleaner = FakeCleaner(mail)
+    try:
+        apply_plan(cleaner, loaded)
+        assert False, "UIDVALIDITY 变化时应拒绝执行"
+    except PlanError as e:
+        print(f"拒绝执行: {e}")
+    assert cleaner.removed == {}
+
+    try:
+        apply_plan(FakeCleaner(mail, 'other@example.com'), loaded)
+        assert False, "账号不一致时应拒绝执行"
+    except PlanError:
+        pass
+
+    print("✅ 删除计划测试通过")
+
+
+if __name__ == "__main__":
+    test_plan()
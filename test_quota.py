@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试按容量回收空间
+无需连接邮箱
+"""
+
+from quota import MB, QuotaReclaimer, parse_storage_quota, select_largest_first
+from uid_set import UidSet
+
+
+class FakeQuotaMail:
+    """按 sizes（UID -> 字节数）应答 UID SORT/SEARCH/FETCH 和 GETQUOTAROOT 的模拟连接"""
+
+    def __init__(self, sizes, capabilities=(), quota=None):
+        self.sizes = sizes
+        self.capabilities = tuple(capabilities)
+        self.quota = quota
+        self.commands = []
+
+    def uid(self, command, *args):
+        self.commands.append((command,) + args)
+        if command == 'SORT':
+            ordered = sorted(self.sizes, key=lambda uid: (-self.sizes[uid], uid))
+            return 'OK', [' '.join(map(str, ordered)).encode()]
+        if command == 'SEARCH':
+            words = args[1].split()
+            larger = int(words[1]) if words[0] == 'LARGER' else -1
+            found = [uid for uid, size in sorted(self.sizes.items()) if size > larger]
+            return 'OK', [' '.join(map(str, found)).encode()]
+        if command == 'FETCH':
+            uids = UidSet.parse(args[0])
+            return 'OK', [b'%d (UID %d RFC822.SIZE %d)' % (seq, uid, self.sizes[uid])
+                          for seq, uid in enumerate(sorted(uids), 1)]
+        raise AssertionError(command)
+
+    def getquotaroot(self, folder):
+        used, limit = self.quota
+        return 'OK', [[b'"INBOX" ""'], [b'"" (STORAGE %d %d)' % (used, limit)]]
+
+    def fetched(self):
+        """FETCH 过大小的全部UID"""
+        uids = UidSet()
+        for command in self.commands:
+            if command[0] == 'FETCH':
+                uids = uids | UidSet.parse(command[1])
+        return uids
+
+
+def test_quota():
+    """测试配额解析、从大到小选择，以及 SORT 和 SEARCH LARGER 两种方式只获取必要的大小"""
+    print("测试按容量回收空间")
+    print("=" * 50)
+
+    assert select_largest_first([(7, 300), (2, 200), (9, 100)], 450) == ([7, 2], 500)
+    assert select_largest_first([(7, 300)], 1000) == ([7], 300)
+    assert parse_storage_quota([[b'"INBOX" ""'], [b'"" (STORAGE 512 1024)']]) == (512 * 1024, MB)
+    assert parse_storage_quota([b'"" (MESSAGE 5 100)']) is None
+
+    # 配额剩余 0.5 MB，要求保留 2 MB 空闲时还需腾出 1.5 MB；不支持 QUOTA 时每次腾出 free_bytes
+    mail = FakeQuotaMail({}, ['QUOTA'], quota=(512, 1024))
+    assert QuotaReclaimer(mail).bytes_to_free(2 * MB) == int(1.5 * MB)
+    assert QuotaReclaimer(mail).bytes_to_free(MB // 4) == 0
+    assert QuotaReclaimer(FakeQuotaMail({})).bytes_to_free(MB) == MB
+
+    sizes = {1: 5 * MB, 2: 2 * MB, 3: 300 * 1024, 4: 10 * 1024, 5: 3 * MB, 6: 600 * 1024}
+
+    # 不支持 SORT：LARGER 4MB 只找到 5MB，再放宽到 1MB 后已足够，小邮件的大小不会获取
+    mail = FakeQuotaMail(sizes)
+    uids, total = QuotaReclaimer(mail).plan('BEFORE 01-Jan-2026', 6 * MB)
+    assert uids == UidSet([1, 5]) and total == 8 * MB
+    assert mail.fetched() == UidSet([1, 2, 5])
+    assert [command[2] for command in mail.commands if command[0] == 'SEARCH'] == [
+        f'LARGER {4 * MB} BEFORE 01-Jan-2026', f'LARGER {MB} BEFORE 01-Jan-2026']
+
+    # 只在候选邮件中选择
+    mail = FakeQuotaMail(sizes)
+    uids, total = QuotaReclaimer(mail).plan('ALL', 800 * 1024, candidates=UidSet([3, 4, 6]))
+    assert uids == UidSet([6, 3]) and total == 900 * 1024
+    assert mail.fetched() == UidSet([3, 6])
+
+    # 支持 SORT：按服务器排序分批获取大小，第一批已足够时不再获取
+    mail = FakeQuotaMail(sizes, ['SORT'])
+    uids, total = QuotaReclaimer(mail, batch_size=2).plan('ALL', 6 * MB)
+    assert uids == UidSet([1, 5]) and total == 8 * MB
+    assert mail.fetched() == UidSet([1, 5])
+
+    # 符合条件的邮件不够时全部选中
+    uids, total = QuotaReclaimer(FakeQuotaMail(sizes, ['SORT'])).plan('ALL', 100 * MB)
+    assert uids == UidSet(sizes) and total == sum(sizes.values())
+    assert QuotaReclaimer(FakeQuotaMail(sizes)).plan('ALL', 0) == (UidSet(), 0)
+
+    print("✅ 按容量回收空间测试通过")
+
+
+if __name__ == "__main__":
+    test_quota()
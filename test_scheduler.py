@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试按运行时间预算调度清理工作
+无需连接邮箱
+"""
+
+import os
+import tempfile
+
+from scheduler import Deadline, Scheduler, WorkItem, RunLock, estimate_round_trips
+from uid_set import UidSet
+
+
+def test_scheduler():
+    """测试往返估算、按收益排序、到时停止和运行锁"""
+    print("测试运行时间预算调度")
+    print("=" * 50)
+
+    # 连续的UID只需一次 STORE
+    assert estimate_round_trips(UidSet(range(1, 1001)), 500) == 1 + 2 + 1 + 1
+    assert estimate_round_trips(UidSet([1, 3, 5]), 500, per_message=1) == 1 + 1 + 3 + 1 + 1
+    assert estimate_round_trips(UidSet(), 500) == 1
+
+    ran = []
+
+    def job(name, count):
+        def run():
+            ran.append(name)
+            return count
+        return run
+
+    scheduler = Scheduler(Deadline(0), by='messages')
+    scheduler.add(WorkItem('少量', 'a', job('少量', 10), messages=10, round_trips=5))
+    scheduler.add(WorkItem('未知', 'b', job('未知', 0)))
+    scheduler.add(WorkItem('大量', 'c', job('大量', 3000), messages=3000, round_trips=9))
+    assert [item.name for item in scheduler.ordered()] == ['大量', '少量', '未知']
+    assert scheduler.run() == [('c', 3000), ('a', 10)]
+    assert ran == ['大量', '少量', '未知']
+
+    # 按字节排序时收益取决于释放的空间
+    scheduler = Scheduler(by='bytes')
+    scheduler.add(WorkItem('小邮件', 'a', job('小邮件', 1), messages=1000, size=1 << 20))
+    scheduler.add(WorkItem('大附件', 'b', job('大附件', 1), messages=10, size=1 << 30))
+    assert [item.name for item in scheduler.ordered()] == ['大附件', '小邮件']
+
+    # 到时后不再开始新工作
+    deadline = Deadline(60)
+    ran.clear()
+
+    def expire():
+        deadline.expires = 0
+        return 5
+
+    scheduler = Scheduler(deadline)
+    scheduler.add(WorkItem('第一项', 'a', expire, messages=100))
+    scheduler.add(WorkItem('第二项', 'b', job('第二项', 1), messages=50))
+    assert scheduler.run() == [('a', 5)]
+    assert ran == []
+    assert Deadline(0).remaining() is None and not Deadline(0).expired()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cron_cleaner.lock')
+        first, second = RunLock(path), RunLock(path)
+        assert first.acquire()
+        assert not second.acquire()
+        assert first.holder() == str(os.getpid())
+        first.release()
+        assert second.acquire()
+        second.release()
+
+    print("✅ 运行时间预算调度测试通过")
+
+
+if __name__ == "__main__":
+    test_scheduler()
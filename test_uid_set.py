@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试UID区间集合
+无需连接邮箱
+"""
+
+import random
+from uid_set import UidSet
+
+
+def test_uid_set():
+    """测试序列集解析、集合运算与拆分"""
+    print("测试UID区间集合")
+    print("=" * 50)
+
+    uids = UidSet.parse("700,1:500,501,5:10")
+    print(f"解析结果: {uids}")
+    assert str(uids) == "1:501,700"
+    assert len(uids) == 502
+    assert 501 in uids and 502 not in uids and 700 in uids
+
+    assert str(UidSet.from_search_response(b"3 1 2 9 10")) == "1:3,9:10"
+    assert not UidSet.from_search_response(b"")
+
+    senders = UidSet.parse("1:100,200:300")
+    older = UidSet.parse("50:250")
+    processed = UidSet.parse("60:70,90")
+    result = senders & older - processed
+    print(f"发件人 ∩ 旧邮件 − 已处理: {result}")
+    assert str(result) == "50:59,71:89,91:100,200:250"
+    assert str(senders | older) == "1:300"
+
+    # 与Python集合运算的结果对比
+    rng = random.Random(0)
+    for _ in range(50):
+        a = {rng.randint(1, 200) for _ in range(80)}
+        b = {rng.randint(1, 200) for _ in range(80)}
+        ua, ub = UidSet(a), UidSet(b)
+        assert set(ua | ub) == a | b
+        assert set(ua & ub) == a & b
+        assert set(ua - ub) == a - b
+        assert UidSet.parse(str(ua)) == ua
+
+    # 拆分后不丢失UID
+    big = UidSet(range(1, 100001, 2))
+    chunks = list(big.chunks(1000))
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert sum(len(UidSet.parse(chunk)) for chunk in chunks) == len(big)
+    batches = list(UidSet.parse("1:1000,2000:2500").batches(300))
+    assert [len(batch) for batch in batches] == [300, 300, 300, 300, 300, 1]
+
+    # 连续UID只占一个区间
+    million = UidSet.parse("1:1000000")
+    assert len(million) == 1000000 and str(million) == "1:1000000"
+
+    print("✅ UID区间集合测试通过")
+
+
+if __name__ == "__main__":
+    test_uid_set()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+压缩的邮件UID集合
+以有序、互不相邻的闭区间保存UID，可直接解析和生成IMAP序列集语法（如 1:500,700）
+"""
+
+from array import array
+from bisect import bisect_right
+
+
+class UidSet:
+    """
+    UID区间集合
+
+    内部使用两个 array 分别保存区间起点和终点，连续的UID只占一个区间，
+    并、交、差运算都是对区间的一次线性归并。
+    """
+
+    __slots__ = ('_starts', '_ends')
+
+    def __init__(self, uids=None):
+        """
+        Args:
+            uids: 可选，UID可迭代对象（无需排序，可重复）
+        """
+        self._starts = array('I')
+        self._ends = array('I')
+        if uids is not None:
+            self._extend_sorted(sorted(set(int(uid) for uid in uids)))
+
+    def _extend_sorted(self, uids):
+        """追加升序且大于现有最大值的UID"""
+        starts, ends = self._starts, self._ends
+        for uid in uids:
+            if ends and uid <= ends[-1] + 1:
+                if uid > ends[-1]:
+                    ends[-1] = uid
+            else:
+                starts.append(uid)
+                ends.append(uid)
+
+    @classmethod
+    def _from_intervals(cls, intervals):
+        """由已排序的 (起点, 终点) 序列构建，合并重叠和相邻的区间"""
+        result = cls()
+        starts, ends = result._starts, result._ends
+        for start, end in intervals:
+            if ends and start <= ends[-1] + 1:
+                if end > ends[-1]:
+                    ends[-1] = end
+            else:
+                starts.append(start)
+                ends.append(end)
+        return result
+
+    @classmethod
+    def parse(cls, text):
+        """
+        解析IMAP序列集语法
+
+        Args:
+            text (str|bytes): 如 "1:500,700"，不支持 "*"
+        """
+        if isinstance(text, bytes):
+            text = text.decode('ascii')
+        intervals = []
+        for part in text.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if ':' in part:
+                low, high = part.split(':', 1)
+                low, high = int(low), int(high)
+                if low > high:
+                    low, high = high, low
+                intervals.append((low, high))
+            else:
+                uid = int(part)
+                intervals.append((uid, uid))
+        intervals.sort()
+        return cls._from_intervals(intervals)
+
+    @classmethod
+    def from_search_response(cls, data):
+        """
+        由 SEARCH 响应（空格分隔的UID）构建
+
+        Args:
+            data (bytes): 如 b"1 2 3 7"
+        """
+        result = cls()
+        if not data:
+            return result
+        uids = [int(uid) for uid in data.split()]
+        # 服务器通常按升序返回，无序时再排序
+        if any(uids[i] > uids[i + 1] for i in range(len(uids) - 1)):
+            uids = sorted(set(uids))
+        result._extend_sorted(uids)
+        return result
+
+    def intervals(self):
+        """按顺序返回 (起点, 终点) 区间"""
+        return zip(self._starts, self._ends)
+
+    def __len__(self):
+        return sum(self._ends) - sum(self._starts) + len(self._starts)
+
+    def __bool__(self):
+        return len(self._starts) > 0
+
+    def __iter__(self):
+        for start, end in self.intervals():
+            yield from range(start, end + 1)
+
+    def __contains__(self, uid):
+        index = bisect_right(self._starts, uid) - 1
+        return index >= 0 and uid <= self._ends[index]
+
+    def __eq__(self, other):
+        if not isinstance(other, UidSet):
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    def __str__(self):
+        return ','.join(
+            str(start) if start == end else f"{start}:{end}"
+            for start, end in self.intervals()
+        )
+
+    def __repr__(self):
+        return f"UidSet('{self}')"
+
+    def min(self):
+        """最小UID"""
+        return self._starts[0]
+
+    def max(self):
+        """最大UID"""
+        return self._ends[-1]
+
+    def union(self, other):
+        """并集"""
+        merged = sorted(list(self.intervals()) + list(other.intervals()))
+        return UidSet._from_intervals(merged)
+
+    def intersection(self, other):
+        """交集"""
+        result = UidSet()
+        i = j = 0
+        a_starts, a_ends = self._starts, self._ends
+        b_starts, b_ends = other._starts, other._ends
+        while i < len(a_starts) and j < len(b_starts):
+            low = max(a_starts[i], b_starts[j])
+            high = min(a_ends[i], b_ends[j])
+            if low <= high:
+                result._starts.append(low)
+                result._ends.append(high)
+            if a_ends[i] < b_ends[j]:
+                i += 1
+            else:
+                j += 1
+        return result
+
+    def difference(self, other):
+        """差集"""
+        result = UidSet()
+        j = 0
+        b_starts, b_ends = other._starts, other._ends
+        for start, end in self.intervals():
+            # 跳过完全位于当前区间之前的区间
+            while j < len(b_starts) and b_ends[j] < start:
+                j += 1
+            k = j
+            while k < len(b_starts) and b_starts[k] <= end:
+                if b_starts[k] > start:
+                    result._starts.append(start)
+                    result._ends.append(b_starts[k] - 1)
+                start = b_ends[k] + 1
+                if start > end:
+                    break
+                k += 1
+            if start <= end:
+                result._starts.append(start)
+                result._ends.append(end)
+        return result
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    def chunks(self, max_length=1000):
+        """
+        将集合拆分为若干序列集字符串，单个字符串不超过 max_length 字符，
+        避免FETCH/STORE命令行过长
+
+        Yields:
+            str: 序列集字符串
+        """
+        parts = []
+        length = 0
+        for start, end in self.intervals():
+            part = str(start) if start == end else f"{start}:{end}"
+            if parts and length + len(part) + 1 > max_length:
+                yield ','.join(parts)
+                parts = []
+                length = 0
+            parts.append(part)
+            length += len(part) + 1
+        if parts:
+            yield ','.join(parts)
+
+    def batches(self, batch_size):
+        """
+        按邮件数量拆分集合，每批最多 batch_size 个UID
+
+        Yields:
+            UidSet: 子集合
+        """
+        current = UidSet()
+        count = 0
+        for start, end in self.intervals():
+            while start <= end:
+                take = min(end - start + 1, batch_size - count)
+                current._starts.append(start)
+                current._ends.append(start + take - 1)
+                count += take
+                start += take
+                if count >= batch_size:
+                    yield current
+                    current = UidSet()
+                    count = 0
+        if current:
+            yield current